@@ -0,0 +1,254 @@
+import os
+import time
+import argparse
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình chỉ mục IVF
+# ===============================
+MODEL_DIR = "face_models_facenet"
+EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+IVF_INDEX_PATH = os.path.join(MODEL_DIR, "ivf_index_facenet.npz")
+
+DEFAULT_N_PROBE = 8
+# Dưới ngưỡng này tìm chính xác (1 phép nhân ma trận) nhanh hơn probe IVF. Đo bằng `bench`
+# (128 chiều, 10 ảnh/lớp, n_probe=8, ms/truy vấn, IVF / chính xác):
+#   2000 emb: 0.14 / 0.13 (4 truy vấn), 0.08 / 0.06 (64) · 5000 emb: 0.14 / 0.26, 0.15 / 0.15
+#   10000 emb: 0.22 / 0.56, 0.18 / 0.31 → gallery vài lớp học (≈ 200 lớp × 10 ảnh) không cần IVF
+IVF_MIN_GALLERY = 5000
+DEFAULT_TOP_K = 5
+KMEANS_ITERS = 20
+ASSIGN_CHUNK = 8192
+SEARCH_CHUNK = 16           # số truy vấn chấm điểm cùng lúc (giới hạn ma trận ứng viên n × T × 128)
+
+
+def _normalize(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _assign(X, centroids):
+    # Gán từng vector vào cụm gần nhất (cosine), chia khối để giới hạn bộ nhớ
+    out = np.empty(len(X), dtype=np.int64)
+    for start in range(0, len(X), ASSIGN_CHUNK):
+        block = X[start:start + ASSIGN_CHUNK]
+        out[start:start + ASSIGN_CHUNK] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(X, n_lists, n_iter=KMEANS_ITERS, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _assign(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=n_lists)
+        # Cụm rỗng → lấy lại một điểm ngẫu nhiên làm tâm
+        empty = counts == 0
+        if np.any(empty):
+            sums[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+# ===============================
+# 🧭 Chỉ mục IVF (inverted file) thuần NumPy
+# ===============================
+class IVFIndex:
+    def __init__(self, centroids, matrix, label_index, class_names, offsets):
+        self.centroids = centroids
+        self.matrix = matrix
+        self.label_index = label_index
+        self.class_names = class_names
+        self.offsets = offsets
+        self.min_gallery = IVF_MIN_GALLERY
+
+    @classmethod
+    def build(cls, embeddings, labels, n_lists=None, n_iter=KMEANS_ITERS, seed=0):
+        X = _normalize(embeddings)
+        class_names, label_index = np.unique(np.asarray(labels), return_inverse=True)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(X))))
+        n_lists = min(n_lists, len(X))
+
+        centroids = spherical_kmeans(X, n_lists, n_iter, seed)
+        assign = _assign(X, centroids)
+
+        # Sắp xếp theo cụm → mỗi inverted list là một đoạn liên tiếp trong ma trận
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, np.ascontiguousarray(X[order]), label_index[order],
+                   class_names, offsets)
+
+    @classmethod
+    def from_npz(cls, path=EMBEDDINGS_NPZ, **kwargs):
+        npz = np.load(path, allow_pickle=True)
+        return cls.build(npz["embeddings"], npz["labels"], **kwargs)
+
+    def save(self, path=IVF_INDEX_PATH):
+        np.savez(path, centroids=self.centroids, matrix=self.matrix,
+                 label_index=self.label_index, class_names=self.class_names,
+                 offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path=IVF_INDEX_PATH):
+        data = np.load(path, allow_pickle=False)
+        return cls(data["centroids"], data["matrix"], data["label_index"],
+                   data["class_names"], data["offsets"])
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def use_ivf(self):
+        return len(self.matrix) >= self.min_gallery
+
+    def search(self, queries, k=DEFAULT_TOP_K, n_probe=DEFAULT_N_PROBE):
+        # Trả về (chỉ số hàng trong matrix, độ tương đồng) của k láng giềng gần nhất, -1 nếu thiếu
+        queries = _normalize(np.atleast_2d(queries))
+        n_probe = min(n_probe, self.n_lists)
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe]
+
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for start in range(0, len(queries), SEARCH_CHUNK):
+            stop = start + SEARCH_CHUNK
+            ids[start:stop], sims[start:stop] = self._search_block(queries[start:stop], probes[start:stop], k)
+        return ids, sims
+
+    def _search_block(self, queries, probes, k):
+        # Ghép các inverted list được probe của mọi truy vấn thành ma trận ứng viên (n, T) có đệm,
+        # chấm điểm bằng một phép nhân batch thay vì lặp từng truy vấn
+        n = len(queries)
+        sizes = (self.offsets[1:] - self.offsets[:-1])[probes]           # (n, n_probe)
+        ends = np.cumsum(sizes, axis=1)
+        total = ends[:, -1]
+        width = int(total.max()) if n else 0
+        ids = np.full((n, k), -1, dtype=np.int64)
+        sims = np.full((n, k), -np.inf, dtype=np.float32)
+        if width == 0:
+            return ids, sims
+
+        # Chỉ số hàng liên tiếp của mọi đoạn list: arange(tổng) dịch theo đầu từng đoạn (không lặp Python)
+        seg_len = sizes.ravel()
+        seg_start = np.cumsum(seg_len) - seg_len
+        flat = np.arange(int(seg_len.sum())) + np.repeat(self.offsets[probes].ravel() - seg_start, seg_len)
+        pos = np.arange(width)
+        valid = pos < total[:, None]
+        cand = np.zeros((n, width), dtype=np.int64)
+        cand[valid] = flat
+
+        scores = np.matmul(self.matrix[cand], queries[:, :, None])[:, :, 0]
+        scores[~valid] = -np.inf
+        kk = min(k, width)
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        top_sims = np.take_along_axis(scores, top, axis=1)
+        found = np.isfinite(top_sims)
+        ids[:, :kk] = np.where(found, np.take_along_axis(cand, top, axis=1), -1)
+        sims[:, :kk] = top_sims
+        return ids, sims
+
+    def exact_search(self, queries, k=DEFAULT_TOP_K):
+        queries = _normalize(np.atleast_2d(queries))
+        scores = queries @ self.matrix.T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        rows = np.arange(len(queries))[:, None]
+        top = np.take_along_axis(top, np.argsort(-scores[rows, top], axis=1), axis=1)
+        return top, scores[rows, top]
+
+    def identify(self, queries, k=DEFAULT_TOP_K, n_probe=DEFAULT_N_PROBE):
+        # Bỏ phiếu theo tổng similarity của k láng giềng → (tên, similarity trung bình của lớp thắng)
+        if self.use_ivf:
+            ids, sims = self.search(queries, k, n_probe)
+        else:
+            ids, sims = self.exact_search(queries, k)
+        names, scores = [], []
+        for row_ids, row_sims in zip(ids, sims):
+            valid = row_ids >= 0
+            if not np.any(valid):
+                names.append("unknown")
+                scores.append(0.0)
+                continue
+            lbls = self.label_index[row_ids[valid]]
+            votes = np.bincount(lbls, weights=row_sims[valid])
+            best = int(np.argmax(votes))
+            names.append(self.class_names[best])
+            scores.append(float(np.mean(row_sims[valid][lbls == best])))
+        return names, np.array(scores, dtype=np.float32)
+
+
+def load_or_build(index_path=IVF_INDEX_PATH, npz_path=EMBEDDINGS_NPZ):
+    # Dùng lại chỉ mục đã lưu nếu mới hơn file embeddings, ngược lại build và lưu cạnh mô hình
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(npz_path):
+        return IVFIndex.load(index_path)
+    index = IVFIndex.from_npz(npz_path)
+    index.save(index_path)
+    return index
+
+
+# ===============================
+# 📊 Benchmark recall / độ trễ so với tìm kiếm chính xác
+# ===============================
+def synthetic_gallery(n_classes, per_class, dim=128, noise=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = _normalize(rng.standard_normal((n_classes, dim)))
+    labels = np.repeat(np.arange(n_classes), per_class)
+    X = centers[labels] + noise * rng.standard_normal((len(labels), dim)) / np.sqrt(dim)
+    return _normalize(X), labels.astype(str)
+
+
+def benchmark(n_classes=2000, per_class=10, n_queries=500, k=DEFAULT_TOP_K,
+              probes=(1, 2, 4, 8, 16), seed=0):
+    X, y = synthetic_gallery(n_classes, per_class, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    q_idx = rng.choice(len(X), size=n_queries, replace=False)
+    queries = _normalize(X[q_idx] + 0.5 * rng.standard_normal(X[q_idx].shape) / np.sqrt(X.shape[1]))
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(X, y, seed=seed)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    exact_ids, _ = index.exact_search(queries, k)
+    exact_ms = (time.perf_counter() - t0) * 1000 / n_queries
+    true_lbl = index.label_index[exact_ids[:, 0]]
+
+    print(f"📦 Gallery: {len(X)} embeddings, {n_classes} lớp, {index.n_lists} lists (build {build_s:.2f}s)")
+    print(f"   exact     : {exact_ms:.3f} ms/query")
+    results = {"n_embeddings": len(X), "n_lists": index.n_lists, "exact_ms": exact_ms, "ivf": []}
+    for n_probe in probes:
+        t0 = time.perf_counter()
+        ids, _ = index.search(queries, k, n_probe)
+        ms = (time.perf_counter() - t0) * 1000 / n_queries
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, exact_ids)])
+        top1 = np.mean(index.label_index[ids[:, 0]] == true_lbl)
+        print(f"   n_probe={n_probe:<3}: {ms:.3f} ms/query, recall@{k}={recall:.3f}, top-1 lớp={top1:.3f}")
+        results["ivf"].append({"n_probe": n_probe, "ms": ms, "recall": float(recall), "top1": float(top1)})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chỉ mục IVF cho gallery khuôn mặt")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Build chỉ mục từ file embeddings và lưu cạnh mô hình")
+    b.add_argument("--lists", type=int, default=None)
+    bench = sub.add_parser("bench", help="So sánh recall/độ trễ với tìm kiếm chính xác")
+    bench.add_argument("--classes", type=int, default=2000)
+    bench.add_argument("--per-class", type=int, default=10)
+    bench.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        idx = IVFIndex.from_npz(EMBEDDINGS_NPZ, n_lists=args.lists)
+        idx.save(IVF_INDEX_PATH)
+        print(f"✅ Đã lưu chỉ mục {idx.n_lists} lists → {IVF_INDEX_PATH}")
+    else:
+        benchmark(args.classes, args.per_class, args.queries)
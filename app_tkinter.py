@@ -1,10 +1,16 @@
+from startup_profile import timed, mark, report
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pandas as pd
-import numpy as np
+from tkinter import ttk, messagebox, filedialog
 import os
+import queue
+import threading
 from datetime import datetime
-from face_recognition_attendance import start_attendance
+from PIL import Image, ImageTk
+from attendance_store import get_store
+from student_manifest import load_student_names
+import session_engine
+from session_engine import SessionEngine
+from attendance_report import AttendanceReport, REPORT_COLUMNS, export_rows
 
 # ===============================
 # ⚙️ Cấu hình hệ thống
@@ -17,25 +23,66 @@ subjects = ["Xử lý ảnh", "Nhúng IoT", "Thị giác máy tính", "AI cơ b
 MODEL_DIR = "face_models_facenet"
 EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
 
-# Lưu trạng thái từng môn học
-ACTIVE_SESSIONS = {s: {"active": False, "start": None, "end": None} for s in subjects}
+# Camera nhúng trong giao diện sinh viên
+CAMERA_VIEW_SIZE = (360, 270)
+CAMERA_POLL_MS = 30
+CAMERA_TIMEOUT_SECONDS = 60
+
+SESSION_PATH = "session.json"
+
+# Bảng dữ liệu được chèn theo từng trang để giao diện không bị đứng với hàng nghìn dòng
+TREE_PAGE_SIZE = 200
+
+# Mô-đun nhận diện (TensorFlow, DeepFace, MTCNN...) được import và tải ở luồng nền
+recognizer = None
 
 # ===============================
-# 📂 Đọc danh sách sinh viên từ embeddings
+# 📂 Đọc danh sách sinh viên từ manifest
 # ===============================
 student_names = []
-if os.path.exists(EMBEDDINGS_NPZ):
-    try:
-        npz = np.load(EMBEDDINGS_NPZ, allow_pickle=True)
-        labels = np.unique(npz["labels"])
-        student_names = sorted(labels.tolist())
-        print("📂 Danh sách sinh viên đã tải:")
-        for name in student_names:
-            print("   -", name)
-    except Exception as e:
-        print("⚠️ Không thể tải danh sách sinh viên:", e)
-else:
-    print("⚠️ Không tìm thấy file embeddings.")
+try:
+    with timed("load: student manifest"):
+        student_names = load_student_names(EMBEDDINGS_NPZ)
+    print(f"📂 Đã tải danh sách {len(student_names)} sinh viên.")
+except Exception as e:
+    print("⚠️ Không thể tải danh sách sinh viên:", e)
+
+def apply_roster(names):
+    # Mở / đóng buổi học hoặc sửa danh sách lớp → bộ nhận diện chỉ so khớp với sinh viên của các môn đang mở
+    if recognizer is not None:
+        recognizer.set_roster(names)
+
+
+# Các buổi học đang mở (nhiều môn cùng lúc), danh sách lớp và người đã điểm danh giữ trong bộ nhớ
+sessions = SessionEngine(SESSION_PATH, student_names, on_roster_change=apply_roster)
+
+# Báo cáo nhiều ngày: bộ đệm dạng cột tạo khi mở lần đầu, sau đó chỉ nạp bản ghi mới
+attendance_report = None
+
+
+def get_report():
+    global attendance_report
+    if attendance_report is None:
+        attendance_report = AttendanceReport(session_path=SESSION_PATH)
+    return attendance_report
+
+
+def fill_tree(tree, rows, page_size=TREE_PAGE_SIZE):
+    # Xóa bảng rồi chèn từng trang qua after() → cửa sổ vẫn phản hồi trong lúc nạp
+    job = getattr(tree, "_fill_job", None)
+    if job is not None:
+        tree.after_cancel(job)
+    tree.delete(*tree.get_children())
+
+    def insert_page(start):
+        for row in rows[start:start + page_size]:
+            tree.insert("", tk.END, values=row)
+        if start + page_size < len(rows):
+            tree._fill_job = tree.after(1, insert_page, start + page_size)
+        else:
+            tree._fill_job = None
+
+    insert_page(0)
 
 
 # ===============================
@@ -59,9 +106,50 @@ class AttendanceApp(tk.Tk):
 
         self.show_frame(LoginFrame)
 
+        # Cửa sổ hiện trước, mô hình tải sau ở luồng nền
+        self.load_queue = queue.Queue()
+        self.after_idle(self.start_model_loading)
+
     def show_frame(self, cont):
         self.frames[cont].tkraise()
 
+    # ====== Tải mô hình nền ======
+    def start_model_loading(self):
+        mark("window shown")
+        threading.Thread(target=self._load_models, daemon=True).start()
+        self.after(100, self.poll_model_loading)
+
+    def _load_models(self):
+        global recognizer
+        try:
+            with timed("import: face_recognition_attendance"):
+                import face_recognition_attendance
+            face_recognition_attendance.load_models(
+                progress=lambda i, n, msg: self.load_queue.put((i, n, msg)))
+            recognizer = face_recognition_attendance
+            mark("models ready")
+            self.load_queue.put(("done", None, None))
+        except Exception as e:
+            self.load_queue.put(("error", None, str(e)))
+
+    def poll_model_loading(self):
+        student = self.frames[StudentFrame]
+        while True:
+            try:
+                step, total, msg = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if step == "done":
+                apply_roster(sessions.active_names())
+                student.set_model_ready()
+                report()
+                return
+            if step == "error":
+                student.set_model_error(msg)
+                return
+            student.set_model_progress(step, total, msg)
+        self.after(100, self.poll_model_loading)
+
 
 # ===============================
 # 📘 Giao diện đăng nhập
@@ -134,6 +222,8 @@ class AdminFrame(tk.Frame):
         ttk.Button(frame_top, text="📄 Xem điểm danh", command=self.load_attendance).grid(row=3, column=1, pady=10)
         ttk.Button(frame_top, text="💾 Xuất file CSV", command=self.export_csv).grid(row=3, column=2, pady=10)
         ttk.Button(frame_top, text="🗑️ Xóa lịch sử điểm danh", command=self.delete_attendance).grid(row=3, column=3, pady=10)
+        ttk.Button(frame_top, text="📊 Thống kê", command=self.open_report).grid(row=4, column=0, pady=5)
+        ttk.Button(frame_top, text="👥 Danh sách lớp", command=self.open_roster).grid(row=4, column=1, pady=5)
         ttk.Button(frame_top, text="↩️ Quay lại đăng nhập",
                    command=lambda: controller.show_frame(LoginFrame)).grid(row=3, column=4, pady=10)
 
@@ -165,36 +255,139 @@ class AdminFrame(tk.Frame):
             messagebox.showwarning("Thiếu thông tin", "Vui lòng chọn môn học trước.")
             return
 
-        ACTIVE_SESSIONS[subject] = {"active": True, "start": start, "end": end}
-        self.status_label.config(text=f"✅ Môn '{subject}' đã mở ({start} - {end})", fg="green")
+        try:
+            session = sessions.open(subject, start, end)
+        except ValueError as e:
+            messagebox.showerror("Lỗi", str(e))
+            return
+        start, end = session.to_json()["start"], session.to_json()["end"]
+        opened = ", ".join(s.subject for s in sessions.open_sessions()) or subject
+        self.status_label.config(text=f"✅ Môn '{subject}' đã mở ({start} - {end}) | Đang mở: {opened}",
+                                 fg="green")
         messagebox.showinfo("Thành công", f"Buổi học '{subject}' đã được mở. Sinh viên có thể điểm danh.")
 
     # ====== Xem danh sách điểm danh ======
     def load_attendance(self):
         subject = self.subject_var.get()
         today = datetime.now().strftime("%Y-%m-%d")
-        path = os.path.join(LOG_DIR, f"log_{subject}_{today}.csv")
+        rows = get_store().query(subject=subject, date=today)
 
-        if not os.path.exists(path):
+        if not rows:
             messagebox.showinfo("Thông báo", "Chưa có dữ liệu điểm danh cho hôm nay.")
             return
 
-        df = pd.read_csv(path)
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for _, row in df.iterrows():
-            self.tree.insert("", tk.END, values=tuple(row))
+        fill_tree(self.tree, rows)
+
+    # ====== 📊 Thống kê nhiều ngày: tỉ lệ đi học, đi muộn, vắng hôm nay ======
+    def open_report(self):
+        subject = self.subject_var.get() or None
+        report = get_report()
+        rows = report.student_report(sessions.roster(subject) if subject else student_names, subject)
+        if not rows:
+            messagebox.showinfo("Thông báo", "Chưa có dữ liệu điểm danh.")
+            return
+
+        win = tk.Toplevel(self)
+        win.title(f"Thống kê điểm danh - {subject or 'Tất cả môn'}")
+        win.geometry("760x480")
+
+        if subject:
+            absent = report.absentees(sessions.roster(subject), subject)
+            tk.Label(win, text=f"❌ Vắng hôm nay ({len(absent)}): {', '.join(absent) or 'không có'}",
+                     wraplength=720, justify="left", font=("Segoe UI", 10)).pack(padx=10, pady=5, anchor="w")
+
+        frame = tk.Frame(win)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(frame, columns=REPORT_COLUMNS, show="headings")
+        for col in REPORT_COLUMNS:
+            tree.heading(col, text=col)
+            tree.column(col, width=120, anchor="center")
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        fill_tree(tree, rows)
+
+        def export():
+            dest = f"report_{subject or 'all'}_{datetime.now():%Y-%m-%d}.csv"
+            export_rows(dest, REPORT_COLUMNS, rows)
+            messagebox.showinfo("Thành công", f"Đã xuất file: {dest}", parent=win)
+
+        ttk.Button(win, text="💾 Xuất báo cáo CSV", command=export).pack(pady=5)
+
+    # ====== 👥 Danh sách lớp theo môn (lưu trong session.json) ======
+    def open_roster(self):
+        subject = self.subject_var.get()
+        if not subject:
+            messagebox.showwarning("Thiếu thông tin", "Vui lòng chọn môn học trước.")
+            return
+
+        win = tk.Toplevel(self)
+        win.title(f"Danh sách lớp - {subject}")
+        win.geometry("360x460")
+        custom = subject in sessions.rosters
+        info = tk.Label(win, font=("Segoe UI", 10),
+                        text="Danh sách riêng của môn" if custom else "Chưa có danh sách riêng: mọi sinh viên")
+        info.pack(pady=5)
+
+        frame = tk.Frame(win)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        listbox = tk.Listbox(frame, selectmode=tk.MULTIPLE, exportselection=False)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=listbox.yview)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox.pack(fill=tk.BOTH, expand=True)
+
+        def show(names):
+            # Sinh viên trong file nhưng chưa đăng ký khuôn mặt vẫn hiện để không bị mất khi lưu
+            listbox.delete(0, tk.END)
+            selected = set(names)
+            for i, name in enumerate(sorted(set(student_names) | selected)):
+                listbox.insert(tk.END, name)
+                if name in selected:
+                    listbox.selection_set(i)
+
+        def save():
+            names = [listbox.get(i) for i in listbox.curselection()]
+            if not names:
+                messagebox.showwarning("Thiếu thông tin", "Chọn ít nhất một sinh viên (hoặc bấm 'Dùng tất cả').",
+                                       parent=win)
+                return
+            sessions.set_roster(subject, names)
+            messagebox.showinfo("Thành công", f"Đã lưu danh sách lớp '{subject}': {len(names)} sinh viên.",
+                                parent=win)
+            win.destroy()
+
+        def load_file():
+            path = filedialog.askopenfilename(parent=win, title="Chọn file danh sách lớp",
+                                              filetypes=[("CSV / TXT", "*.csv *.txt"), ("Tất cả", "*.*")])
+            if not path:
+                return
+            try:
+                show(session_engine.read_roster_file(path))
+            except (OSError, UnicodeDecodeError) as e:
+                messagebox.showerror("Lỗi", f"Không đọc được file: {e}", parent=win)
+
+        def reset():
+            sessions.clear_roster(subject)
+            win.destroy()
+
+        show(sessions.roster(subject))
+        buttons = tk.Frame(win)
+        buttons.pack(pady=8)
+        ttk.Button(buttons, text="📥 Nhập từ file", command=load_file).grid(row=0, column=0, padx=4)
+        ttk.Button(buttons, text="💾 Lưu", command=save).grid(row=0, column=1, padx=4)
+        ttk.Button(buttons, text="↩️ Dùng tất cả", command=reset).grid(row=0, column=2, padx=4)
 
     # ====== Xuất file CSV ======
     def export_csv(self):
         subject = self.subject_var.get()
         today = datetime.now().strftime("%Y-%m-%d")
-        src = os.path.join(LOG_DIR, f"log_{subject}_{today}.csv")
-        if not os.path.exists(src):
+        dest = f"backup_{subject}_{today}.csv"
+        if get_store().export_csv(dest, subject=subject, date=today) == 0:
+            os.remove(dest)
             messagebox.showwarning("Lỗi", "Không có dữ liệu để xuất.")
             return
-        dest = f"backup_{subject}_{today}.csv"
-        os.system(f'copy "{src}" "{dest}"')
         messagebox.showinfo("Thành công", f"Đã xuất file: {dest}")
 
     # ====== 🗑️ Xóa lịch sử điểm danh ======
@@ -215,23 +408,23 @@ class AdminFrame(tk.Frame):
         )
 
         if choice == "yes":
-            if os.path.exists(today_path):
-                os.remove(today_path)
-                for item in self.tree.get_children():
-                    self.tree.delete(item)
+            if get_store().delete(subject, today) or os.path.exists(today_path):
+                if os.path.exists(today_path):
+                    os.remove(today_path)
+                sessions.forget(subject)
+                fill_tree(self.tree, [])
                 messagebox.showinfo("Đã xóa", f"🗑️ Đã xóa lịch sử điểm danh hôm nay của môn '{subject}'.")
             else:
                 messagebox.showinfo("Thông báo", f"Không có dữ liệu điểm danh hôm nay của '{subject}'.")
 
         elif choice == "no":
-            deleted = 0
+            deleted = get_store().delete(subject)
+            sessions.forget(subject)
             for file in os.listdir(LOG_DIR):
                 if file.startswith(f"log_{subject}_") and file.endswith(".csv"):
                     os.remove(os.path.join(LOG_DIR, file))
-                    deleted += 1
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            messagebox.showinfo("Đã xóa", f"🗑️ Đã xóa {deleted} file lịch sử điểm danh của môn '{subject}'.")
+            fill_tree(self.tree, [])
+            messagebox.showinfo("Đã xóa", f"🗑️ Đã xóa {deleted} bản ghi lịch sử điểm danh của môn '{subject}'.")
         else:
             return
 
@@ -247,7 +440,12 @@ class StudentFrame(tk.Frame):
         tk.Label(self, text="🎓 GIAO DIỆN SINH VIÊN", font=("Segoe UI", 14, "bold"),
                  bg="#1a73e8", fg="white", pady=10).pack(fill=tk.X)
 
-        frame = tk.LabelFrame(self, text="Thông tin sinh viên", padx=20, pady=20)
+        body = tk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+        left = tk.Frame(body)
+        left.pack(side=tk.LEFT, fill=tk.Y)
+
+        frame = tk.LabelFrame(left, text="Thông tin sinh viên", padx=20, pady=20)
         frame.pack(padx=20, pady=20, fill=tk.X)
 
         # combobox chọn tên sinh viên từ embeddings
@@ -267,10 +465,42 @@ class StudentFrame(tk.Frame):
                                           width=32, state="readonly")
         self.subject_combo.grid(row=2, column=1, pady=5)
 
-        ttk.Button(self, text="📸 Điểm danh", command=self.start_face_recognition).pack(pady=15)
-        ttk.Button(self, text="↩️ Quay lại đăng nhập",
+        # Tiến trình tải mô hình nhận diện
+        self.model_status = tk.Label(left, text="⏳ Đang tải mô hình nhận diện...", fg="orange",
+                                     font=("Segoe UI", 10))
+        self.model_status.pack()
+        self.model_progress = ttk.Progressbar(left, length=300, mode="determinate")
+        self.model_progress.pack(pady=5)
+
+        self.checkin_btn = ttk.Button(left, text="📸 Điểm danh", command=self.start_face_recognition,
+                                      state="disabled")
+        self.checkin_btn.pack(pady=15)
+        ttk.Button(left, text="↩️ Quay lại đăng nhập",
                    command=lambda: controller.show_frame(LoginFrame)).pack(pady=5)
 
+        # Khung camera ngay trong cửa sổ (không mở cửa sổ OpenCV riêng)
+        right = tk.LabelFrame(body, text="Camera", padx=10, pady=10)
+        right.pack(side=tk.RIGHT, padx=20, pady=20, fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(right, width=CAMERA_VIEW_SIZE[0], height=CAMERA_VIEW_SIZE[1], bg="black")
+        self.canvas.pack()
+        self.cancel_btn = ttk.Button(right, text="⏹️ Hủy", command=self.cancel_recognition, state="disabled")
+        self.cancel_btn.pack(pady=10)
+
+        self.session = None
+        self.photo = None
+
+    def set_model_progress(self, step, total, msg):
+        self.model_progress["value"] = 100 * step / total
+        self.model_status.config(text=msg)
+
+    def set_model_ready(self):
+        self.model_progress["value"] = 100
+        self.model_status.config(text="✅ Sẵn sàng điểm danh", fg="green")
+        self.checkin_btn.config(state="normal")
+
+    def set_model_error(self, msg):
+        self.model_status.config(text=f"❌ Không thể tải mô hình: {msg}", fg="red")
+
     # ====== Hàm điểm danh ======
     def start_face_recognition(self):
         subject = self.subject_var.get()
@@ -281,28 +511,81 @@ class StudentFrame(tk.Frame):
             messagebox.showwarning("Thiếu thông tin", "Vui lòng nhập đầy đủ thông tin và chọn môn học.")
             return
 
-        session_info = ACTIVE_SESSIONS.get(subject, {"active": False, "start": None, "end": None})
-        if not session_info["active"]:
-            messagebox.showerror("⛔ Chưa đến thời gian", f"Môn '{subject}' chưa được mở để điểm danh.")
+        # 🕒 Kiểm tra buổi học / giờ / danh sách lớp / đã điểm danh (trong bộ nhớ, không đọc file)
+        if not self.show_session_status(sessions.can_check_in(subject, name), subject, name):
             return
 
-        # 🕒 Kiểm tra giờ hiện tại so với giờ học
-        now_time = datetime.now().strftime("%H:%M")
-        start_time = session_info["start"]
-        end_time = session_info["end"]
-
-        if now_time < start_time:
-            messagebox.showwarning("⏰ Chưa tới giờ điểm danh",
-                                   f"Buổi học '{subject}' bắt đầu lúc {start_time}. Vui lòng chờ đến giờ.")
+        if self.session is not None:
             return
 
-        if now_time > end_time:
+        # Chỉ so khớp với sinh viên thuộc các môn đang mở (buổi học có thể vừa tới giờ bắt đầu)
+        apply_roster(sessions.active_names())
+
+        # Nhận diện chạy nền, frame được đưa lên canvas qua after()
+        self.checkin_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+        self.session = recognizer.RecognitionSession(timeout=CAMERA_TIMEOUT_SECONDS)
+        self.session.start()
+        self.after(CAMERA_POLL_MS, self.poll_recognition, name, student_id, subject)
+
+    def show_session_status(self, status, subject, name):
+        session = sessions.get(subject)
+        if status == session_engine.OPEN:
+            return True
+        if status == session_engine.NOT_OPEN:
+            messagebox.showerror("⛔ Chưa đến thời gian", f"Môn '{subject}' chưa được mở để điểm danh.")
+        elif status == session_engine.NOT_STARTED:
+            messagebox.showwarning("⏰ Chưa tới giờ điểm danh",
+                                   f"Buổi học '{subject}' bắt đầu lúc {session.to_json()['start']}. "
+                                   f"Vui lòng chờ đến giờ.")
+        elif status == session_engine.ENDED:
             messagebox.showerror("⛔ Quá giờ điểm danh",
-                                 f"Buổi học '{subject}' đã kết thúc lúc {end_time}. Không thể điểm danh nữa.")
+                                 f"Buổi học '{subject}' đã kết thúc lúc {session.to_json()['end']}. "
+                                 f"Không thể điểm danh nữa.")
+        elif status == session_engine.DUPLICATE:
+            messagebox.showinfo("Thông báo", f"{name} đã điểm danh môn {subject} rồi.")
+        elif status == session_engine.NOT_IN_ROSTER:
+            messagebox.showerror("❌ Không có trong danh sách", f"{name} không thuộc danh sách lớp môn {subject}.")
+        return False
+
+    def cancel_recognition(self):
+        if self.session is not None:
+            self.session.cancel()
+
+    def poll_recognition(self, name, student_id, subject):
+        frame = None
+        while True:
+            try:
+                frame = self.session.frames.get_nowait()
+            except queue.Empty:
+                break
+        if frame is not None:
+            self.draw_camera_frame(frame)
+
+        try:
+            status, recognized_name = self.session.results.get_nowait()
+        except queue.Empty:
+            self.after(CAMERA_POLL_MS, self.poll_recognition, name, student_id, subject)
             return
 
-        messagebox.showinfo("Điểm danh", f"Camera đang mở cho môn {subject}. Nhấn Q để thoát.")
-        recognized_name = start_attendance()
+        self.session = None
+        self.checkin_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        self.finish_recognition(status, recognized_name, name, student_id, subject)
+
+    def draw_camera_frame(self, rgb):
+        img = Image.fromarray(rgb)
+        img.thumbnail(CAMERA_VIEW_SIZE)
+        self.photo = ImageTk.PhotoImage(img)
+        self.canvas.delete("all")
+        self.canvas.create_image(CAMERA_VIEW_SIZE[0] // 2, CAMERA_VIEW_SIZE[1] // 2, image=self.photo)
+
+    def finish_recognition(self, status, recognized_name, name, student_id, subject):
+        if status == "cancelled":
+            return
+        if status == "timeout":
+            messagebox.showerror("⏰ Hết thời gian", "Không nhận diện được khuôn mặt trong thời gian cho phép.")
+            return
 
         if recognized_name == "unknown" or recognized_name == "Không xác định":
             messagebox.showerror("❌ Thất bại", "Không nhận diện được khuôn mặt hợp lệ.")
@@ -314,16 +597,10 @@ class StudentFrame(tk.Frame):
                                    f"nhưng bạn chọn '{name}'. Vui lòng chọn đúng tên đã đăng ký.")
             return
 
-        now = datetime.now()
-        date, time = now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")
-        log_path = os.path.join(LOG_DIR, f"log_{subject}_{date}.csv")
-
-        df = pd.DataFrame([[name, student_id, subject, date, time]],
-                          columns=["Name", "StudentID", "Subject", "Date", "Time"])
-        if os.path.exists(log_path):
-            old_df = pd.read_csv(log_path)
-            df = pd.concat([old_df, df], ignore_index=True)
-        df.to_csv(log_path, index=False)
+        status = sessions.check_in(subject, name, student_id)
+        if status != session_engine.CHECKED_IN:
+            self.show_session_status(status, subject, name)
+            return
 
         messagebox.showinfo("Thành công", f"✅ {name} ({student_id}) đã điểm danh môn {subject} thành công!")
 
@@ -332,5 +609,6 @@ class StudentFrame(tk.Frame):
 # 🚀 Chạy chương trình
 # ===============================
 if __name__ == "__main__":
+    mark("imports done")
     app = AttendanceApp()
     app.mainloop()
@@ -0,0 +1,263 @@
+import os
+import csv
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình báo cáo điểm danh
+# ===============================
+REPORT_CACHE_PATH = "attendance_report_cache.npz"
+SESSION_PATH = "session.json"
+LATE_GRACE_MINUTES = 15     # đến sau giờ bắt đầu quá số phút này → tính là đi muộn
+REPORT_COLUMNS = ("Name", "Attended", "Sessions", "Rate (%)", "Late", "Avg late (min)")
+
+
+def to_day(date):
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def from_day(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+def to_seconds(t):
+    parts = [int(p) for p in str(t).split(":")]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def load_schedule(path=SESSION_PATH):
+    # session.json → {(môn, ngày): giờ bắt đầu tính bằng giây}
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        history = json.load(f).get("history", {})
+    return {(subject, date): to_seconds(start)
+            for subject, days in history.items() for date, start in days.items()}
+
+
+# ===============================
+# 🧱 Bộ đệm dạng cột (NumPy) trên kho điểm danh, cập nhật tăng dần
+# ===============================
+class AttendanceColumns:
+    def __init__(self):
+        self.names, self.subjects, self.student_ids = [], [], []
+        self._name_ix, self._subject_ix, self._sid_ix = {}, {}, {}
+        self.row_id = np.zeros(0, dtype=np.int64)
+        self.name = np.zeros(0, dtype=np.int32)
+        self.subject = np.zeros(0, dtype=np.int32)     # -1: bản ghi không có môn (attendance.csv cũ)
+        self.sid = np.zeros(0, dtype=np.int32)
+        self.day = np.zeros(0, dtype=np.int32)
+        self.sec = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.row_id)
+
+    @property
+    def last_id(self):
+        return int(self.row_id[-1]) if len(self.row_id) else 0
+
+    @staticmethod
+    def _intern(value, table, index):
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        return i
+
+    def append(self, rows):
+        # rows: [(id, name, student_id, subject, date, time)]
+        if not rows:
+            return
+        cols = list(zip(*rows))
+        self.row_id = np.concatenate([self.row_id, np.asarray(cols[0], dtype=np.int64)])
+        self.name = np.concatenate([self.name, np.array(
+            [self._intern(v, self.names, self._name_ix) for v in cols[1]], dtype=np.int32)])
+        self.sid = np.concatenate([self.sid, np.array(
+            [self._intern(v or "", self.student_ids, self._sid_ix) for v in cols[2]], dtype=np.int32)])
+        self.subject = np.concatenate([self.subject, np.array(
+            [self._intern(v, self.subjects, self._subject_ix) if v else -1 for v in cols[3]], dtype=np.int32)])
+        self.day = np.concatenate([self.day, np.array([to_day(v) for v in cols[4]], dtype=np.int32)])
+        self.sec = np.concatenate([self.sec, np.array([to_seconds(v) for v in cols[5]], dtype=np.int32)])
+
+    def refresh(self, store):
+        # Chỉ đọc bản ghi mới theo id; nếu số bản ghi không khớp (đã xóa) → dựng lại từ đầu
+        count, max_id = store.stats()
+        if len(self) > count or (len(self) and self.last_id > max_id):
+            self.__init__()
+        added = 0
+        for chunk in store.rows_since(self.last_id):
+            self.append(chunk)
+            added += len(chunk)
+        if len(self) != count:
+            self.__init__()
+            return self.refresh(store)
+        return added
+
+    # ====== Lưu / đọc bộ đệm ======
+    def save(self, path=REPORT_CACHE_PATH):
+        meta = json.dumps({"names": self.names, "subjects": self.subjects, "student_ids": self.student_ids},
+                          ensure_ascii=False)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, row_id=self.row_id, name=self.name, subject=self.subject, sid=self.sid,
+                 day=self.day, sec=self.sec, meta=np.array(meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=REPORT_CACHE_PATH):
+        self = cls()
+        if not os.path.exists(path):
+            return self
+        try:
+            data = np.load(path, allow_pickle=False)
+            meta = json.loads(str(data["meta"]))
+            for key in ("row_id", "name", "subject", "sid", "day", "sec"):
+                setattr(self, key, data[key])
+        except (OSError, KeyError, ValueError) as e:
+            print("⚠️ Bộ đệm báo cáo hỏng, dựng lại:", e)
+            return cls()
+        self.names, self.subjects, self.student_ids = meta["names"], meta["subjects"], meta["student_ids"]
+        self._name_ix = {v: i for i, v in enumerate(self.names)}
+        self._subject_ix = {v: i for i, v in enumerate(self.subjects)}
+        self._sid_ix = {v: i for i, v in enumerate(self.student_ids)}
+        return self
+
+    # ===============================
+    # 📊 Tổng hợp
+    # ===============================
+    def mask(self, subject=None, date_from=None, date_to=None):
+        m = np.ones(len(self), dtype=bool)
+        if subject is not None:
+            m &= self.subject == self._subject_ix.get(subject, -2)
+        if date_from is not None:
+            m &= self.day >= to_day(date_from)
+        if date_to is not None:
+            m &= self.day <= to_day(date_to)
+        return m
+
+    def rows(self, subject=None, date=None, name=None):
+        # Các bản ghi thô (giống AttendanceStore.query) lấy từ bộ đệm, không truy vấn SQLite
+        m = self.mask(subject, date, date)
+        if name is not None:
+            m &= self.name == self._name_ix.get(name, -1)
+        idx = np.flatnonzero(m)
+        idx = idx[np.lexsort((self.sec[idx], self.day[idx]))]
+        return [(self.names[self.name[i]], self.student_ids[self.sid[i]] or None,
+                 self.subjects[self.subject[i]] if self.subject[i] >= 0 else None,
+                 from_day(self.day[i]), "%02d:%02d:%02d" % (self.sec[i] // 3600, self.sec[i] // 60 % 60, self.sec[i] % 60))
+                for i in idx]
+
+    def first_checkins(self, m):
+        # Mỗi (sinh viên, môn, ngày) → lần điểm danh sớm nhất
+        n_days = int(self.day.max()) + 1 if len(self) else 1
+        key = (self.name[m].astype(np.int64) * (len(self.subjects) + 1) + self.subject[m]) * n_days + self.day[m]
+        order = np.lexsort((self.sec[m], key))
+        key, first = np.unique(key[order], return_index=True)
+        sec = self.sec[m][order][first]
+        day = key % n_days
+        subject = (key // n_days) % (len(self.subjects) + 1)
+        name = key // n_days // (len(self.subjects) + 1)
+        return name, subject, day, sec
+
+    def student_report(self, students=(), subject=None, date_from=None, date_to=None, schedule=None,
+                       grace_minutes=LATE_GRACE_MINUTES):
+        # → [(tên, số buổi có mặt, số buổi đã học, tỉ lệ %, số lần muộn, số phút muộn trung bình)]
+        schedule = schedule or {}
+        m = self.mask(subject, date_from, date_to) & (self.subject >= 0)
+        name, subj, day, sec = self.first_checkins(m)
+
+        # Buổi đã học = (môn, ngày) có ít nhất một lượt điểm danh hoặc có trong lịch sử mở buổi
+        held = set(zip(subj.tolist(), day.tolist()))
+        lo = to_day(date_from) if date_from else None
+        hi = to_day(date_to) if date_to else None
+        for (s, date) in schedule:
+            d = to_day(date)
+            if s in self._subject_ix and (subject is None or s == subject) \
+                    and (lo is None or d >= lo) and (hi is None or d <= hi):
+                held.add((self._subject_ix[s], d))
+        n_held = len(held)
+
+        start = np.array([schedule.get((self.subjects[s], from_day(d)), -1) for s, d in zip(subj, day)],
+                         dtype=np.int64)
+        late_min = np.where(start >= 0, (sec - start) / 60.0, 0.0)
+        is_late = late_min > grace_minutes
+
+        n = len(self.names)
+        attended = np.bincount(name, minlength=n)
+        late_count = np.bincount(name, weights=is_late, minlength=n)
+        late_sum = np.bincount(name, weights=np.where(is_late, late_min, 0.0), minlength=n)
+
+        report = []
+        for who in sorted(set(students) | {self.names[i] for i in np.flatnonzero(attended)}):
+            i = self._name_ix.get(who)
+            a = int(attended[i]) if i is not None else 0
+            lc = int(late_count[i]) if i is not None else 0
+            avg = float(late_sum[i] / lc) if lc else 0.0
+            rate = 100.0 * a / n_held if n_held else 0.0
+            report.append((who, a, n_held, round(rate, 1), lc, round(avg, 1)))
+        return report
+
+    def absentees(self, students, subject, date):
+        present = {r[0] for r in self.rows(subject, date)}
+        return sorted(set(students) - present)
+
+
+# ===============================
+# 🗂️ Báo cáo dùng chung cho giao diện (bộ đệm lưu ra đĩa giữa các lần chạy)
+# ===============================
+class AttendanceReport:
+    def __init__(self, store=None, cache_path=REPORT_CACHE_PATH, session_path=SESSION_PATH):
+        self.store = store
+        self.cache_path = cache_path
+        self.session_path = session_path
+        self.columns = AttendanceColumns.load(cache_path)
+
+    def refresh(self):
+        if self.store is None:
+            from attendance_store import get_store
+            self.store = get_store()
+        # File log mới trong logs/ được nhập vào kho (chỉ file mới / đã đổi), sau đó kéo phần mới về bộ đệm
+        self.store.import_legacy()
+        added = self.columns.refresh(self.store)
+        if added:
+            self.columns.save(self.cache_path)
+        return self.columns
+
+    def student_report(self, students=(), subject=None, date_from=None, date_to=None):
+        return self.refresh().student_report(students, subject, date_from, date_to,
+                                             load_schedule(self.session_path))
+
+    def absentees(self, students, subject, date=None):
+        return self.refresh().absentees(students, subject, date or datetime.now().strftime("%Y-%m-%d"))
+
+
+def export_rows(dest, header, rows):
+    with open(dest, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Báo cáo điểm danh nhiều ngày")
+    parser.add_argument("--subject")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--out", help="Ghi báo cáo ra file CSV")
+    args = parser.parse_args()
+
+    from student_manifest import load_student_names
+
+    report = AttendanceReport()
+    rows = report.student_report(load_student_names(), args.subject, args.date_from, args.date_to)
+    print("  ".join(f"{c:>14}" for c in REPORT_COLUMNS))
+    for row in rows:
+        print("  ".join(f"{str(v):>14}" for v in row))
+    if args.subject:
+        print(f"❌ Vắng hôm nay ({args.subject}): {', '.join(report.absentees(load_student_names(), args.subject)) or 'không có'}")
+    if args.out:
+        export_rows(args.out, REPORT_COLUMNS, rows)
+        print(f"✅ Đã ghi {args.out}")
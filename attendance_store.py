@@ -0,0 +1,226 @@
+import os
+import csv
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# ===============================
+# ⚙️ Cấu hình lưu trữ điểm danh
+# ===============================
+DB_PATH = "attendance.db"
+LEGACY_ATTENDANCE_CSV = "attendance.csv"
+LOG_DIR = "logs"
+COLUMNS = ("Name", "StudentID", "Subject", "Date", "Time")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    student_id TEXT,
+    subject TEXT,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    UNIQUE (name, student_id, subject, date, time)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_subject_date ON attendance (subject, date);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date);
+CREATE INDEX IF NOT EXISTS idx_attendance_name ON attendance (name, date);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+# UNIQUE của SQLite coi các NULL là khác nhau → bản ghi không có mã SV / môn (attendance.csv,
+# mark_attendance) không bao giờ bị coi là trùng. Khóa thật sự dùng COALESCE(..., '').
+UNIQUE_INDEX = "idx_attendance_unique"
+DEDUPE = """
+DELETE FROM attendance WHERE id NOT IN (
+    SELECT MIN(id) FROM attendance
+    GROUP BY name, COALESCE(student_id, ''), COALESCE(subject, ''), date, time
+);
+"""
+UNIQUE_SCHEMA = f"""
+CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX}
+    ON attendance (name, COALESCE(student_id, ''), COALESCE(subject, ''), date, time);
+"""
+
+
+# ===============================
+# 🗄️ Kho điểm danh SQLite (WAL): ghi O(1), nhiều kiosk ghi cùng lúc an toàn
+# ===============================
+class AttendanceStore:
+    def __init__(self, path=DB_PATH, batch_size=1):
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._ensure_unique_index()
+
+    def _ensure_unique_index(self):
+        # DB cũ có thể đã chứa bản ghi trùng do import lại → xóa trùng (giữ id nhỏ nhất) rồi mới tạo index
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                   (UNIQUE_INDEX,)).fetchone()
+        if exists:
+            return
+        with self.conn:
+            removed = self.conn.execute(DEDUPE).rowcount
+            self.conn.executescript(UNIQUE_SCHEMA)
+        if removed > 0:
+            print(f"🧹 Đã xóa {removed} bản ghi điểm danh trùng.")
+
+    def add(self, name, student_id=None, subject=None, date=None, time=None):
+        now = datetime.now()
+        row = (name, student_id, subject,
+               date or now.strftime("%Y-%m-%d"), time or now.strftime("%H:%M:%S"))
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        # Một transaction cho cả batch; bản ghi trùng (import lại) bị bỏ qua
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, student_id, subject, date, time) "
+                "VALUES (?, ?, ?, ?, ?)", self.pending)
+        self.pending = []
+
+    @contextmanager
+    def batch(self):
+        # Gom nhiều lần add() thành một lần commit
+        old = self.batch_size
+        self.batch_size = float("inf")
+        try:
+            yield self
+        finally:
+            self.batch_size = old
+            self.flush()
+
+    def query(self, subject=None, date=None, name=None, student_id=None):
+        clauses, params = [], []
+        for col, val in (("subject", subject), ("date", date), ("name", name), ("student_id", student_id)):
+            if val is not None:
+                clauses.append(f"{col} = ?")
+                params.append(val)
+        sql = "SELECT name, student_id, subject, date, time FROM attendance"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date, time, id"
+        self.flush()
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def rows_since(self, last_id=0, chunk=5000):
+        # Đọc dần các bản ghi mới (id > last_id) theo từng khối → [(id, name, student_id, subject, date, time)]
+        self.flush()
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, name, student_id, subject, date, time FROM attendance "
+                    "WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def stats(self):
+        # (số bản ghi, id lớn nhất) — dùng để phát hiện xóa / thêm mới
+        self.flush()
+        with self.lock:
+            count, max_id = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM attendance").fetchone()
+        return count, max_id
+
+    def has_checked_in(self, name, subject, date):
+        self.flush()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM attendance WHERE subject = ? AND date = ? AND name = ? LIMIT 1",
+                (subject, date, name)).fetchone()
+        return row is not None
+
+    def delete(self, subject, date=None):
+        self.flush()
+        sql, params = "DELETE FROM attendance WHERE subject = ?", [subject]
+        if date is not None:
+            sql += " AND date = ?"
+            params.append(date)
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params).rowcount
+
+    def export_csv(self, dest, **filters):
+        rows = self.query(**filters)
+        with open(dest, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+        return len(rows)
+
+    # ===============================
+    # 📥 Nhập dữ liệu CSV cũ
+    # ===============================
+    def import_csv(self, path):
+        # Hỗ trợ attendance.csv (Name, Date, Time) và logs/log_<môn>_<ngày>.csv (đủ 5 cột)
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [(r.get("Name"), r.get("StudentID") or None, r.get("Subject") or None,
+                     r.get("Date"), r.get("Time")) for r in csv.DictReader(f)]
+        rows = [r for r in rows if r[0] and r[3] and r[4]]
+        with self.lock:
+            self.pending.extend(rows)
+            self._flush_locked()
+        return len(rows)
+
+    def import_legacy(self, attendance_csv=LEGACY_ATTENDANCE_CSV, log_dir=LOG_DIR):
+        # Chỉ nhập file mới hoặc đã thay đổi kể từ lần nhập trước
+        paths = []
+        if os.path.exists(attendance_csv):
+            paths.append(attendance_csv)
+        if os.path.isdir(log_dir):
+            paths += [os.path.join(log_dir, f) for f in sorted(os.listdir(log_dir))
+                      if f.startswith("log_") and f.endswith(".csv")]
+
+        imported = 0
+        for path in paths:
+            st = os.stat(path)
+            with self.lock:
+                seen = self.conn.execute("SELECT mtime, size FROM imported_files WHERE path = ?",
+                                         (path,)).fetchone()
+            if seen == (st.st_mtime, st.st_size):
+                continue
+            imported += self.import_csv(path)
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?)",
+                                  (path, st.st_mtime, st.st_size))
+        return imported
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=DB_PATH):
+    # Một kết nối dùng chung cho cả tiến trình; lần đầu mở sẽ nhập các file CSV cũ
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AttendanceStore(path)
+            n = _store.import_legacy()
+            if n:
+                print(f"📥 Đã nhập {n} bản ghi điểm danh từ CSV cũ.")
+        return _store
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình benchmark
+# ===============================
+FACES_PER_FRAME = (1, 2, 4, 8, 16, 32)
+GALLERY_SIZES = (100, 1000, 10000, 50000)
+SCALING_REPEATS = 20
+MARK_REPEATS = 200
+WARMUP = 2                  # số lần chạy bỏ qua đầu mỗi stage (khởi tạo graph, cache)
+MEMORY_SAMPLES = 3          # số input chạy lại với tracemalloc để đo bộ nhớ đỉnh (không tính giờ)
+REGRESSION_RATIO = 1.2      # chậm hơn 20% so với bản trước → báo hồi quy
+REGRESSION_MIN_MS = 0.5     # bỏ qua chênh lệch nhỏ hơn mức nhiễu đo
+
+
+def summarize(ms):
+    arr = np.asarray(ms, dtype=np.float64)
+    if not len(arr):
+        return {"n": 0}
+    return {"n": int(len(arr)), "mean_ms": float(arr.mean()), "p50_ms": float(np.percentile(arr, 50)),
+            "p95_ms": float(np.percentile(arr, 95)), "p99_ms": float(np.percentile(arr, 99)),
+            "min_ms": float(arr.min()), "max_ms": float(arr.max())}
+
+
+def run_stage(name, fn, inputs, results):
+    # Chạy fn trên từng input, ghi phân phối độ trễ + bộ nhớ Python đỉnh của stage.
+    # tracemalloc làm chậm mọi cấp phát (IVF chậm ~3.5×) → đo thời gian khi tắt tracing,
+    # bộ nhớ đỉnh đo ở một lượt riêng trên vài input đầu, không bấm giờ.
+    times = []
+    try:
+        for x in list(inputs[:1]) * WARMUP:
+            fn(x)
+        tracemalloc.start()
+        try:
+            for x in inputs[:MEMORY_SAMPLES]:
+                fn(x)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            times.append((time.perf_counter() - t0) * 1000)
+        stats = summarize(times)
+        stats["peak_py_mb"] = peak / 2 ** 20
+    except Exception as e:
+        stats = {"n": len(times), "error": f"{type(e).__name__}: {e}"}
+    results[name] = stats
+    if "error" in stats:
+        print(f"   ⚠️ {name:<28} lỗi: {stats['error']}")
+    elif stats["n"]:
+        print(f"   {name:<30} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+              f"(n={stats['n']}, peak {stats['peak_py_mb']:.1f} MB)")
+    return stats
+
+
+def max_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 2 ** 20 if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        return None
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "git_commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count()}
+
+
+# ===============================
+# 🎞️ Các stage trên frame thật (cần mô hình)
+# ===============================
+def bench_pipeline(frames, results):
+    import face_recognition_attendance as fra
+
+    fra.load_models()
+    detections = []
+
+    def detect(rgb):
+        detections.append((rgb, fra.detector.detect_faces(rgb)))
+
+    run_stage("detect", detect, frames, results)
+    detections = detections[-len(frames):]
+
+    if fra.quality_gate is not None:
+        run_stage("quality_gate", lambda d: fra.quality_gate.filter(*d), detections, results)
+
+    crops = []
+    for rgb, faces in detections:
+        boxes, keypoints = fra.face_boxes(faces)
+        crops += fra.crop_boxes(rgb, boxes, keypoints)[1]
+    results["faces_detected"] = len(crops)
+    if not crops:
+        print("   ⚠️ Không tìm thấy khuôn mặt nào trong frame, bỏ qua các stage embedding.")
+        return
+
+    def represent(face):
+        from deepface import DeepFace
+        DeepFace.represent(img_path=face, model_name="Facenet", enforce_detection=False)
+
+    run_stage("deepface_represent", represent, crops, results)
+    run_stage("embed_batched_per_face", lambda c: fra.embedder.embed([c]), crops, results)
+
+    embs = fra.embedder.embed(crops)
+    if os.path.exists(fra.SVM_PATH):
+        # Đường cũ bằng sklearn (từng khuôn mặt) để so sánh với SVMHead
+        with open(fra.SVM_PATH, "rb") as f:
+            svm = pickle.load(f)
+        with open(fra.LABEL_ENCODER_PATH, "rb") as f:
+            encoder = pickle.load(f)
+        run_stage("svm_predict_proba", lambda e: svm.predict_proba([e]), embs, results)
+        idx = [int(np.argmax(svm.predict_proba([e])[0])) for e in embs]
+        run_stage("label_inverse_transform", lambda i: encoder.inverse_transform([i]), idx, results)
+        names = encoder.inverse_transform(idx)
+        run_stage("mean_cosine_sim", lambda p: fra.mean_cosine_sim(p[0], p[1]), list(zip(embs, names)), results)
+    if fra.classifier is not None:
+        run_stage("svm_head_predict", lambda e: fra.classifier.predict(e), embs, results)
+        run_stage("svm_head_predict_batch", fra.classifier.predict, [embs] * SCALING_REPEATS, results)
+    run_stage("classify_embeddings_batch", fra.classify_embeddings, [embs] * SCALING_REPEATS, results)
+
+    # Toàn bộ vòng xử lý một frame (detect + embed + phân loại), không tracker
+    fra.tracker = None
+    bgr_frames = [np.ascontiguousarray(f[:, :, ::-1]) for f in frames]
+    stats = run_stage("end_to_end_frame", fra.process_frame, bgr_frames, results)
+    if stats.get("n"):
+        results["end_to_end_fps"] = 1000.0 / stats["mean_ms"]
+
+
+def bench_mark_attendance(results):
+    from attendance_store import AttendanceStore
+
+    tmp = tempfile.mkdtemp()
+    try:
+        store = AttendanceStore(os.path.join(tmp, "bench.db"))
+        names = [f"sv{i}" for i in range(MARK_REPEATS)]
+        run_stage("mark_attendance_store", lambda n: store.add(n, "0", "bench"), names, results)
+        store.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ===============================
+# 📈 Đường cong mở rộng với embedding tổng hợp (không cần camera / mô hình)
+# ===============================
+def bench_faces_per_frame(results):
+    import face_recognition_attendance as fra
+
+    curve = []
+    rng = np.random.default_rng(0)
+    for n in FACES_PER_FRAME:
+        crops = [rng.integers(0, 255, (120, 100, 3), dtype=np.uint8) for _ in range(n)]
+        stats = run_stage(f"embed_batch_{n}_faces", fra.embedder.embed, [crops] * SCALING_REPEATS, results)
+        curve.append({"faces": n, **stats})
+    results["scaling_faces_per_frame"] = curve
+
+
+def bench_gallery_size(results):
+    from gallery_matcher import GalleryMatcher
+    from ann_index import IVFIndex, synthetic_gallery
+
+    curve = []
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((8, 128)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    for size in GALLERY_SIZES:
+        X, y = synthetic_gallery(max(1, size // 10), 10, seed=size)
+        g = GalleryMatcher(X, y)
+        row = {"gallery": size}
+        row["mean_sims"] = run_stage(f"gallery_{size}_mean_sims", g.mean_sims, [queries] * SCALING_REPEATS, results)
+        row["max_sims"] = run_stage(f"gallery_{size}_max_sims", g.max_sims, [queries] * SCALING_REPEATS, results)
+        index = IVFIndex.build(X, y)
+        index.min_gallery = 0       # đo đường probe IVF ở mọi kích thước để thấy điểm giao với tìm chính xác
+        row["ivf_identify"] = run_stage(f"gallery_{size}_ivf_identify", index.identify,
+                                        [queries] * SCALING_REPEATS, results)
+        curve.append(row)
+    results["scaling_gallery_size"] = curve
+
+
+# ===============================
+# 🔍 So sánh với kết quả trước
+# ===============================
+def compare(old, new):
+    regressions = []
+    for name, stats in new["stages"].items():
+        prev = old.get("stages", {}).get(name)
+        if not isinstance(stats, dict) or not isinstance(prev, dict):
+            continue
+        if "p50_ms" in stats and prev.get("p50_ms"):
+            ratio = stats["p50_ms"] / prev["p50_ms"]
+            slower = ratio > REGRESSION_RATIO and stats["p50_ms"] - prev["p50_ms"] > REGRESSION_MIN_MS
+            mark = "🔺" if slower else "  "
+            print(f"   {mark} {name:<30} {prev['p50_ms']:9.3f} → {stats['p50_ms']:9.3f} ms (x{ratio:.2f})")
+            if slower:
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đường nhận diện (không cần camera)")
+    parser.add_argument("--source", help="File video hoặc thư mục frame đã ghi")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--synthetic-only", action="store_true",
+                        help="Chỉ chạy phần dùng embedding tổng hợp (không tải TensorFlow)")
+    parser.add_argument("--out", default=f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để phát hiện hồi quy")
+    args = parser.parse_args()
+
+    report = {"env": environment(), "stages": {}}
+    stages = report["stages"]
+    print("📊 Benchmark đường nhận diện")
+
+    if not args.synthetic_only:
+        if args.source:
+            from face_detector import load_frames
+
+            frames = load_frames(args.source, args.limit, args.stride)
+            print(f"🎞️ {len(frames)} frame từ {args.source}")
+            report["frames"] = len(frames)
+            bench_pipeline(frames, stages)
+        bench_faces_per_frame(stages)
+    bench_mark_attendance(stages)
+    bench_gallery_size(stages)
+    report["max_rss_mb"] = max_rss_mb()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Đã ghi kết quả → {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, report)
+        if regressions:
+            raise SystemExit(f"❌ Hồi quy hiệu năng: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
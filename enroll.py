@@ -0,0 +1,267 @@
+import os
+import time
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình đăng ký khuôn mặt
+# ===============================
+MODEL_DIR = "face_models_facenet"
+EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+SVM_PATH = os.path.join(MODEL_DIR, "svm_facenet.pkl")
+LABEL_ENCODER_PATH = os.path.join(MODEL_DIR, "label_encoder_facenet.pkl")
+CACHE_PATH = os.path.join(MODEL_DIR, "enroll_cache.npz")
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+CHUNK_SIZE = 16            # số ảnh mỗi tác vụ gửi cho tiến trình con (= batch embedding)
+CHECKPOINT_EVERY = 64      # ghi cache sau mỗi N ảnh để có thể chạy tiếp khi bị ngắt
+EMBEDDING_DIM = 128
+CACHE_VERSION = 2          # tăng khi đổi cách cắt crop / tiền xử lý ảnh đăng ký
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def scan_dataset(root):
+    # dataset/<tên sinh viên>/<ảnh> → [(tên, đường dẫn)]
+    items = []
+    for person in sorted(os.listdir(root)):
+        pdir = os.path.join(root, person)
+        if not os.path.isdir(pdir):
+            continue
+        for fname in sorted(os.listdir(pdir)):
+            if fname.lower().endswith(IMAGE_EXTS):
+                items.append((person, os.path.join(pdir, fname)))
+    return items
+
+
+# ===============================
+# 💾 Cache embedding theo hash nội dung ảnh
+# ===============================
+def cache_tag(detector_backend):
+    # Embedding phụ thuộc detector + cách cắt/xoay crop → đổi một trong hai thì cache cũ không dùng được
+    from face_quality import ALIGN_MIN_ROLL_DEG
+
+    return f"v{CACHE_VERSION}|detector={detector_backend}|align_roll={ALIGN_MIN_ROLL_DEG:g}"
+
+
+def load_cache(path=CACHE_PATH, tag=None):
+    if not os.path.exists(path):
+        return {}
+    data = np.load(path, allow_pickle=False)
+    stored = str(data["tag"]) if "tag" in data.files else None
+    if tag is not None and stored != tag:
+        print(f"♻️ Cache embedding được tạo với cấu hình khác ({stored or 'chưa gắn nhãn'}), embed lại toàn bộ.")
+        return {}
+    # Ảnh không tìm thấy mặt được lưu với valid=False để không xử lý lại
+    return {h: (emb if ok else None)
+            for h, emb, ok in zip(data["hashes"], data["embeddings"], data["valid"])}
+
+
+def save_cache(cache, path=CACHE_PATH, tag=""):
+    hashes = np.array(list(cache.keys()), dtype="U40")
+    valid = np.array([e is not None for e in cache.values()], dtype=bool)
+    embs = np.zeros((len(cache), EMBEDDING_DIM), dtype=np.float32)
+    for i, e in enumerate(cache.values()):
+        if e is not None:
+            embs[i] = e
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, hashes=hashes, embeddings=embs, valid=valid, tag=np.array(tag))
+    os.replace(tmp, path)
+
+
+# ===============================
+# 🧵 Tiến trình con: detect + embed một nhóm ảnh
+# ===============================
+_worker = {}
+
+
+def _init_worker(detector_backend):
+    from face_detector import create_detector
+    from face_embedder import FacenetEmbedder
+
+    _worker["detector"] = create_detector(detector_backend)
+    _worker["embedder"] = FacenetEmbedder()
+    _worker["embedder"].load()
+
+
+def _embed_chunk(chunk):
+    import cv2
+    from face_quality import align_crop
+
+    keys, crops = [], []
+    out = {}
+    for h, path in chunk:
+        img = cv2.imread(path)
+        if img is None:
+            out[h] = None
+            continue
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        faces = _worker["detector"].detect_faces(rgb)
+        if not faces:
+            out[h] = None
+            continue
+        # Ảnh đăng ký chỉ có một người → lấy khuôn mặt lớn nhất
+        face = max(faces, key=lambda f: f["box"][2] * f["box"][3])
+        x, y, w, h_box = face["box"]
+        x, y = max(0, x), max(0, y)
+        # Xoay thẳng giống lúc nhận diện để embedding gallery và embedding truy vấn cùng phân phối
+        crop = align_crop(rgb, (x, y, w, h_box), face.get("keypoints"))
+        if crop.size == 0:
+            out[h] = None
+            continue
+        keys.append(h)
+        crops.append(crop)
+
+    if crops:
+        for h, emb in zip(keys, _worker["embedder"].embed(crops)):
+            out[h] = emb
+    return out
+
+
+def embed_missing(todo, cache, workers, detector_backend, tag=""):
+    chunks = [todo[i:i + CHUNK_SIZE] for i in range(0, len(todo), CHUNK_SIZE)]
+    done, since_ckpt = 0, 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(detector_backend,)) as pool:
+        futures = [pool.submit(_embed_chunk, c) for c in chunks]
+        for fut in as_completed(futures):
+            result = fut.result()
+            cache.update(result)
+            done += len(result)
+            since_ckpt += len(result)
+            if since_ckpt >= CHECKPOINT_EVERY:
+                save_cache(cache, tag=tag)
+                since_ckpt = 0
+            rate = done / (time.perf_counter() - t0)
+            print(f"   {done}/{len(todo)} ảnh ({rate:.1f} ảnh/giây)")
+    save_cache(cache, tag=tag)
+    elapsed = time.perf_counter() - t0
+    return done / elapsed if elapsed > 0 else 0.0
+
+
+# ===============================
+# 🧠 Cập nhật npz + bộ phân loại
+# ===============================
+def save_embeddings(X, y, path=EMBEDDINGS_NPZ, origins=None):
+    # origins[i] = cache_tag của cấu hình đã tạo embedding i ("" = không rõ, ví dụ npz từ notebook cũ)
+    if origins is None:
+        origins = np.full(len(y), "", dtype="U80")
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, embeddings=X, labels=y, origins=np.asarray(origins, dtype="U80"))
+    os.replace(tmp, path)
+
+
+def warn_mixed_origins(labels, origins, tag):
+    # Embedding cũ không được tạo lại (không còn ảnh gốc) → gallery trộn hai phân phối,
+    # khoảng cách giữa sinh viên cũ và mới không còn so sánh được tuyệt đối
+    stale = origins != tag
+    if not np.any(stale):
+        return
+    names = sorted(set(labels[stale]))
+    shown = ", ".join(names[:10]) + (" ..." if len(names) > 10 else "")
+    print(f"⚠️ {int(stale.sum())} embeddings của {len(names)} sinh viên được tạo bằng cấu hình khác "
+          f"(notebook cũ / detector hoặc cách cắt crop khác): {shown}")
+    print("   → Đăng ký lại ảnh của các sinh viên này (cùng chạy trong thư mục dataset) để dùng cùng cách embed.")
+
+
+def train_classifier(X, y):
+    from sklearn.svm import SVC
+    from sklearn.preprocessing import LabelEncoder
+
+    # Cùng cấu hình với mô hình đang dùng: SVC tuyến tính có xác suất
+    encoder = LabelEncoder().fit(y)
+    svm = SVC(kernel="linear", probability=True)
+    svm.fit(X, encoder.transform(y))
+    with open(SVM_PATH, "wb") as f:
+        pickle.dump(svm, f)
+    with open(LABEL_ENCODER_PATH, "wb") as f:
+        pickle.dump(encoder, f)
+
+
+def dataset_unchanged(X, y, path=EMBEDDINGS_NPZ):
+    if not os.path.exists(path):
+        return False
+    old = np.load(path, allow_pickle=True)
+    return (old["embeddings"].shape == X.shape and np.array_equal(old["labels"], y)
+            and np.allclose(old["embeddings"], X))
+
+
+def enroll(dataset_dir, workers=None, detector_backend="mtcnn", train=True, keep_existing=True):
+    items = scan_dataset(dataset_dir)
+    print(f"📂 {len(items)} ảnh của {len({p for p, _ in items})} sinh viên trong {dataset_dir}")
+
+    t0 = time.perf_counter()
+    hashes = [file_hash(path) for _, path in items]
+    tag = cache_tag(detector_backend)
+    cache = load_cache(tag=tag)
+    todo = list({h: path for h, (_, path) in zip(hashes, items) if h not in cache}.items())
+    print(f"🔁 {len(items) - len(todo)} ảnh đã có trong cache, {len(todo)} ảnh cần embed")
+
+    if todo:
+        rate = embed_missing(todo, cache, workers or os.cpu_count(), detector_backend, tag)
+        print(f"⚡ Throughput: {rate:.1f} ảnh/giây")
+
+    rows = [(person, cache[h]) for (person, _), h in zip(items, hashes) if cache.get(h) is not None]
+    skipped = len(items) - len(rows)
+    if skipped:
+        print(f"⚠️ Bỏ qua {skipped} ảnh không tìm thấy khuôn mặt.")
+    if not rows:
+        print("❌ Không có embedding nào để lưu.")
+        return
+
+    y = np.array([p for p, _ in rows])
+    X = np.stack([e for _, e in rows]).astype(np.float32)
+    origins = np.full(len(y), tag, dtype="U80")
+
+    # Giữ embeddings cũ của những sinh viên không có trong thư mục lần này
+    if keep_existing and os.path.exists(EMBEDDINGS_NPZ):
+        old = np.load(EMBEDDINGS_NPZ, allow_pickle=True)
+        keep = ~np.isin(old["labels"], np.unique(y))
+        if np.any(keep):
+            old_origins = old["origins"] if "origins" in old.files else np.full(len(old["labels"]), "")
+            X = np.concatenate([old["embeddings"][keep].astype(np.float32), X])
+            y = np.concatenate([old["labels"][keep].astype(str), y])
+            origins = np.concatenate([old_origins[keep].astype("U80"), origins])
+            warn_mixed_origins(y, origins, tag)
+
+    if dataset_unchanged(X, y):
+        print("✅ Embeddings không thay đổi, giữ nguyên mô hình.")
+        return
+
+    save_embeddings(X, y, origins=origins)
+    print(f"✅ Đã lưu {len(X)} embeddings của {len(set(y))} sinh viên → {EMBEDDINGS_NPZ}")
+    if train and len(set(y)) < 2:
+        print("⚠️ Chỉ có 1 sinh viên, chưa huấn luyện SVM (cần ít nhất 2) — giữ mô hình cũ.")
+    elif train:
+        # SVC không cập nhật tăng dần được: chỉ phần embed là tăng dần, SVM luôn fit lại trên toàn bộ npz
+        t_fit = time.perf_counter()
+        train_classifier(X, y)
+        print(f"✅ Đã huấn luyện lại toàn bộ SVM trên {len(X)} embeddings "
+              f"({time.perf_counter() - t_fit:.1f}s) → {SVM_PATH}")
+
+    from student_manifest import build_manifest
+    build_manifest(EMBEDDINGS_NPZ)
+    print(f"⏱️ Tổng thời gian: {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đăng ký khuôn mặt từ thư mục ảnh theo từng người")
+    parser.add_argument("dataset", help="Thư mục dạng <dataset>/<tên sinh viên>/<ảnh>")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình (mặc định: số CPU)")
+    parser.add_argument("--detector", default="mtcnn")
+    parser.add_argument("--no-train", action="store_true", help="Chỉ cập nhật npz, không huấn luyện SVM")
+    parser.add_argument("--replace", action="store_true",
+                        help="Bỏ embeddings của sinh viên không có trong thư mục (mặc định: giữ lại)")
+    args = parser.parse_args()
+    enroll(args.dataset, args.workers, args.detector, train=not args.no_train,
+           keep_existing=not args.replace)
@@ -0,0 +1,223 @@
+import os
+import time
+import argparse
+from collections import deque
+import cv2
+import numpy as np
+
+from face_tracker import iou
+
+# ===============================
+# ⚙️ Cấu hình detector
+# ===============================
+MODEL_DIR = "face_models_facenet"
+YUNET_MODEL_PATH = os.path.join(MODEL_DIR, "face_detection_yunet_2023mar.onnx")
+YUNET_SCORE_THRESH = 0.8
+DOWNSCALE_MAX_SIDE = 320     # MTCNN thu nhỏ: cạnh dài nhất của frame sau khi resize
+TIMING_WINDOW = 300          # số frame gần nhất giữ lại để thống kê thời gian
+MATCH_IOU = 0.5
+
+
+# ===============================
+# 🧩 Lớp cơ sở: cùng giao diện detect_faces() như MTCNN + đo thời gian
+# ===============================
+class FaceDetector:
+    name = "base"
+
+    def __init__(self):
+        self.timings = deque(maxlen=TIMING_WINDOW)
+
+    def _detect(self, rgb):
+        raise NotImplementedError
+
+    def detect_faces(self, rgb):
+        t0 = time.perf_counter()
+        faces = self._detect(rgb)
+        self.timings.append((time.perf_counter() - t0) * 1000)
+        return faces
+
+    def stats(self):
+        if not self.timings:
+            return {"backend": self.name, "frames": 0}
+        arr = np.array(self.timings)
+        return {"backend": self.name, "frames": len(arr), "mean_ms": float(arr.mean()),
+                "p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95))}
+
+
+class MTCNNDetector(FaceDetector):
+    name = "mtcnn"
+
+    def __init__(self):
+        super().__init__()
+        from mtcnn import MTCNN
+        self.mtcnn = MTCNN()
+
+    def _detect(self, rgb):
+        return self.mtcnn.detect_faces(rgb)
+
+
+class ScaledMTCNNDetector(MTCNNDetector):
+    # Chạy MTCNN trên frame thu nhỏ rồi phóng box/landmark về kích thước gốc
+    name = "mtcnn_scaled"
+
+    def __init__(self, max_side=DOWNSCALE_MAX_SIDE):
+        super().__init__()
+        self.max_side = max_side
+
+    def _detect(self, rgb):
+        scale = self.max_side / max(rgb.shape[:2])
+        if scale >= 1.0:
+            return self.mtcnn.detect_faces(rgb)
+
+        small = cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.mtcnn.detect_faces(small)
+        for f in faces:
+            f["box"] = [int(round(v / scale)) for v in f["box"]]
+            f["keypoints"] = {k: (int(round(px / scale)), int(round(py / scale)))
+                              for k, (px, py) in f.get("keypoints", {}).items()}
+        return faces
+
+
+class YuNetDetector(FaceDetector):
+    name = "yunet"
+
+    def __init__(self, model_path=YUNET_MODEL_PATH, score_thresh=YUNET_SCORE_THRESH):
+        super().__init__()
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Không tìm thấy mô hình YuNet: {model_path}")
+        self.net = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_thresh)
+        self.size = None
+
+    def _detect(self, rgb):
+        h, w = rgb.shape[:2]
+        if self.size != (w, h):
+            self.net.setInputSize((w, h))
+            self.size = (w, h)
+        _, rows = self.net.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        faces = []
+        for r in rows if rows is not None else []:
+            pts = r[4:14].reshape(5, 2).astype(int)
+            # YuNet: mắt phải, mắt trái, mũi, khóe miệng phải, khóe miệng trái (theo người trong ảnh)
+            faces.append({
+                "box": [int(r[0]), int(r[1]), int(r[2]), int(r[3])],
+                "confidence": float(r[14]),
+                "keypoints": {"left_eye": tuple(pts[0]), "right_eye": tuple(pts[1]),
+                              "nose": tuple(pts[2]), "mouth_left": tuple(pts[3]),
+                              "mouth_right": tuple(pts[4])},
+            })
+        return faces
+
+
+class HaarDetector(FaceDetector):
+    name = "haar"
+
+    def __init__(self, scale_factor=1.1, min_neighbors=5, min_size=(40, 40)):
+        super().__init__()
+        path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(path)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def _detect(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                              minSize=self.min_size)
+        # Haar không có độ tin cậy / landmark → confidence 1.0, keypoints rỗng
+        return [{"box": [int(v) for v in b], "confidence": 1.0, "keypoints": {}} for b in boxes]
+
+
+DETECTORS = {
+    "mtcnn": MTCNNDetector,
+    "mtcnn_scaled": ScaledMTCNNDetector,
+    "yunet": YuNetDetector,
+    "haar": HaarDetector,
+}
+
+
+def create_detector(backend="mtcnn", **kwargs):
+    if backend not in DETECTORS:
+        raise ValueError(f"Detector không hỗ trợ: {backend} (chọn: {', '.join(DETECTORS)})")
+    return DETECTORS[backend](**kwargs)
+
+
+# ===============================
+# 📊 Benchmark recall / ms mỗi frame trên frame đã ghi
+# ===============================
+def load_frames(source, limit=None, stride=1):
+    # source: thư mục ảnh hoặc file video → danh sách frame RGB
+    frames = []
+    if os.path.isdir(source):
+        for fname in sorted(os.listdir(source))[::stride]:
+            img = cv2.imread(os.path.join(source, fname))
+            if img is not None:
+                frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            if limit and len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        idx = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret or (limit and len(frames) >= limit):
+                break
+            if idx % stride == 0:
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            idx += 1
+        cap.release()
+    return frames
+
+
+def match_recall(reference, detected):
+    # Tỉ lệ box tham chiếu được detector khớp với IoU >= MATCH_IOU
+    hit, total = 0, 0
+    for ref_faces, det_faces in zip(reference, detected):
+        total += len(ref_faces)
+        used = set()
+        for rf in ref_faces:
+            for j, df in enumerate(det_faces):
+                if j not in used and iou(rf["box"], df["box"]) >= MATCH_IOU:
+                    used.add(j)
+                    hit += 1
+                    break
+    return hit / total if total else 1.0
+
+
+def benchmark(frames, backends, reference="mtcnn"):
+    outputs, results = {}, []
+    for name in dict.fromkeys([reference] + list(backends)):
+        try:
+            det = create_detector(name)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua {name}: {e}")
+            continue
+        outputs[name] = [det.detect_faces(f) for f in frames]
+        results.append(det.stats())
+
+    # Không có detector tham chiếu → không có ground truth, recall để trống thay vì 1.0
+    if reference not in outputs:
+        print(f"⚠️ Detector tham chiếu '{reference}' không chạy được: recall = N/A")
+    for r in results:
+        ref = outputs.get(reference)
+        r["recall"] = match_recall(ref, outputs[r["backend"]]) if ref is not None else None
+        r["faces"] = sum(len(fs) for fs in outputs[r["backend"]])
+        recall = f"{r['recall']:.3f}" if r["recall"] is not None else "N/A"
+        print(f"   {r['backend']:<13} {r['mean_ms']:8.1f} ms/frame (p95 {r['p95_ms']:.1f})"
+              f"  recall={recall}  faces={r['faces']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh các detector khuôn mặt")
+    parser.add_argument("source", help="Thư mục ảnh hoặc file video đã ghi")
+    parser.add_argument("--backends", default=",".join(DETECTORS))
+    parser.add_argument("--reference", default="mtcnn")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--stride", type=int, default=1)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.limit, args.stride)
+    if not frames:
+        raise SystemExit(f"❌ Không đọc được frame nào từ {args.source}")
+    print(f"🎞️ {len(frames)} frame, tham chiếu: {args.reference}")
+    benchmark(frames, args.backends.split(","), args.reference)
@@ -0,0 +1,119 @@
+import threading
+import cv2
+import numpy as np
+
+# ===============================
+# ⚙️ Ngưỡng chất lượng khuôn mặt trước khi embed
+# ===============================
+MIN_FACE_SIZE = 40          # cạnh ngắn của box (px)
+MIN_CONFIDENCE = 0.90       # độ tin cậy của detector
+MIN_SHARPNESS = 30.0        # phương sai Laplacian trên crop xám đã chuẩn hóa kích thước
+SHARPNESS_SIZE = 96         # crop được resize về cạnh này trước khi đo độ nét
+MAX_YAW = 0.45              # |mũi - giữa hai mắt| / khoảng cách hai mắt (0 = nhìn thẳng)
+PITCH_RANGE = (0.2, 0.8)    # vị trí mũi giữa mắt và miệng theo chiều dọc
+ALIGN_MIN_ROLL_DEG = 10.0   # chỉ xoay thẳng khi đầu nghiêng quá góc này (giữ nguyên crop như lúc đăng ký)
+
+REASONS = ("small", "low_confidence", "blurry", "pose")
+
+
+def sharpness(rgb, box):
+    x, y, w, h = box
+    crop = rgb[max(0, y):y + h, max(0, x):x + w]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    gray = cv2.resize(gray, (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def pose(keypoints):
+    # → (yaw, pitch, roll độ) ước lượng từ 5 landmark; None nếu detector không trả landmark
+    try:
+        (lx, ly), (rx, ry) = keypoints["left_eye"], keypoints["right_eye"]
+        nx, ny = keypoints["nose"]
+        (mlx, mly), (mrx, mry) = keypoints["mouth_left"], keypoints["mouth_right"]
+    except (KeyError, TypeError, ValueError):
+        return None
+    eye_dist = float(np.hypot(rx - lx, ry - ly))
+    if eye_dist < 1:
+        return None
+    roll = float(np.degrees(np.arctan2(ry - ly, rx - lx)))
+    # Chiếu mũi lên trục hai mắt (bỏ ảnh hưởng của góc nghiêng)
+    ex, ey = (rx - lx) / eye_dist, (ry - ly) / eye_dist
+    cx, cy = (lx + rx) / 2, (ly + ry) / 2
+    yaw = ((nx - cx) * ex + (ny - cy) * ey) / eye_dist
+    mouth_y = ((mlx + mrx) / 2 - cx) * -ey + ((mly + mry) / 2 - cy) * ex
+    nose_y = (nx - cx) * -ey + (ny - cy) * ex
+    pitch = nose_y / mouth_y if mouth_y > 1 else 0.5
+    return yaw, pitch, roll
+
+
+def align_crop(rgb, box, keypoints, min_roll=ALIGN_MIN_ROLL_DEG):
+    # Xoay quanh tâm hai mắt cho mắt nằm ngang rồi cắt đúng box → cùng kích thước crop chưa xoay
+    x, y, w, h = box
+    p = pose(keypoints) if keypoints else None
+    if p is None or abs(p[2]) < min_roll:
+        return rgb[y:y + h, x:x + w]
+    (lx, ly), (rx, ry) = keypoints["left_eye"], keypoints["right_eye"]
+    # Chỉ xoay vùng quanh khuôn mặt (box nới thêm mỗi phía một cạnh) thay vì cả frame
+    pad = max(w, h)
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(rgb.shape[1], x + w + pad), min(rgb.shape[0], y + h + pad)
+    region = rgb[y0:y1, x0:x1]
+    center = ((lx + rx) / 2.0 - x0, (ly + ry) / 2.0 - y0)
+    M = cv2.getRotationMatrix2D(center, p[2], 1.0)
+    rotated = cv2.warpAffine(region, M, (region.shape[1], region.shape[0]), flags=cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_REPLICATE)
+    return rotated[y - y0:y - y0 + h, x - x0:x - x0 + w]
+
+
+# ===============================
+# 🚦 Cổng chất lượng: chỉ khuôn mặt đạt mới được embed
+# ===============================
+class FaceQualityGate:
+    def __init__(self, min_size=MIN_FACE_SIZE, min_confidence=MIN_CONFIDENCE,
+                 min_sharpness=MIN_SHARPNESS, max_yaw=MAX_YAW, pitch_range=PITCH_RANGE):
+        self.min_size = min_size
+        self.min_confidence = min_confidence
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.pitch_range = pitch_range
+        self.lock = threading.Lock()
+        self.passed = 0
+        self.rejected = dict.fromkeys(REASONS, 0)
+
+    def check(self, rgb, face):
+        # → None nếu đạt, ngược lại là lý do loại; thứ tự từ rẻ tới đắt
+        x, y, w, h = face["box"]
+        if min(w, h) < self.min_size:
+            return "small"
+        if face.get("confidence", 1.0) < self.min_confidence:
+            return "low_confidence"
+        p = pose(face.get("keypoints"))
+        if p is not None:
+            yaw, pitch, _ = p
+            if abs(yaw) > self.max_yaw or not (self.pitch_range[0] <= pitch <= self.pitch_range[1]):
+                return "pose"
+        if sharpness(rgb, (max(0, x), max(0, y), w, h)) < self.min_sharpness:
+            return "blurry"
+        return None
+
+    def filter(self, rgb, faces):
+        kept, reasons = [], []
+        for f in faces:
+            reason = self.check(rgb, f)
+            if reason is None:
+                kept.append(f)
+            else:
+                reasons.append(reason)
+        with self.lock:
+            self.passed += len(kept)
+            for r in reasons:
+                self.rejected[r] += 1
+        return kept, reasons
+
+    def stats(self):
+        with self.lock:
+            total = self.passed + sum(self.rejected.values())
+            return {"total": total, "passed": self.passed, "rejected": dict(self.rejected),
+                    "reject_ratio": 1 - self.passed / total if total else 0.0}
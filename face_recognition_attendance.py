@@ -2,10 +2,23 @@ import os
 import cv2
 import numpy as np
 import pickle
-import pandas as pd
 from datetime import datetime
-from mtcnn import MTCNN
-from deepface import DeepFace
+from face_embedder import FacenetEmbedder
+from gallery_matcher import GalleryMatcher
+from gallery_store import ensure_store
+import ann_index
+import svm_head
+from pipeline import AsyncPipeline, BoundedQueue, DROP_OLDEST
+from face_tracker import FaceTracker
+from face_detector import create_detector
+from attendance_store import get_store
+import time
+import queue
+import threading
+from startup_profile import timed
+from frame_metrics import create_metrics, profile_session
+from recognition_cache import EmbeddingCache, TTLCache
+from face_quality import FaceQualityGate, align_crop
 
 # ===============================
 # ⚙️ Cấu hình hệ thống
@@ -14,103 +27,493 @@ MODEL_DIR = "face_models_facenet"
 SVM_PATH = os.path.join(MODEL_DIR, "svm_facenet.pkl")
 LABEL_ENCODER_PATH = os.path.join(MODEL_DIR, "label_encoder_facenet.pkl")
 EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+SVM_HEAD_PATH = os.path.join(MODEL_DIR, "svm_head_facenet.npz")
 
 SVM_PROB_THRESH = 0.75
 COSINE_SIM_THRESH = 0.5
+GALLERY_MUST_AGREE = False  # bật: từ chối khi lớp gần nhất theo gallery (mean cosine) khác lớp SVM chọn
 FRAMES_REQUIRED = 3
 DELAY_SECONDS = 30
 
-# ===============================
-# 🧠 Tải mô hình
-# ===============================
-print("📦 Đang tải mô hình SVM và LabelEncoder...")
-
-with open(SVM_PATH, "rb") as f:
-    svm_model = pickle.load(f)
-with open(LABEL_ENCODER_PATH, "rb") as f:
-    label_encoder = pickle.load(f)
-
-print("✅ Mô hình đã sẵn sàng.")
+# "svm": SVM + kiểm tra cosine (mặc định) | "ivf": chỉ mục IVF cho gallery lớn
+RECOGNITION_BACKEND = os.environ.get("RECOGNITION_BACKEND", "svm")
+IVF_INDEX_PATH = os.path.join(MODEL_DIR, "ivf_index_facenet.npz")
+ANN_SIM_THRESH = 0.6
+IVF_MIN_GALLERY = ann_index.IVF_MIN_GALLERY   # < 5000 embeddings: tìm chính xác nhanh hơn probe IVF (xem ann_index)
+
+# Gallery trên đĩa mở bằng memmap: "float16" | "int8" | None (nạp npz float32 như cũ)
+GALLERY_STORE_PATH = os.path.join(MODEL_DIR, "gallery_facenet.fgal")
+GALLERY_STORE_DTYPE = "float16"
+
+# Pipeline bất đồng bộ: capture / xử lý / hiển thị tách luồng, hàng đợi có giới hạn
+ASYNC_PIPELINE = True
+PIPELINE_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 1
+PIPELINE_DROP_POLICY = DROP_OLDEST
+
+# Detector: "mtcnn" | "mtcnn_scaled" (MTCNN trên frame thu nhỏ) | "yunet" | "haar"
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "mtcnn")
+
+# Theo dõi khuôn mặt giữa các frame để không embed lại cùng một người
+USE_TRACKER = True
+USE_CV_TRACKER = False
+DETECT_EVERY = 5
+
+# Cache quyết định cho khuôn mặt vừa nhận ra chắc chắn → bỏ qua SVM + gallery ở các frame sau
+RECOGNITION_CACHE = True
+
+# Lọc khuôn mặt nhỏ / mờ / nghiêng quá trước khi embed, xoay thẳng theo landmark mắt khi đầu nghiêng
+QUALITY_GATE = True
+ALIGN_FACES = True
+
+# Đo đạc từng frame (tắt mặc định): ATTENDANCE_METRICS=1 bật bộ đếm + overlay,
+# ATTENDANCE_METRICS_FILE=metrics.json|metrics.prom, ATTENDANCE_METRICS_PORT=9100 → /metrics,
+# ATTENDANCE_PROFILE=session.prof → cProfile cả phiên (chạy vòng đồng bộ để profile đủ các stage)
+METRICS_ENABLED = os.environ.get("ATTENDANCE_METRICS") == "1"
+METRICS_OVERLAY = True
+METRICS_FILE = os.environ.get("ATTENDANCE_METRICS_FILE")
+METRICS_PORT = int(os.environ.get("ATTENDANCE_METRICS_PORT", 0)) or None
+PROFILE_PATH = os.environ.get("ATTENDANCE_PROFILE")
 
 # ===============================
-# 🧩 Tải embeddings đã lưu (nếu có)
+# 🧠 Tải mô hình (trì hoãn tới lần dùng đầu tiên, chỉ tải một lần)
 # ===============================
-embeddings_by_label = {}
-if os.path.exists(EMBEDDINGS_NPZ):
-    try:
-        npz = np.load(EMBEDDINGS_NPZ, allow_pickle=True)
-        X = npz["embeddings"]
-        y = npz["labels"]
-        X_norm = X / np.linalg.norm(X, axis=1, keepdims=True)
-        for emb, lbl in zip(X_norm, y):
-            embeddings_by_label.setdefault(lbl, []).append(emb)
-
-        print(f"✅ Đã tải embeddings của {len(embeddings_by_label)} lớp.")
-        # 🟢 In danh sách tên lớp (và số lượng ảnh mỗi lớp)
-        print("📂 Danh sách lớp đã tải:")
-        for lbl, embs in embeddings_by_label.items():
-            print(f"   - {lbl}: {len(embs)} ảnh")
-
-    except Exception as e:
-        print("⚠️ Không thể tải file embeddings:", e)
-else:
-    print("⚠️ Không tìm thấy file embeddings, chỉ dùng SVM để nhận diện.")
-
-detector = MTCNN()
+svm_model = None
+label_encoder = None
+classifier = None           # SVMHead: SVM tuyến tính chạy bằng NumPy trên cả batch
+roster_names = None         # tên sinh viên thuộc các môn đang mở (None = mọi người đã đăng ký)
+roster_gallery = None       # gallery con chỉ gồm roster_names
+ivf_index = None
+gallery = None
+detector = None
+embedder = FacenetEmbedder()
+tracker = None
+tracker_lock = threading.Lock()
+recognition_cache = EmbeddingCache() if RECOGNITION_CACHE else None
+quality_gate = FaceQualityGate() if QUALITY_GATE else None
+metrics = create_metrics(METRICS_ENABLED or bool(METRICS_FILE or METRICS_PORT), METRICS_FILE)
+_load_lock = threading.Lock()
+_loaded = False
+
+def models_ready():
+    return _loaded
+
+def load_models(progress=None):
+    # progress(bước, tổng số bước, thông báo) — gọi từ luồng đang tải
+    global svm_model, label_encoder, classifier, ivf_index, gallery, detector, _loaded
+    with _load_lock:
+        if _loaded:
+            return
+        steps = 4
+
+        def report(i, msg):
+            print(msg)
+            if progress is not None:
+                progress(i, steps, msg)
+
+        if RECOGNITION_BACKEND == "ivf":
+            report(0, "📦 Đang tải chỉ mục IVF...")
+            with timed("load: ivf index"):
+                ivf_index = ann_index.load_or_build(IVF_INDEX_PATH, EMBEDDINGS_NPZ)
+            ivf_index.min_gallery = IVF_MIN_GALLERY
+            mode = f"{ivf_index.n_lists} lists" if ivf_index.use_ivf else \
+                f"{len(ivf_index.matrix)} < {IVF_MIN_GALLERY} embeddings → tìm chính xác"
+            print(f"✅ Chỉ mục IVF đã sẵn sàng ({mode}).")
+        else:
+            report(0, "📦 Đang tải mô hình SVM và LabelEncoder...")
+            try:
+                # Trọng số đã xuất sang NumPy → không cần unpickle sklearn khi khởi động
+                with timed("load: svm head"):
+                    classifier = svm_head.load_or_export(SVM_HEAD_PATH, SVM_PATH, LABEL_ENCODER_PATH)
+            except ValueError as e:
+                print("⚠️ Không xuất được SVM sang NumPy, dùng sklearn:", e)
+                with timed("load: svm + label encoder"):
+                    with open(SVM_PATH, "rb") as f:
+                        svm_model = pickle.load(f)
+                    with open(LABEL_ENCODER_PATH, "rb") as f:
+                        label_encoder = pickle.load(f)
+            print("✅ Mô hình đã sẵn sàng.")
+
+        # 🧩 Tải embeddings đã lưu (nếu có)
+        report(1, "📦 Đang tải embeddings...")
+        if os.path.exists(EMBEDDINGS_NPZ):
+            try:
+                with timed("load: gallery embeddings"):
+                    if GALLERY_STORE_DTYPE:
+                        store_path = ensure_store(GALLERY_STORE_PATH, EMBEDDINGS_NPZ, GALLERY_STORE_DTYPE)
+                        gallery = GalleryMatcher.from_store(store_path)
+                    else:
+                        gallery = GalleryMatcher.from_npz(EMBEDDINGS_NPZ)
+                print(f"✅ Đã tải embeddings của {len(gallery)} lớp.")
+            except Exception as e:
+                print("⚠️ Không thể tải file embeddings:", e)
+        else:
+            print("⚠️ Không tìm thấy file embeddings, chỉ dùng SVM để nhận diện.")
+
+        report(2, f"📦 Đang khởi tạo detector {DETECTOR_BACKEND}...")
+        with timed(f"load: detector {DETECTOR_BACKEND}"):
+            detector = create_detector(DETECTOR_BACKEND)
+
+        report(3, "📦 Đang tải mô hình Facenet...")
+        with timed("load: facenet"):
+            embedder.load()
+
+        _loaded = True
+        if roster_names is not None:
+            set_roster(roster_names)
+        report(4, "✅ Hệ thống nhận diện đã sẵn sàng.")
 
 # ===============================
 # 🧩 Hàm phụ trợ
 # ===============================
-def l2_normalize(v):
-    v = np.array(v)
-    norm = np.linalg.norm(v)
-    return v / norm if norm > 0 else v
+def set_roster(names):
+    # Giới hạn nhận diện trong danh sách sinh viên của các buổi học đang mở (None → bỏ giới hạn)
+    global roster_names, roster_gallery
+    if names is not None and roster_names == frozenset(names) and \
+            (roster_gallery is not None or gallery is None):
+        return
+    if names is None:
+        roster_names = roster_gallery = None
+    else:
+        roster_names = frozenset(names)
+        roster_gallery = gallery.subset(roster_names) if gallery is not None else None
+    if recognition_cache is not None:
+        recognition_cache.clear()
+
+def in_roster(name):
+    return roster_names is None or name in roster_names
+
+def roster_mask(class_names):
+    # Lớp nào của bộ phân loại thuộc danh sách lớp → chọn argmax chỉ trong các lớp này,
+    # để sinh viên trong lớp không bị loại vì một người giống mặt ngoài lớp có xác suất cao hơn
+    if roster_names is None:
+        return None
+    return np.isin(np.asarray(class_names).astype(str), list(roster_names))
 
 def mean_cosine_sim(emb, label):
-    if label not in embeddings_by_label:
+    if gallery is None:
         return 0.0
-    arr = np.stack(embeddings_by_label[label], axis=0)
-    sims = np.dot(arr, emb)
-    return float(np.mean(sims))
+    return float(gallery.mean_sim_for(emb, [label])[0])
+
+def gallery_top_k(embs, k=3):
+    # Chấm điểm cả batch với mọi lớp → top-k (tên, mean, max), không phụ thuộc SVM
+    if gallery is None or len(gallery) == 0:
+        return None
+    return gallery.top_k(embs, k)
+
+def gallery_agrees(sims, i, class_idx):
+    # Kiểm tra độc lập với SVM: lớp gần nhất theo gallery phải đúng là lớp SVM dự đoán
+    if not GALLERY_MUST_AGREE:
+        return True
+    return class_idx is not None and int(np.argmax(sims[i])) == class_idx
 
 # ===============================
 # 🕒 Lưu lịch sử điểm danh
 # ===============================
-last_mark_times = {}
+# Tên → lần ghi gần nhất, tự hết hạn sau DELAY_SECONDS (giới hạn số phần tử cho phiên dài)
+last_mark_times = TTLCache(maxsize=4096, ttl=DELAY_SECONDS)
 
 def mark_attendance(name):
+    # Vừa ghi trong DELAY_SECONDS → bỏ qua ngay, không chạm tới store
+    if last_mark_times.get(name) is not None:
+        return
     now = datetime.now()
     date = now.strftime('%Y-%m-%d')
     time = now.strftime('%H:%M:%S')
+    last_mark_times.put(name, now)
 
-    if name in last_mark_times:
-        delta = (now - last_mark_times[name]).total_seconds()
-        if delta < DELAY_SECONDS:
-            return
-    last_mark_times[name] = now
+    with metrics.stage("store"):
+        get_store().add(name, date=date, time=time)
+    metrics.count("attendance_writes")
+    print(f"✅ Đã lưu điểm danh: {name} ({date} {time})")
 
-    file = "attendance.csv"
-    if not os.path.exists(file) or os.path.getsize(file) == 0:
-        df = pd.DataFrame(columns=["Name", "Date", "Time"])
-        df.to_csv(file, index=False)
+# ===============================
+# 🔍 Nhận diện các khuôn mặt trong một frame
+# ===============================
+def classify_embeddings(embs):
+    # Quyết định cho cả batch embedding → [{"name", "prob", "similarity", "recognized"}]
+    # Độ tương đồng trung bình của cả batch với mọi lớp: 1 phép nhân ma trận / batch
+    with metrics.stage("classify"):
+        decisions = _classify_cached(embs) if recognition_cache is not None else _classify_embeddings(embs)
+    recognized = sum(d["recognized"] for d in decisions)
+    metrics.count("recognized", recognized)
+    metrics.count("unknown", len(decisions) - recognized)
+    return decisions
+
+def _classify_cached(embs):
+    decisions = recognition_cache.lookup(embs)
+    miss = [i for i, d in enumerate(decisions) if d is None]
+    metrics.count("cache_hits", len(decisions) - len(miss))
+    if miss:
+        miss_embs = np.asarray(embs)[miss]
+        for i, emb, d in zip(miss, miss_embs, _classify_embeddings(miss_embs)):
+            recognition_cache.insert(emb, d)
+            decisions[i] = d
+    return decisions
+
+def _classify_embeddings(embs):
+    sims = None
+    g = roster_gallery if roster_gallery is not None else gallery
+    if ivf_index is not None and len(embs):
+        ann_names, ann_sims = ivf_index.identify(embs)
+    elif g is not None and len(embs):
+        sims = g.mean_sims(embs)
+    if classifier is not None and ivf_index is None:
+        return _classify_head(embs, g, sims)
+
+    decisions = []
+    for i, emb in enumerate(embs):
+        if ivf_index is not None:
+            # Nhánh IVF: thay SVM + cosine bằng bỏ phiếu k láng giềng gần nhất
+            pred_name = ann_names[i]
+            max_prob = avg_sim = float(ann_sims[i])
+            recognized = max_prob >= ANN_SIM_THRESH and in_roster(pred_name)
+        else:
+            probs = svm_model.predict_proba([emb])[0]
+            mask = roster_mask(label_encoder.classes_)
+            pred_idx = int(np.argmax(probs if mask is None else np.where(mask, probs, -1.0)))
+            max_prob = float(probs[pred_idx])
+            pred_name = label_encoder.inverse_transform([pred_idx])[0]
+            class_idx = g.name_to_index.get(pred_name) if sims is not None else None
+            avg_sim = float(sims[i, class_idx]) if class_idx is not None else 0.0
+            recognized = (max_prob >= SVM_PROB_THRESH) and (avg_sim >= COSINE_SIM_THRESH) \
+                and gallery_agrees(sims, i, class_idx) and in_roster(pred_name)
+
+        decisions.append({"name": pred_name, "prob": max_prob, "similarity": avg_sim,
+                          "recognized": recognized})
+    return decisions
+
+def _classify_head(embs, g, sims):
+    # Một lần predict_proba cho cả batch, tên lấy thẳng từ mảng chỉ số → tên
+    if not len(embs):
+        return []
+    _, names, probs, _ = classifier.predict(embs, roster_mask(classifier.names))
+    decisions = []
+    for i, (pred_name, max_prob) in enumerate(zip(names, probs)):
+        class_idx = g.name_to_index.get(pred_name) if sims is not None else None
+        avg_sim = float(sims[i, class_idx]) if class_idx is not None else 0.0
+        recognized = (max_prob >= SVM_PROB_THRESH) and (avg_sim >= COSINE_SIM_THRESH) \
+            and gallery_agrees(sims, i, class_idx) and in_roster(pred_name)
+        decisions.append({"name": str(pred_name), "prob": float(max_prob), "similarity": avg_sim,
+                          "recognized": bool(recognized)})
+    return decisions
+
+def crop_boxes(rgb, boxes, keypoints=None):
+    # → (chỉ số các box có crop hợp lệ, danh sách crop); có landmark → crop đã xoay thẳng
+    valid, crops = [], []
+    for i, (x, y, w, h) in enumerate(boxes):
+        if ALIGN_FACES and keypoints and keypoints[i]:
+            face = align_crop(rgb, (x, y, w, h), keypoints[i])
+        else:
+            face = rgb[y:y + h, x:x + w]
+        if face.size == 0:
+            continue
+        valid.append(i)
+        crops.append(face)
+    return valid, crops
+
+def embed_crops(crops):
+    # → (chỉ số các crop embed được, embeddings); batch lỗi → embed lại từng crop để
+    # một crop hỏng không làm mất mọi khuôn mặt trong frame
+    try:
+        return list(range(len(crops))), embedder.embed(crops)
+    except Exception:
+        if len(crops) <= 1:
+            metrics.count("embed_failed", len(crops))
+            return [], np.zeros((0, 128), dtype=np.float32)
+    ok, embs = [], []
+    for i, crop in enumerate(crops):
+        try:
+            embs.append(embedder.embed([crop])[0])
+            ok.append(i)
+        except Exception:
+            metrics.count("embed_failed")
+    return ok, np.asarray(embs, dtype=np.float32).reshape(len(embs), -1)
+
+def recognize_boxes(rgb, boxes, keypoints=None):
+    # Trả về danh sách kết quả cùng thứ tự với boxes (None nếu crop rỗng / embed lỗi)
+    with metrics.stage("crop"):
+        valid, crops = crop_boxes(rgb, boxes, keypoints)
+    metrics.count("faces", len(boxes))
+    metrics.count("crops_skipped", len(boxes) - len(valid))
+
+    # Gom toàn bộ khuôn mặt trong frame → 1 lần predict cho cả batch
+    with metrics.stage("embed"):
+        ok, embs = embed_crops(crops)
+    valid = [valid[i] for i in ok]
+
+    results = [None] * len(boxes)
+    for box_idx, d in zip(valid, classify_embeddings(embs)):
+        results[box_idx] = dict(d, box=boxes[box_idx])
+    return results
+
+def face_boxes(faces):
+    # Kết quả detector → (box đã kẹp về trong ảnh, landmark tương ứng)
+    boxes, keypoints = [], []
+    for f in faces:
+        x, y, w, h = f["box"]
+        boxes.append((max(0, x), max(0, y), w, h))
+        keypoints.append(f.get("keypoints"))
+    return boxes, keypoints
+
+def recognize_faces(rgb, faces):
+    boxes, keypoints = face_boxes(faces)
+    return [r for r in recognize_boxes(rgb, boxes, keypoints) if r is not None]
+
+def gate_faces(rgb, faces):
+    # Bỏ khuôn mặt không đủ chất lượng trước khi crop / embed (tracker cũng không tạo track cho chúng)
+    if quality_gate is None or not faces:
+        return faces
+    with metrics.stage("quality"):
+        kept, reasons = quality_gate.filter(rgb, faces)
+    for reason in reasons:
+        metrics.count("rejected_" + reason)
+    return kept
+
+def detect_faces(rgb):
+    with metrics.stage("detect"):
+        faces = detector.detect_faces(rgb)
+    return gate_faces(rgb, faces)
+
+def process_frame(frame):
+    with metrics.frame():
+        return _process_frame(frame)
+
+def _process_frame(frame):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if tracker is None:
+        return recognize_faces(rgb, detect_faces(rgb))
+
+    # Có tracker: detect mỗi DETECT_EVERY frame, chỉ embed track mới / giảm tin cậy / đổi ngoại hình
+    with tracker_lock:
+        pending = tracker.step(rgb, detect_faces)
+        fresh = recognize_boxes(rgb, [t.box for t in pending], [t.keypoints for t in pending])
+        for track, r in zip(pending, fresh):
+            if r is not None:
+                tracker.update(rgb, track, r)
+        fresh_ids = {t.id for t, r in zip(pending, fresh) if r is not None}
+        return [t.as_result(t.id in fresh_ids) for t in tracker.tracks if t.embedded]
+
+def draw_result(frame, r):
+    x, y, w, h = r["box"]
+    name_display = r["name"] if r["recognized"] else "unknown"
+    color = (0, 255, 0) if r["recognized"] else (0, 0, 255)
+    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+    cv2.putText(frame, f"{name_display} ({r['prob']:.2f})", (x, y - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+def is_confirmed(frame_confirm, r):
+    # Có tracker → bỏ phiếu theo track; không có → theo tên như trước
+    if "track_id" in r:
+        return r["fresh"] and r["votes"] >= FRAMES_REQUIRED
+    return confirm(frame_confirm, r["name"]) >= FRAMES_REQUIRED
+
+def confirm(frame_confirm, name):
+    # Đếm số frame liên tiếp (cách nhau < 2 giây) nhận ra cùng một người
+    count, last_time = frame_confirm.get(name, (0, datetime.min))
+    if (datetime.now() - last_time).total_seconds() < 2:
+        count += 1
+    else:
+        count = 1
+    frame_confirm[name] = (count, datetime.now())
+    return count
+
+def show_success(cap, display, frame, r):
+    x, y, w, h = r["box"]
+    mark_attendance(r["name"])
+
+    # Hiển thị thông báo điểm danh thành công
+    cv2.putText(frame, f"Diem danh thanh cong: {r['name']}",
+                (x, y + h + 30), cv2.FONT_HERSHEY_SIMPLEX,
+                0.7, (0, 255, 0), 2)
+    print(f"✅ Điểm danh thành công cho {r['name']}")
+    display.success(frame)
+    cap.release()
 
-    df = pd.read_csv(file)
-    new_row = pd.DataFrame([[name, date, time]], columns=["Name", "Date", "Time"])
-    df = pd.concat([df, new_row], ignore_index=True)
-    df.to_csv(file, index=False)
-    print(f"✅ Đã lưu điểm danh: {name} ({date} {time})")
+# ===============================
+# 🖼️ Nơi hiển thị frame: cửa sổ OpenCV hoặc hàng đợi cho GUI
+# ===============================
+WINDOW_NAME = "Face Attendance (Facenet + SVM)"
+
+class CvWindowDisplay:
+    def show(self, frame, wait_ms=1):
+        cv2.imshow(WINDOW_NAME, frame)
+        return cv2.waitKey(wait_ms) & 0xFF != ord("q")
+
+    def success(self, frame):
+        # 🟢 Chờ 1.5 giây rồi tắt camera
+        cv2.imshow(WINDOW_NAME, frame)
+        cv2.waitKey(1500)
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+class QueueDisplay:
+    # Đẩy frame RGB đã vẽ vào hàng đợi (chỉ giữ frame mới nhất), dừng khi bị hủy hoặc quá thời gian
+    def __init__(self, stop_event, timeout=None):
+        self.frames = BoundedQueue(1, DROP_OLDEST)
+        self.stop_event = stop_event
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.timed_out = False
+
+    def show(self, frame, wait_ms=1):
+        self.frames.put(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        time.sleep(wait_ms / 1000)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.timed_out = True
+            return False
+        return not self.stop_event.is_set()
+
+    def success(self, frame):
+        self.frames.put(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def close(self):
+        pass
 
 # ===============================
 # 🎥 Nhận diện khuôn mặt
 # ===============================
-def start_attendance():
+def start_attendance(display=None, source=0):
+    load_models()
+    display = display or CvWindowDisplay()
     print("🎥 Đang mở camera... (nhấn Q để thoát)")
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened():
         print("❌ Không thể mở camera.")
         return "unknown"
 
-    DeepFace.build_model("Facenet")
+    global tracker
+    tracker = FaceTracker(DETECT_EVERY, FRAMES_REQUIRED, USE_CV_TRACKER) if USE_TRACKER else None
+
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+
+    try:
+        # cProfile chỉ thấy luồng hiện tại → khi profile chạy vòng đồng bộ
+        with profile_session(PROFILE_PATH):
+            if ASYNC_PIPELINE and not PROFILE_PATH:
+                return _run_async(cap, display)
+            return _run_sync(cap, display)
+    finally:
+        display.close()
+        if metrics.enabled:
+            metrics.close()
+            metrics.print_summary()
+        if recognition_cache is not None:
+            cs = recognition_cache.stats()
+            print(f"🧊 Cache nhận diện: hit {cs['hit_rate']:.0%} ({cs['hits']}/{cs['hits'] + cs['misses']}), "
+                  f"{cs['size']} mục, thay thế {cs['evictions']}")
+        if quality_gate is not None:
+            qs = quality_gate.stats()
+            if qs["total"]:
+                print(f"🚦 Cổng chất lượng: loại {qs['reject_ratio']:.0%} ({qs['total'] - qs['passed']}/{qs['total']}) "
+                      + ", ".join(f"{k} {v}" for k, v in qs["rejected"].items() if v))
+        st = detector.stats()
+        if st["frames"]:
+            print(f"⏱️ Detector {st['backend']}: {st['mean_ms']:.1f} ms/frame "
+                  f"(p95 {st['p95_ms']:.1f} ms, {st['frames']} frame)")
+
+def _run_sync(cap, display):
     recognized_name = "unknown"
     frame_confirm = {}
 
@@ -119,73 +522,93 @@ def start_attendance():
         if not ret:
             break
 
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        faces = detector.detect_faces(rgb)
-
-        for f in faces:
-            x, y, w, h = f["box"]
-            x, y = max(0, x), max(0, y)
-            face = rgb[y:y + h, x:x + w]
-            if face.size == 0:
-                continue
-
-            try:
-                rep = DeepFace.represent(img_path=face, model_name="Facenet", enforce_detection=False)
-                emb = l2_normalize(np.array(rep[0]["embedding"]))
-            except Exception:
-                continue
-
-            probs = svm_model.predict_proba([emb])[0]
-            max_prob = float(np.max(probs))
-            pred_idx = np.argmax(probs)
-            pred_name = label_encoder.inverse_transform([pred_idx])[0]
-            avg_sim = mean_cosine_sim(emb, pred_name) if embeddings_by_label else 0.0
-
-            recognized = (max_prob >= SVM_PROB_THRESH) and (avg_sim >= COSINE_SIM_THRESH)
-            name_display = pred_name if recognized else "unknown"
-            color = (0, 255, 0) if recognized else (0, 0, 255)
-
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            cv2.putText(frame, f"{name_display} ({max_prob:.2f})", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+        for r in process_frame(frame):
+            draw_result(frame, r)
 
             # ✅ Nếu xác nhận hợp lệ qua nhiều frame → điểm danh + tắt camera
-            if recognized:
-                count, last_time = frame_confirm.get(pred_name, (0, datetime.min))
-                if (datetime.now() - last_time).total_seconds() < 2:
-                    count += 1
-                else:
-                    count = 1
-                frame_confirm[pred_name] = (count, datetime.now())
-
-                if count >= FRAMES_REQUIRED:
-                    recognized_name = pred_name
-                    mark_attendance(pred_name)
-
-                    # Hiển thị thông báo điểm danh thành công
-                    cv2.putText(frame, f"Diem danh thanh cong: {pred_name}",
-                                (x, y + h + 30), cv2.FONT_HERSHEY_SIMPLEX,
-                                0.7, (0, 255, 0), 2)
-                    cv2.imshow("Face Attendance (Facenet + SVM)", frame)
-                    print(f"✅ Điểm danh thành công cho {pred_name}")
-
-                    # 🟢 Chờ 1.5 giây rồi tắt camera
-                    cv2.waitKey(1500)
-                    cap.release()
-                    cv2.destroyAllWindows()
-                    return recognized_name
+            if r["recognized"]:
+                if is_confirmed(frame_confirm, r):
+                    show_success(cap, display, frame, r)
+                    return r["name"]
             else:
                 recognized_name = "unknown"
 
-        cv2.imshow("Face Attendance (Facenet + SVM)", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        if metrics.enabled and METRICS_OVERLAY:
+            metrics.overlay(frame)
+        if not display.show(frame):
             break
 
     cap.release()
-    cv2.destroyAllWindows()
 
     if recognized_name != "unknown":
         return recognized_name
     else:
         print("❌ Không nhận diện được khuôn mặt hợp lệ.")
         return "unknown"
+
+def _run_async(cap, display):
+    # Camera luôn đọc frame mới nhất, worker xử lý song song, vòng hiển thị vẽ kết quả gần nhất
+    pipe = AsyncPipeline(cap, process_frame, workers=PIPELINE_WORKERS,
+                         queue_size=PIPELINE_QUEUE_SIZE, policy=PIPELINE_DROP_POLICY).start()
+    frame_confirm = {}
+    try:
+        while not pipe.ended:
+            for results in pipe.poll_results():
+                for r in results:
+                    if r["recognized"] and is_confirmed(frame_confirm, r):
+                        pipe.stop()
+                        frame = pipe.latest_frame().copy()
+                        draw_result(frame, r)
+                        show_success(cap, display, frame, r)
+                        return r["name"]
+
+            frame = pipe.latest_frame()
+            if frame is None:
+                time.sleep(0.015)
+                continue
+            frame = frame.copy()
+            for r in pipe.last_results:
+                draw_result(frame, r)
+            cv2.putText(frame, f"{pipe.latency_ms:.0f} ms", (10, 25),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+            if metrics.enabled and METRICS_OVERLAY:
+                metrics.overlay(frame)
+            if not display.show(frame, wait_ms=15):
+                break
+    finally:
+        pipe.stop()
+
+    cap.release()
+    print("❌ Không nhận diện được khuôn mặt hợp lệ.")
+    return "unknown"
+
+# ===============================
+# 🧵 Phiên nhận diện chạy nền (dùng cho GUI Tkinter)
+# ===============================
+class RecognitionSession(threading.Thread):
+    def __init__(self, source=0, timeout=None, on_result=None):
+        super().__init__(daemon=True)
+        self.source = source
+        self.on_result = on_result
+        self.stop_event = threading.Event()
+        self.display = QueueDisplay(self.stop_event, timeout)
+        self.results = queue.Queue()
+
+    @property
+    def frames(self):
+        return self.display.frames
+
+    def run(self):
+        try:
+            name = start_attendance(display=self.display, source=self.source)
+            status = "timeout" if self.display.timed_out else \
+                     "cancelled" if self.stop_event.is_set() else "done"
+        except Exception as e:
+            print("❌ Lỗi phiên nhận diện:", e)
+            name, status = "unknown", "error"
+        self.results.put((status, name))
+        if self.on_result is not None:
+            self.on_result(status, name)
+
+    def cancel(self):
+        self.stop_event.set()
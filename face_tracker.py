@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình tracker
+# ===============================
+DETECT_EVERY = 5            # chạy detector đầy đủ mỗi N frame
+IOU_THRESH = 0.3
+MAX_MISSED = 3              # số lần detect liên tiếp không thấy → xóa track
+CONFIDENCE_DECAY = 0.97     # độ tin cậy giảm dần mỗi frame kể từ lần embed cuối
+MIN_CONFIDENCE = 0.6        # dưới ngưỡng này → embed lại
+APPEARANCE_THRESH = 0.12    # độ lệch thumbnail (0..1) → embed lại
+THUMB_SIZE = (16, 16)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    x1, y1 = max(ax, bx), max(ay, by)
+    x2, y2 = min(ax + aw, bx + bw), min(ay + ah, by + bh)
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centroid_close(a, b):
+    # Tâm hai box cách nhau dưới nửa chiều rộng → coi là cùng một khuôn mặt
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 < 0.5 * max(aw, bw)
+
+
+def thumbnail(rgb, box):
+    x, y, w, h = box
+    crop = rgb[y:y + h, x:x + w]
+    if crop.size == 0:
+        return None
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, THUMB_SIZE).astype(np.float32) / 255.0
+
+
+def shift_keypoints(keypoints, dx, dy):
+    # Tracker OpenCV dời box giữa hai lần detect → dời landmark theo cùng độ lệch
+    if not keypoints or (dx == 0 and dy == 0):
+        return keypoints
+    return {k: (px + dx, py + dy) for k, (px, py) in keypoints.items()}
+
+
+def create_cv_tracker():
+    # Tracker OpenCV nếu bản cài có (contrib: KCF/CSRT, bản thường: MIL)
+    for name in ("TrackerKCF_create", "TrackerCSRT_create", "TrackerMIL_create"):
+        factory = getattr(cv2, name, None) or getattr(getattr(cv2, "legacy", None), name, None)
+        if factory is not None:
+            return factory()
+    return None
+
+
+# ===============================
+# 👤 Track của một khuôn mặt
+# ===============================
+class Track:
+    def __init__(self, track_id, box, keypoints=None):
+        self.id = track_id
+        self.box = box
+        self.keypoints = keypoints      # landmark của lần detect gần nhất (để xoay thẳng crop)
+        self.name = "unknown"
+        self.prob = 0.0
+        self.recognized = False
+        self.votes = 0
+        self.confidence = 0.0
+        self.signature = None
+        self.missed = 0
+        self.cv_tracker = None
+        self.embedded = False
+
+    def as_result(self, fresh):
+        return {"box": self.box, "name": self.name, "prob": self.prob,
+                "recognized": self.recognized, "track_id": self.id, "votes": self.votes,
+                "fresh": fresh}
+
+
+# ===============================
+# 🧭 Tracker IoU/centroid (+ tracker OpenCV tùy chọn)
+# ===============================
+class FaceTracker:
+    def __init__(self, detect_every=DETECT_EVERY, votes_required=3, use_cv_tracker=False):
+        self.detect_every = detect_every
+        self.votes_required = votes_required
+        self.use_cv_tracker = use_cv_tracker
+        self.tracks = []
+        self.next_id = 1
+        self.frame_idx = 0
+        self.embeds = 0
+        self.faces_seen = 0
+
+    def _associate(self, rgb, boxes, keypoints):
+        pairs = sorted(((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks)
+                        for bi, b in enumerate(boxes)), reverse=True)
+        used_t, used_b = set(), set()
+        for score, ti, bi in pairs:
+            if ti in used_t or bi in used_b:
+                continue
+            if score < IOU_THRESH and not centroid_close(self.tracks[ti].box, boxes[bi]):
+                continue
+            used_t.add(ti)
+            used_b.add(bi)
+            track = self.tracks[ti]
+            track.box = boxes[bi]
+            track.keypoints = keypoints[bi]
+            track.missed = 0
+            self._init_cv_tracker(rgb, track)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_t:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= MAX_MISSED]
+
+        for bi, box in enumerate(boxes):
+            if bi not in used_b:
+                track = Track(self.next_id, box, keypoints[bi])
+                self.next_id += 1
+                self._init_cv_tracker(rgb, track)
+                self.tracks.append(track)
+
+    def _init_cv_tracker(self, rgb, track):
+        if not self.use_cv_tracker:
+            return
+        track.cv_tracker = create_cv_tracker()
+        if track.cv_tracker is not None:
+            track.cv_tracker.init(rgb, tuple(int(v) for v in track.box))
+
+    def _advance(self, rgb):
+        # Giữa các lần detect: cập nhật box bằng tracker OpenCV (nếu bật), không thì giữ box cũ
+        for track in self.tracks:
+            if track.cv_tracker is None:
+                continue
+            ok, box = track.cv_tracker.update(rgb)
+            if ok:
+                x, y, w, h = (int(v) for v in box)
+                x, y = max(0, x), max(0, y)
+                track.keypoints = shift_keypoints(track.keypoints, x - track.box[0], y - track.box[1])
+                track.box = (x, y, w, h)
+
+    def _needs_embed(self, rgb, track):
+        if not track.embedded or track.votes < self.votes_required:
+            return True
+        if track.confidence < MIN_CONFIDENCE:
+            return True
+        thumb = thumbnail(rgb, track.box)
+        if thumb is None or track.signature is None:
+            return True
+        return float(np.mean(np.abs(thumb - track.signature))) > APPEARANCE_THRESH
+
+    def step(self, rgb, detect_fn):
+        # Trả về các track cần embed lại ở frame này
+        if self.frame_idx % self.detect_every == 0 or not self.tracks:
+            boxes, keypoints = [], []
+            for f in detect_fn(rgb):
+                x, y, w, h = f["box"]
+                boxes.append((max(0, x), max(0, y), w, h))
+                keypoints.append(f.get("keypoints"))
+            self._associate(rgb, boxes, keypoints)
+        else:
+            self._advance(rgb)
+        self.frame_idx += 1
+
+        for track in self.tracks:
+            track.confidence *= CONFIDENCE_DECAY
+        pending = [t for t in self.tracks if self._needs_embed(rgb, t)]
+        self.faces_seen += len(self.tracks)
+        self.embeds += len(pending)
+        return pending
+
+    def update(self, rgb, track, result):
+        # Ghi kết quả nhận diện mới cho track; phiếu bầu chỉ cộng khi cùng tên liên tiếp
+        if result["recognized"] and track.recognized and result["name"] == track.name:
+            track.votes += 1
+        else:
+            track.votes = 1 if result["recognized"] else 0
+        track.name = result["name"]
+        track.prob = result["prob"]
+        track.recognized = result["recognized"]
+        track.confidence = result["prob"] if result["recognized"] else 0.0
+        track.signature = thumbnail(rgb, track.box)
+        track.embedded = True
+
+    @property
+    def embed_ratio(self):
+        # Tỉ lệ khuôn mặt phải embed / tổng khuôn mặt được theo dõi
+        return self.embeds / self.faces_seen if self.faces_seen else 1.0
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+# ===============================
+# ⚙️ Cấu hình đo đạc từng frame
+# ===============================
+METRICS_WINDOW = 300        # số frame gần nhất dùng cho p50/p95/FPS
+EXPORT_EVERY_S = 5.0        # chu kỳ ghi file metrics
+STAGES = ("detect", "crop", "embed", "classify", "store")
+COUNTERS = ("frames", "faces", "crops_skipped", "embed_failed", "recognized", "unknown",
+            "cache_hits", "attendance_writes",
+            "rejected_small", "rejected_low_confidence", "rejected_blurry", "rejected_pose")
+PROM_PREFIX = "attendance"
+
+
+# ===============================
+# 💤 Bản rỗng: dùng khi tắt đo đạc (chỉ tốn một lần gọi hàm)
+# ===============================
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullContext()
+
+
+class NullMetrics:
+    enabled = False
+
+    def frame(self):
+        return _NULL
+
+    def stage(self, name):
+        return _NULL
+
+    def count(self, name, n=1):
+        pass
+
+    def overlay(self, frame):
+        pass
+
+    def snapshot(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+# ===============================
+# 📊 Đo thời gian từng stage + bộ đếm, giữ cửa sổ trượt
+# ===============================
+class FrameMetrics:
+    enabled = True
+
+    def __init__(self, window=METRICS_WINDOW, export_path=None, export_every=EXPORT_EVERY_S):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stage_ms = {s: deque(maxlen=window) for s in STAGES}
+        self.frame_ms = deque(maxlen=window)
+        self.done_times = deque(maxlen=window)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.export_path = export_path
+        self.export_every = export_every
+        self.next_export = time.monotonic() + export_every
+        self.server = None
+
+    @contextmanager
+    def frame(self):
+        # Mỗi luồng worker giữ số liệu của frame đang xử lý, ghép vào cửa sổ khi xong frame
+        self.local.stages = {}
+        self.local.counts = {}
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            total = (time.perf_counter() - t0) * 1000
+            stages, counts = self.local.stages, self.local.counts
+            self.local.stages = self.local.counts = None
+            with self.lock:
+                for name, ms in stages.items():
+                    self.stage_ms.setdefault(name, deque(maxlen=self.frame_ms.maxlen)).append(ms)
+                for name, n in counts.items():
+                    self.counters[name] = self.counters.get(name, 0) + n
+                self.counters["frames"] += 1
+                self.frame_ms.append(total)
+                self.done_times.append(time.perf_counter())
+            self._maybe_export()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            stages = getattr(self.local, "stages", None)
+            if stages is not None:
+                stages[name] = stages.get(name, 0.0) + ms
+            else:
+                # Ngoài frame (vd: ghi điểm danh ở luồng hiển thị) → ghi thẳng vào cửa sổ
+                with self.lock:
+                    self.stage_ms.setdefault(name, deque(maxlen=self.frame_ms.maxlen)).append(ms)
+
+    def count(self, name, n=1):
+        counts = getattr(self.local, "counts", None)
+        if counts is not None:
+            counts[name] = counts.get(name, 0) + n
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self.lock:
+            stage_ms = {k: np.array(v) for k, v in self.stage_ms.items()}
+            frame_ms = np.array(self.frame_ms)
+            times = list(self.done_times)
+            counters = dict(self.counters)
+        snap = {"counters": counters, "stages": {}}
+        for name, arr in stage_ms.items():
+            if len(arr):
+                snap["stages"][name] = {"p50_ms": float(np.percentile(arr, 50)),
+                                        "p95_ms": float(np.percentile(arr, 95))}
+        snap["frame_p50_ms"] = float(np.percentile(frame_ms, 50)) if len(frame_ms) else 0.0
+        snap["frame_p95_ms"] = float(np.percentile(frame_ms, 95)) if len(frame_ms) else 0.0
+        snap["fps"] = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return snap
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [f"# TYPE {PROM_PREFIX}_stage_latency_ms summary"]
+        for name, st in snap["stages"].items():
+            lines.append(f'{PROM_PREFIX}_stage_latency_ms{{stage="{name}",quantile="0.5"}} {st["p50_ms"]:.3f}')
+            lines.append(f'{PROM_PREFIX}_stage_latency_ms{{stage="{name}",quantile="0.95"}} {st["p95_ms"]:.3f}')
+        lines.append(f"# TYPE {PROM_PREFIX}_frame_latency_ms summary")
+        lines.append(f'{PROM_PREFIX}_frame_latency_ms{{quantile="0.5"}} {snap["frame_p50_ms"]:.3f}')
+        lines.append(f'{PROM_PREFIX}_frame_latency_ms{{quantile="0.95"}} {snap["frame_p95_ms"]:.3f}')
+        lines.append(f"# TYPE {PROM_PREFIX}_fps gauge")
+        lines.append(f"{PROM_PREFIX}_fps {snap['fps']:.3f}")
+        for name, value in snap["counters"].items():
+            lines.append(f"# TYPE {PROM_PREFIX}_{name}_total counter")
+            lines.append(f"{PROM_PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def overlay(self, frame):
+        snap = self.snapshot()
+        parts = [f"{snap['fps']:.1f} FPS"]
+        parts += [f"{name} {st['p50_ms']:.0f}ms" for name, st in snap["stages"].items() if name != "store"]
+        cv2.putText(frame, "  ".join(parts), (10, frame.shape[0] - 12),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
+
+    # ===============================
+    # 📤 Xuất metrics: file JSON / endpoint Prometheus
+    # ===============================
+    def _maybe_export(self):
+        if self.export_path is None or time.monotonic() < self.next_export:
+            return
+        self.next_export = time.monotonic() + self.export_every
+        self.export()
+
+    def export(self):
+        if self.export_path is None:
+            return
+        tmp = self.export_path + ".tmp"
+        if self.export_path.endswith(".prom"):
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dict(self.snapshot(), timestamp=time.time()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.export_path)
+
+    def serve(self, port, host="127.0.0.1"):
+        if self.server is not None:
+            return self.server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics Prometheus: http://{host}:{port}/metrics")
+        return self.server
+
+    def close(self):
+        self.export()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def print_summary(self):
+        snap = self.snapshot()
+        c = snap["counters"]
+        print(f"📊 {c['frames']} frame, {snap['fps']:.1f} FPS, p50 {snap['frame_p50_ms']:.1f} ms/frame | "
+              f"{c['faces']} mặt, {c['recognized']} nhận ra, {c['unknown']} unknown, "
+              f"{c['crops_skipped']} crop rỗng, {c['embed_failed']} embed lỗi, {c['cache_hits']} cache hit")
+        rejected = {k[len("rejected_"):]: v for k, v in c.items() if k.startswith("rejected_") and v}
+        if rejected:
+            print("   🚦 Loại trước embed: " + ", ".join(f"{k} {v}" for k, v in rejected.items()))
+        for name, st in snap["stages"].items():
+            print(f"   {name:<10} p50 {st['p50_ms']:8.2f} ms  p95 {st['p95_ms']:8.2f} ms")
+
+
+def create_metrics(enabled, export_path=None):
+    return FrameMetrics(export_path=export_path) if enabled else NullMetrics()
+
+
+# ===============================
+# 🔬 cProfile cho cả một phiên (opt-in)
+# ===============================
+@contextmanager
+def profile_session(path):
+    if not path:
+        yield None
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
+        print(f"🔬 Đã ghi profile → {path} (xem bằng: python -m pstats {path})")
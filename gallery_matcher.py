@@ -0,0 +1,109 @@
+import numpy as np
+
+MAX_SIMS_CHUNK = 8192     # số hàng gallery giải nén mỗi lần khi gallery lưu dạng float16/int8
+
+# ===============================
+# 🗂️ Gallery embeddings liền khối
+# ===============================
+class GalleryMatcher:
+    def __init__(self, embeddings, labels):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = np.asarray(labels)
+
+        # Sắp xếp theo nhãn để mỗi lớp là một đoạn liên tiếp [offsets[i], offsets[i+1])
+        self.class_names, inverse = np.unique(labels, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        norms = np.linalg.norm(embeddings[order], axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = np.ascontiguousarray(embeddings[order] / norms)
+        self.label_index = inverse[order]
+
+        self.store = None
+        self.counts = np.bincount(self.label_index, minlength=len(self.class_names))
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.name_to_index = {name: i for i, name in enumerate(self.class_names)}
+
+        # mean(dot(E_c, q)) = dot(mean(E_c), q) → centroid (không chuẩn hóa) cho điểm trung bình
+        if len(self.class_names):
+            sums = np.add.reduceat(self.matrix, self.offsets[:-1], axis=0)
+            self.centroids = np.ascontiguousarray(sums / self.counts[:, None], dtype=np.float32)
+        else:
+            self.centroids = np.zeros((0, self.matrix.shape[1]), dtype=np.float32)
+
+    @classmethod
+    def from_npz(cls, path):
+        npz = np.load(path, allow_pickle=True)
+        return cls(npz["embeddings"], npz["labels"])
+
+    @classmethod
+    def from_store(cls, path):
+        # Dùng trực tiếp ma trận memmap của gallery_store (không nạp cả file vào RAM)
+        from gallery_store import GalleryStore
+
+        store = GalleryStore(path)
+        self = cls.__new__(cls)
+        self.store = store
+        self.class_names = store.class_names
+        self.matrix = store.matrix
+        self.label_index = store.label_index
+        self.offsets = store.offsets
+        self.counts = np.diff(store.offsets)
+        self.name_to_index = {name: i for i, name in enumerate(self.class_names)}
+        self.centroids = np.asarray(store.centroids)
+        return self
+
+    def subset(self, names):
+        # Gallery chỉ gồm các lớp cho trước (vd: sinh viên thuộc các môn đang mở), giữ nguyên centroid
+        idx = np.array(sorted({self.name_to_index[n] for n in names if n in self.name_to_index}), dtype=np.int64)
+        sub = self.__class__.__new__(self.__class__)
+        sub.store = None
+        sub.class_names = self.class_names[idx]
+        sub.counts = self.counts[idx]
+        sub.offsets = np.concatenate([[0], np.cumsum(sub.counts)])
+        blocks = [self.store.rows(self.offsets[i], self.offsets[i + 1]) if self.store is not None
+                  else self.matrix[self.offsets[i]:self.offsets[i + 1]] for i in idx]
+        dim = self.centroids.shape[1]
+        sub.matrix = np.ascontiguousarray(np.concatenate(blocks) if blocks else np.zeros((0, dim)), dtype=np.float32)
+        sub.label_index = np.repeat(np.arange(len(idx)), sub.counts)
+        sub.name_to_index = {name: i for i, name in enumerate(sub.class_names)}
+        sub.centroids = np.ascontiguousarray(self.centroids[idx], dtype=np.float32)
+        return sub
+
+    def __len__(self):
+        return len(self.class_names)
+
+    def mean_sims(self, queries):
+        # (N, D) → (N, C): độ tương đồng cosine trung bình với từng lớp, 1 phép nhân ma trận
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        return queries @ self.centroids.T
+
+    def max_sims(self, queries):
+        # (N, D) → (N, C): độ tương đồng lớn nhất với từng lớp
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.store is None:
+            sims = queries @ self.matrix.T
+        else:
+            sims = np.empty((len(queries), len(self.store)), dtype=np.float32)
+            for start in range(0, len(self.store), MAX_SIMS_CHUNK):
+                stop = min(start + MAX_SIMS_CHUNK, len(self.store))
+                sims[:, start:stop] = queries @ self.store.rows(start, stop).T
+        return np.maximum.reduceat(sims, self.offsets[:-1], axis=1)
+
+    def mean_sim_for(self, queries, names):
+        # Điểm trung bình của mỗi query với đúng lớp đã cho (lớp lạ → 0.0)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        out = np.zeros(len(queries), dtype=np.float32)
+        idx = np.array([self.name_to_index.get(n, -1) for n in names])
+        known = idx >= 0
+        if np.any(known):
+            out[known] = np.einsum("nd,nd->n", queries[known], self.centroids[idx[known]])
+        return out
+
+    def top_k(self, queries, k=3):
+        # Trả về (tên, mean, max) của k lớp gần nhất cho mỗi query, xếp theo mean giảm dần
+        mean = self.mean_sims(queries)
+        best = self.max_sims(queries)
+        k = min(k, len(self.class_names))
+        top = np.argsort(-mean, axis=1)[:, :k]
+        rows = np.arange(len(mean))[:, None]
+        return self.class_names[top], mean[rows, top], best[rows, top]
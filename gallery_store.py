@@ -0,0 +1,200 @@
+import os
+import json
+import struct
+import argparse
+import numpy as np
+
+# ===============================
+# ⚙️ Định dạng gallery trên đĩa (.fgal)
+# ===============================
+# [MAGIC 8 byte][độ dài header uint32][header JSON][pad → ALIGN]
+# [ma trận embeddings (n, dim) float16|int8][scale (n,) float32 nếu int8]
+# [label_index (n,) int32][centroids (n_classes, dim) float32]
+# Các hàng đã chuẩn hóa L2 và sắp xếp theo lớp (offsets trong header).
+MODEL_DIR = "face_models_facenet"
+EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+GALLERY_STORE_PATH = os.path.join(MODEL_DIR, "gallery_facenet.fgal")
+
+MAGIC = b"FGAL\x00\x01\x00\x00"
+ALIGN = 64
+DTYPES = ("float16", "int8")
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def quantize_int8(X):
+    # Lượng tử hóa đối xứng theo từng hàng: x ≈ q * scale
+    scale = np.abs(X).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.round(X / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+# ===============================
+# 💾 Ghi gallery
+# ===============================
+def write_store(embeddings, labels, path=GALLERY_STORE_PATH, dtype="float16"):
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype không hỗ trợ: {dtype} (chọn: {', '.join(DTYPES)})")
+
+    X = np.asarray(embeddings, dtype=np.float64)
+    X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    class_names, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    X, label_index = X[order], inverse[order].astype(np.int32)
+    counts = np.bincount(label_index, minlength=len(class_names))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    centroids = np.stack([X[offsets[i]:offsets[i + 1]].mean(axis=0)
+                          for i in range(len(class_names))]).astype(np.float32)
+
+    if dtype == "int8":
+        matrix, scale = quantize_int8(X)
+    else:
+        matrix, scale = X.astype(np.float16), None
+
+    sections = [("matrix", matrix)]
+    if scale is not None:
+        sections.append(("scale", scale))
+    sections += [("label_index", label_index), ("centroids", centroids)]
+
+    header = {"version": 1, "dtype": dtype, "n": int(len(X)), "dim": int(X.shape[1]),
+              "class_names": [str(c) for c in class_names], "offsets": offsets.tolist(),
+              "sections": {}}
+    # Tính offset từng phần (header JSON chứa chính các offset nên lặp tới khi cố định)
+    header_len = 0
+    while True:
+        pos = _align(len(MAGIC) + 4 + header_len)
+        for name, arr in sections:
+            header["sections"][name] = {"offset": pos, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+            pos = _align(pos + arr.nbytes)
+        blob = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(blob) == header_len:
+            break
+        header_len = len(blob)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(blob)))
+        f.write(blob)
+        for name, arr in sections:
+            f.seek(header["sections"][name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+    os.replace(tmp, path)
+    return header
+
+
+def convert_npz(npz_path=EMBEDDINGS_NPZ, path=GALLERY_STORE_PATH, dtype="float16"):
+    npz = np.load(npz_path, allow_pickle=True)
+    return write_store(npz["embeddings"], npz["labels"], path, dtype)
+
+
+# ===============================
+# 📖 Mở gallery bằng np.memmap (chỉ đọc, không sao chép)
+# ===============================
+class GalleryStore:
+    def __init__(self, path=GALLERY_STORE_PATH):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Không phải file gallery: {path}")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.path = path
+        self.dtype = self.header["dtype"]
+        self.class_names = np.array(self.header["class_names"])
+        self.offsets = np.array(self.header["offsets"], dtype=np.int64)
+        for name, sec in self.header["sections"].items():
+            # Trang bộ nhớ được hệ điều hành chia sẻ giữa các tiến trình cùng mở file
+            arr = np.memmap(path, dtype=np.dtype(sec["dtype"]), mode="r",
+                            offset=sec["offset"], shape=tuple(sec["shape"]))
+            setattr(self, name, arr)
+        if not hasattr(self, "scale"):
+            self.scale = None
+
+    def __len__(self):
+        return self.header["n"]
+
+    def rows(self, start, stop):
+        # Giải nén một khối hàng sang float32 (chỉ khối này được cấp phát)
+        block = np.asarray(self.matrix[start:stop], dtype=np.float32)
+        if self.scale is not None:
+            block *= self.scale[start:stop, None]
+        return block
+
+
+def ensure_store(path=GALLERY_STORE_PATH, npz_path=EMBEDDINGS_NPZ, dtype="float16"):
+    # Chuyển đổi lại khi chưa có file .fgal, file npz mới hơn hoặc đổi kiểu lưu
+    stale = not os.path.exists(path) or (os.path.exists(npz_path) and
+                                         os.path.getmtime(npz_path) > os.path.getmtime(path))
+    if not stale and GalleryStore(path).dtype != dtype:
+        stale = True
+    if stale:
+        convert_npz(npz_path, path, dtype)
+    return path
+
+
+# ===============================
+# ✅ Kiểm tra độ chính xác so với float64
+# ===============================
+def verify_parity(npz_path=EMBEDDINGS_NPZ, dtype="float16", path=None):
+    from gallery_matcher import GalleryMatcher
+
+    path = path or GALLERY_STORE_PATH + f".{dtype}.check"
+    convert_npz(npz_path, path, dtype)
+    try:
+        npz = np.load(npz_path, allow_pickle=True)
+        X = np.asarray(npz["embeddings"], dtype=np.float64)
+        X /= np.linalg.norm(X, axis=1, keepdims=True)
+        y = np.asarray(npz["labels"])
+
+        exact = {}
+        for name in np.unique(y):
+            E = X[y == name]
+            exact[name] = (X @ E.T).mean(axis=1), (X @ E.T).max(axis=1)
+        names = sorted(exact)
+        exact_mean = np.stack([exact[n][0] for n in names], axis=1)
+        exact_max = np.stack([exact[n][1] for n in names], axis=1)
+
+        g = GalleryMatcher.from_store(path)
+        q = X.astype(np.float32)
+        mean_diff = float(np.max(np.abs(g.mean_sims(q) - exact_mean)))
+        # Centroid lưu float32 → kiểm tra thêm mean tính từ chính ma trận float16/int8 đã giải nén
+        sims = q @ g.store.rows(0, len(g.store)).T
+        matrix_mean = np.add.reduceat(sims, g.offsets[:-1], axis=1) / g.counts
+        matrix_mean_diff = float(np.max(np.abs(matrix_mean - exact_mean)))
+        best = g.max_sims(q)
+        max_diff = float(np.max(np.abs(best - exact_max)))
+        same_top1 = bool(np.all(np.argmax(g.mean_sims(q), axis=1) == np.argmax(exact_mean, axis=1))
+                         and np.all(np.argmax(best, axis=1) == np.argmax(exact_max, axis=1)))
+        del g, sims  # đóng memmap trước khi xóa file (Windows)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"   {dtype}: lệch mean tối đa {mean_diff:.2e} (từ ma trận {matrix_mean_diff:.2e}), "
+          f"lệch max tối đa {max_diff:.2e}, top-1 trùng float64: {same_top1}")
+    return {"dtype": dtype, "mean_diff": mean_diff, "matrix_mean_diff": matrix_mean_diff,
+            "max_diff": max_diff, "same_top1": same_top1}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gallery embeddings dạng float16/int8 mở bằng memmap")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="Chuyển faces_embeddings_facenet.npz sang .fgal")
+    c.add_argument("--dtype", choices=DTYPES, default="float16")
+    c.add_argument("--npz", default=EMBEDDINGS_NPZ)
+    c.add_argument("--out", default=GALLERY_STORE_PATH)
+    v = sub.add_parser("verify", help="So sánh độ tương đồng với bản float64")
+    v.add_argument("--npz", default=EMBEDDINGS_NPZ)
+    args = parser.parse_args()
+
+    if args.cmd == "convert":
+        h = convert_npz(args.npz, args.out, args.dtype)
+        print(f"✅ Đã ghi {args.out}: {h['n']} embeddings, {len(h['class_names'])} lớp, {h['dtype']}")
+    else:
+        results = [verify_parity(args.npz, d) for d in DTYPES]
+        if not all(r["same_top1"] for r in results):
+            raise SystemExit("❌ Kết quả top-1 khác bản float64")
@@ -0,0 +1,150 @@
+import time
+import queue
+import threading
+
+# ===============================
+# ⚙️ Chính sách khi hàng đợi đầy
+# ===============================
+DROP_OLDEST = "drop_oldest"   # bỏ phần tử cũ nhất, luôn giữ frame mới
+DROP_NEWEST = "drop_newest"   # bỏ phần tử vừa tới
+BLOCK = "block"               # chờ (không giới hạn độ trễ, chỉ dùng khi cần xử lý mọi frame)
+
+
+class BoundedQueue:
+    def __init__(self, maxsize=2, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Chính sách không hợp lệ: {policy}")
+        self.q = queue.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    def put(self, item, timeout=None):
+        if self.policy == BLOCK:
+            self.q.put(item, timeout=timeout)
+            return True
+        while True:
+            try:
+                self.q.put_nowait(item)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    return False
+                try:
+                    self.q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.q.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self.q.get_nowait()
+
+
+# ===============================
+# 🎥 Luồng đọc camera: chỉ giữ frame mới nhất
+# ===============================
+class LatestFrameCapture(threading.Thread):
+    def __init__(self, cap, on_frame=None):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.on_frame = on_frame
+        self.lock = threading.Lock()
+        self.frame = None
+        self.seq = 0
+        self.stopped = threading.Event()
+        self.ended = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            with self.lock:
+                self.seq += 1
+                self.frame = frame
+                seq = self.seq
+            if self.on_frame is not None:
+                self.on_frame(seq, frame, time.perf_counter())
+        self.ended.set()
+
+    def latest(self):
+        with self.lock:
+            return self.seq, self.frame
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ===============================
+# 🧵 Pipeline: capture → worker (detect + embed) → hiển thị
+# ===============================
+class AsyncPipeline:
+    def __init__(self, cap, process_fn, workers=1, queue_size=2, policy=DROP_OLDEST):
+        # process_fn(frame) chạy trong worker, kết quả được ghép với frame mới nhất khi hiển thị
+        self.process_fn = process_fn
+        self.work_q = BoundedQueue(queue_size, policy)
+        self.result_q = BoundedQueue(queue_size * 4, DROP_OLDEST)
+        self.capture = LatestFrameCapture(cap, on_frame=self._on_frame)
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        self.stopped = threading.Event()
+        self.last_seq = 0
+        self.last_results = []
+        self.latency_ms = 0.0
+
+    def _on_frame(self, seq, frame, t_capture):
+        self.work_q.put((seq, frame, t_capture))
+
+    def _work(self):
+        while not self.stopped.is_set():
+            try:
+                seq, frame, t_capture = self.work_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                results = self.process_fn(frame)
+            except Exception as e:
+                print("⚠️ Lỗi xử lý frame:", e)
+                continue
+            self.result_q.put((seq, results, t_capture))
+
+    def start(self):
+        self.capture.start()
+        for w in self.workers:
+            w.start()
+        return self
+
+    def poll_results(self):
+        # Lấy các kết quả mới, bỏ kết quả của frame cũ hơn frame đã hiển thị
+        fresh = []
+        while True:
+            try:
+                seq, results, t_capture = self.result_q.get_nowait()
+            except queue.Empty:
+                break
+            if seq <= self.last_seq:
+                continue
+            self.last_seq = seq
+            self.last_results = results
+            self.latency_ms = (time.perf_counter() - t_capture) * 1000
+            fresh.append(results)
+        return fresh
+
+    def latest_frame(self):
+        return self.capture.latest()[1]
+
+    @property
+    def ended(self):
+        return self.capture.ended.is_set()
+
+    @property
+    def dropped(self):
+        return self.work_q.dropped
+
+    def stop(self):
+        self.stopped.set()
+        self.capture.stop()
+        self.capture.join(timeout=1.0)
+        for w in self.workers:
+            w.join(timeout=1.0)
@@ -0,0 +1,255 @@
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+import face_recognition_attendance as fra
+from face_detector import create_detector
+
+# ===============================
+# ⚙️ Cấu hình API nhận diện
+# ===============================
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 32              # số khuôn mặt tối đa trong một lần embed
+MAX_WAIT_MS = 10.0          # thời gian chờ gom thêm request trước khi chạy batch
+MAX_BODY_BYTES = 10 * 1024 * 1024
+METRICS_WINDOW = 1000
+RATE_WINDOW_S = 10.0        # throughput = số request hoàn thành trong cửa sổ thời gian cố định này
+
+
+# ===============================
+# 📊 Độ trễ / throughput
+# ===============================
+class ApiMetrics:
+    def __init__(self):
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.done_times = deque()
+        self.batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.started = None         # lúc request đầu tiên tới
+
+    def on_request(self, ms, ok=True):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now - ms / 1000
+        self.requests += 1
+        self.errors += 0 if ok else 1
+        self.latencies.append(ms)
+        self.done_times.append(now)
+        self._expire(now)
+
+    def _expire(self, now):
+        while self.done_times and self.done_times[0] < now - RATE_WINDOW_S:
+            self.done_times.popleft()
+
+    def throughput(self):
+        # Request trong micro-batch hoàn thành cùng lúc → chia cho cả cửa sổ thời gian (hoặc từ
+        # lúc request đầu tiên tới nếu server chạy chưa đủ lâu), không chia cho khoảng giữa các lần xong
+        if self.started is None:
+            return 0.0
+        now = time.perf_counter()
+        self._expire(now)
+        elapsed = min(RATE_WINDOW_S, now - self.started)
+        return len(self.done_times) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        lat = np.array(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": float(np.percentile(lat, 50)) if len(lat) else 0.0,
+            "p99_ms": float(np.percentile(lat, 99)) if len(lat) else 0.0,
+            "throughput_rps": self.throughput(),
+            "mean_batch": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+        }
+
+
+# ===============================
+# 🧺 Gom request: nhiều request đồng thời → một lần forward Facenet
+# ===============================
+class MicroBatcher:
+    def __init__(self, metrics, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.queue = None           # tạo trong run(): asyncio.Queue (Python < 3.10) gắn với loop lúc khởi tạo
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        # Một luồng duy nhất giữ mô hình → không tranh chấp giữa các batch
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, crops):
+        if self.queue is None:
+            raise RuntimeError("MicroBatcher chưa chạy (gọi run() trong event loop trước)")
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((crops, fut))
+        return await fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        while True:
+            items = [await self.queue.get()]
+            n = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            crops = [c for cs, _ in items for c in cs]
+            self.metrics.batch_sizes.append(len(crops))
+            try:
+                decisions = await loop.run_in_executor(self.executor, _embed_and_classify, crops)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            pos = 0
+            for cs, fut in items:
+                if not fut.done():
+                    fut.set_result(decisions[pos:pos + len(cs)])
+                pos += len(cs)
+
+
+def _embed_and_classify(crops):
+    if not crops:
+        return []
+    return fra.classify_embeddings(fra.embedder.embed(crops))
+
+
+# ===============================
+# 🌐 Máy chủ HTTP tối giản trên asyncio
+# ===============================
+class RecognitionAPI:
+    def __init__(self, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        fra.load_models()
+        self.metrics = ApiMetrics()
+        self.batcher = MicroBatcher(self.metrics, max_batch, max_wait_ms)
+        self.detector = create_detector(fra.DETECTOR_BACKEND)
+        self.detect_executor = ThreadPoolExecutor(max_workers=1)
+
+    def detect(self, rgb):
+        # Chạy trong detect_executor: detect + lọc chất lượng cùng một luồng, không chặn event loop
+        return fra.gate_faces(rgb, self.detector.detect_faces(rgb))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "body quá lớn"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=False):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                  500: "Internal Server Error"}.get(status, "OK")
+        head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/metrics":
+            snap = self.metrics.snapshot()
+            if fra.recognition_cache is not None:
+                snap["cache"] = fra.recognition_cache.stats()
+            if fra.quality_gate is not None:
+                snap["quality"] = fra.quality_gate.stats()
+            return 200, snap
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "ready": fra.models_ready()}
+        if method == "POST" and path in ("/recognize", "/recognize_crop"):
+            t0 = time.perf_counter()
+            try:
+                payload = await self.recognize(body, crop=path == "/recognize_crop")
+                ok, status = True, 200
+            except ValueError as e:
+                payload, ok, status = {"error": str(e)}, False, 400
+            except Exception as e:
+                payload, ok, status = {"error": str(e)}, False, 500
+            self.metrics.on_request((time.perf_counter() - t0) * 1000, ok)
+            return status, payload
+        return 404, {"error": f"không có endpoint {method} {path}"}
+
+    async def recognize(self, body, crop=False):
+        img = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("không giải mã được ảnh JPEG")
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        if crop:
+            # Client đã gửi sẵn crop khuôn mặt → không lọc chất lượng / xoay lại
+            boxes, keypoints = [(0, 0, rgb.shape[1], rgb.shape[0])], None
+        else:
+            loop = asyncio.get_running_loop()
+            faces = await loop.run_in_executor(self.detect_executor, self.detect, rgb)
+            boxes, keypoints = fra.face_boxes(faces)
+
+        valid, crops = fra.crop_boxes(rgb, boxes, keypoints)
+        decisions = await self.batcher.submit(crops)
+        faces = []
+        for i, d in zip(valid, decisions):
+            faces.append({"box": [int(v) for v in boxes[i]], "name": str(d["name"]) if d["recognized"] else "unknown",
+                          "predicted": str(d["name"]), "prob": d["prob"], "similarity": d["similarity"],
+                          "recognized": bool(d["recognized"])})
+        return {"faces": faces}
+
+    async def serve(self, host=HOST, port=PORT):
+        batch_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🌐 API nhận diện đang chạy tại http://{host}:{port} "
+              f"(batch ≤ {self.batcher.max_batch}, chờ {self.batcher.max_wait * 1000:.0f} ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API nhận diện khuôn mặt (không giao diện)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(RecognitionAPI(args.max_batch, args.max_wait_ms).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,213 @@
+import os
+import time
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from gallery_store import quantize_int8
+
+# ===============================
+# ⚙️ Cấu hình cache nhận diện
+# ===============================
+CACHE_SIZE = 64             # số embedding tối đa được giữ (bộ nhớ cố định: 64 × 128 byte)
+CACHE_TTL_S = 10.0          # kết quả cũ hơn mức này phải chạy lại SVM + gallery
+# Đo trên gallery đi kèm (100 ảnh, 5 người; `python recognition_cache.py`):
+#   khác người: cosine lớn nhất 0.739 (p99.9 0.666)
+#   cùng người: trung vị 0.712, chỉ 1% cặp ≥ 0.9, 21% cặp ≥ 0.8
+#   phát lại ảnh từng người qua cache: hit 47% ở 0.8, 8% ở 0.9, không hit nhầm người
+# → ngưỡng = cosine khác người lớn nhất + CACHE_SIM_MARGIN; các frame liên tiếp trong một track
+#   giống nhau hơn các ảnh gallery chụp riêng nên tỉ lệ hit thực tế cao hơn con số trên
+CACHE_SIM_THRESH = 0.8
+CACHE_SIM_MARGIN = 0.06     # khoảng an toàn trên cặp khác người giống nhau nhất
+EMBEDDINGS_NPZ = os.path.join("face_models_facenet", "faces_embeddings_facenet.npz")
+
+
+# ===============================
+# 🕒 Cache TTL + LRU theo khóa (tên, track...)
+# ===============================
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=CACHE_TTL_S, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.items = OrderedDict()      # khóa → (hết hạn lúc, giá trị)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = self.clock()
+        with self.lock:
+            item = self.items.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self.items[key]
+                self.misses += 1
+                return default
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (self.clock() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        now = self.clock()
+        with self.lock:
+            item = self.items.get(key)
+            return item is not None and item[0] > now
+
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"size": len(self.items), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+
+# ===============================
+# 🧊 Cache quyết định theo chữ ký embedding (int8, số slot cố định)
+# ===============================
+class EmbeddingCache:
+    # Khuôn mặt vừa được nhận ra chắc chắn → embedding gần như trùng ở các frame sau,
+    # so khớp với vài chục embedding đã lượng tử hóa thay vì chạy SVM + chấm điểm gallery
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL_S, sim_thresh=CACHE_SIM_THRESH,
+                 dim=128, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sim_thresh = sim_thresh
+        self.clock = clock
+        self.codes = np.zeros((maxsize, dim), dtype=np.int8)
+        self.scale = np.zeros(maxsize, dtype=np.float32)
+        self.expires = np.full(maxsize, -np.inf)
+        self.last_used = np.full(maxsize, -np.inf)
+        self.decisions = [None] * maxsize
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, embs):
+        # → danh sách quyết định đã cache (None nếu trượt), cùng thứ tự với embs
+        embs = np.asarray(embs, dtype=np.float32)
+        if not len(embs):
+            return []
+        now = self.clock()
+        with self.lock:
+            live = self.expires > now
+            if not np.any(live):
+                self.misses += len(embs)
+                return [None] * len(embs)
+            sims = (embs @ self.codes.T.astype(np.float32)) * self.scale
+            sims[:, ~live] = -np.inf
+            best = np.argmax(sims, axis=1)
+            out = []
+            for i, slot in enumerate(best):
+                if sims[i, slot] >= self.sim_thresh:
+                    self.last_used[slot] = now
+                    self.hits += 1
+                    out.append(dict(self.decisions[slot], cached=True))
+                else:
+                    self.misses += 1
+                    out.append(None)
+            return out
+
+    def insert(self, emb, decision):
+        if not decision["recognized"]:
+            return
+        code, scale = quantize_int8(np.asarray(emb, dtype=np.float32)[None, :])
+        now = self.clock()
+        with self.lock:
+            # Ưu tiên slot đã hết hạn, nếu không thì thay slot ít dùng gần đây nhất
+            expired = np.flatnonzero(self.expires <= now)
+            if len(expired):
+                slot = expired[0]
+            else:
+                slot = int(np.argmin(self.last_used))
+                self.evictions += 1
+            self.codes[slot] = code[0]
+            self.scale[slot] = scale[0]
+            self.expires[slot] = now + self.ttl
+            self.last_used[slot] = now
+            self.decisions[slot] = dict(decision)
+
+    def clear(self):
+        with self.lock:
+            self.expires[:] = -np.inf
+            self.decisions = [None] * self.maxsize
+
+    def stats(self):
+        now = self.clock()
+        with self.lock:
+            total = self.hits + self.misses
+            return {"size": int(np.sum(self.expires > now)), "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+# ===============================
+# 📏 Chọn ngưỡng cache từ gallery đã đăng ký
+# ===============================
+def replay_hit_rate(X, y, sim_thresh):
+    # Phát lại ảnh của từng người liên tiếp (như một track) qua cache, không hết hạn
+    cache = EmbeddingCache(maxsize=len(X), sim_thresh=sim_thresh, dim=X.shape[1], clock=lambda: 0.0)
+    wrong = 0
+    for emb, name in zip(X, y):
+        d = cache.lookup(emb[None, :])[0]
+        if d is None:
+            cache.insert(emb, {"name": name, "recognized": True})
+        elif d["name"] != name:
+            wrong += 1
+    st = cache.stats()
+    return st["hit_rate"], wrong
+
+
+def calibrate(X, y, margin=CACHE_SIM_MARGIN):
+    X = np.asarray(X, dtype=np.float64)
+    X = X / np.linalg.norm(X, axis=1, keepdims=True)
+    y = np.asarray(y)
+    order = np.argsort(y, kind="stable")
+    X, y = X[order], y[order]
+    sims = X @ X.T
+    iu = np.triu_indices(len(X), 1)
+    same = (y[:, None] == y[None, :])[iu]
+    pair = sims[iu]
+    impostor = float(pair[~same].max()) if np.any(~same) else -1.0
+    genuine = pair[same]
+    thresh = min(impostor + margin, 0.99)
+    return {"threshold": thresh, "impostor_max": impostor,
+            "impostor_p999": float(np.percentile(pair[~same], 99.9)) if np.any(~same) else -1.0,
+            "genuine_median": float(np.median(genuine)) if len(genuine) else 0.0,
+            "genuine_at_thresh": float(np.mean(genuine >= thresh)) if len(genuine) else 0.0,
+            "replay": {t: replay_hit_rate(X, y, t) for t in sorted({thresh, CACHE_SIM_THRESH, 0.9})}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đo độ tương đồng gallery để chọn ngưỡng cache nhận diện")
+    parser.add_argument("--npz", default=EMBEDDINGS_NPZ)
+    parser.add_argument("--margin", type=float, default=CACHE_SIM_MARGIN)
+    args = parser.parse_args()
+
+    data = np.load(args.npz, allow_pickle=True)
+    c = calibrate(data["embeddings"], data["labels"], args.margin)
+    print(f"📏 {len(data['labels'])} embeddings của {len(set(data['labels']))} người")
+    print(f"   khác người : lớn nhất {c['impostor_max']:.3f}, p99.9 {c['impostor_p999']:.3f}")
+    print(f"   cùng người : trung vị {c['genuine_median']:.3f}, "
+          f"{c['genuine_at_thresh']:.0%} cặp ≥ ngưỡng đề xuất")
+    for t, (rate, wrong) in c["replay"].items():
+        print(f"   ngưỡng {t:.3f}: hit {rate:.0%} khi phát lại gallery, hit nhầm người {wrong}")
+    print(f"✅ Ngưỡng đề xuất: {c['threshold']:.2f} (đang dùng CACHE_SIM_THRESH = {CACHE_SIM_THRESH})")
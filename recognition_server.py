@@ -0,0 +1,312 @@
+import time
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+
+import face_recognition_attendance as fra
+from face_detector import create_detector
+from attendance_store import get_store
+
+# ===============================
+# ⚙️ Cấu hình máy chủ nhiều camera
+# ===============================
+MAX_BATCH_FRAMES = 8        # số frame (mỗi camera tối đa 1) gom vào một lần embed
+METRICS_WINDOW = 100        # số frame gần nhất dùng để tính FPS / độ trễ
+METRICS_EVERY_S = 5.0
+
+
+def parse_source(src):
+    # "0" → camera 0, còn lại là file / URL (rtsp://...)
+    return int(src) if str(src).isdigit() else src
+
+
+# ===============================
+# 📊 Bộ đếm theo từng luồng camera
+# ===============================
+class StreamMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.done_times = deque(maxlen=METRICS_WINDOW)
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+
+    def on_done(self, t_capture):
+        now = time.perf_counter()
+        with self.lock:
+            self.processed += 1
+            self.done_times.append(now)
+            self.latencies.append((now - t_capture) * 1000)
+
+    def on_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            times, lat = list(self.done_times), np.array(self.latencies)
+            snap = {"captured": self.captured, "processed": self.processed, "dropped": self.dropped,
+                    "errors": self.errors}
+        snap["fps"] = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        snap["p50_ms"] = float(np.percentile(lat, 50)) if len(lat) else 0.0
+        snap["p95_ms"] = float(np.percentile(lat, 95)) if len(lat) else 0.0
+        return snap
+
+
+# ===============================
+# 🏫 Phiên điểm danh của một phòng
+# ===============================
+class RoomSession:
+    def __init__(self, room, subject=None):
+        self.room = room
+        self.subject = subject or room
+        self.frame_confirm = {}
+        self.checked_in = set()
+        self.lock = threading.Lock()
+
+    def on_results(self, results):
+        with self.lock:
+            for r in results:
+                if not r["recognized"] or r["name"] in self.checked_in:
+                    continue
+                if fra.confirm(self.frame_confirm, r["name"]) >= fra.FRAMES_REQUIRED:
+                    self.checked_in.add(r["name"])
+                    get_store().add(r["name"], subject=self.subject)
+                    print(f"✅ [{self.room}] Điểm danh: {r['name']} ({datetime.now():%H:%M:%S})")
+
+
+# ===============================
+# 🎥 Một luồng camera: chỉ giữ frame mới nhất (backpressure theo từng camera)
+# ===============================
+class CameraStream(threading.Thread):
+    def __init__(self, room, source, session, realtime=True, loop=False):
+        super().__init__(daemon=True)
+        self.room = room
+        self.source = parse_source(source)
+        self.session = session
+        self.realtime = realtime
+        self.loop = loop
+        self.metrics = StreamMetrics()
+        self.lock = threading.Lock()
+        self.pending = None       # (frame, t_capture) chưa được xử lý
+        self.in_flight = False    # mỗi camera chỉ có tối đa 1 frame đang xử lý
+        self.stopped = threading.Event()
+        self.ended = threading.Event()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        is_file = isinstance(self.source, str) and not self.source.lower().startswith(("rtsp://", "http://", "https://"))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        next_t = time.perf_counter()
+        while not self.stopped.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                if is_file and self.loop:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+            # File phát lại theo tốc độ gốc để giả lập camera thật
+            if is_file and self.realtime:
+                next_t += 1.0 / fps
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            with self.lock:
+                self.metrics.captured += 1
+                if self.pending is not None:
+                    self.metrics.dropped += 1
+                self.pending = (frame, time.perf_counter())
+        cap.release()
+        self.ended.set()
+
+    def take(self):
+        with self.lock:
+            if self.pending is None or self.in_flight:
+                return None
+            item, self.pending = self.pending, None
+            self.in_flight = True
+            return item
+
+    def release(self):
+        with self.lock:
+            self.in_flight = False
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ===============================
+# 🧠 Worker dùng chung: detect từng frame, embed gộp mọi camera trong một batch
+# ===============================
+class RecognitionWorker(threading.Thread):
+    def __init__(self, server):
+        super().__init__(daemon=True)
+        self.server = server
+        # Mỗi worker có detector riêng, embedder / bộ phân loại dùng chung
+        self.detector = create_detector(fra.DETECTOR_BACKEND)
+
+    def run(self):
+        while not self.server.stopped.is_set():
+            batch = self.server.next_batch()
+            if not batch:
+                time.sleep(0.005)
+                continue
+            try:
+                self.process(batch)
+            except Exception as e:
+                print("⚠️ Lỗi xử lý batch:", e)
+            finally:
+                for stream, _, _ in batch:
+                    stream.release()
+
+    def fail(self, stream, stage, e):
+        # Lỗi chỉ làm mất frame của camera đó, các camera khác trong batch vẫn được xử lý
+        stream.metrics.on_error()
+        print(f"⚠️ [{stream.room}] Lỗi {stage}, bỏ frame:", e)
+
+    def process(self, batch):
+        all_crops, owners = [], []
+        per_frame, alive = [], []
+        for bi, (stream, frame, t_capture) in enumerate(batch):
+            per_frame.append([])
+            try:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                boxes, keypoints = fra.face_boxes(fra.gate_faces(rgb, self.detector.detect_faces(rgb)))
+                valid, crops = fra.crop_boxes(rgb, boxes, keypoints)
+            except Exception as e:
+                self.fail(stream, "detect", e)
+                continue
+            alive.append(bi)
+            all_crops += crops
+            owners += [(bi, boxes[i]) for i in valid]
+
+        # Crop hỏng bị bỏ riêng lẻ trong embed_crops thay vì làm hỏng cả batch
+        ok, embs = fra.embed_crops(all_crops) if all_crops else ([], [])
+        owners = [owners[i] for i in ok]
+        decisions, failed = self.classify(batch, owners, embs)
+        for (bi, box), d in zip(owners, decisions):
+            if bi not in failed:
+                per_frame[bi].append(dict(d, box=box))
+
+        for bi in alive:
+            if bi in failed:
+                continue
+            stream, _, t_capture = batch[bi]
+            try:
+                stream.session.on_results(per_frame[bi])
+            except Exception as e:
+                self.fail(stream, "ghi điểm danh", e)
+                continue
+            stream.metrics.on_done(t_capture)
+
+    def classify(self, batch, owners, embs):
+        # → (quyết định cùng thứ tự owners, tập chỉ số frame bị lỗi)
+        if not owners:
+            return [], set()
+        try:
+            return fra.classify_embeddings(embs), set()
+        except Exception:
+            pass
+        # Cả batch lỗi → phân loại lại theo từng frame để chỉ frame gây lỗi bị bỏ
+        owner_frames = np.array([bi for bi, _ in owners])
+        out, failed = [None] * len(owners), set()
+        for bi in np.unique(owner_frames):
+            idx = np.flatnonzero(owner_frames == bi)
+            try:
+                for i, d in zip(idx, fra.classify_embeddings(np.asarray(embs)[idx])):
+                    out[i] = d
+            except Exception as e:
+                failed.add(int(bi))
+                self.fail(batch[bi][0], "phân loại", e)
+        return out, failed
+
+
+# ===============================
+# 🌐 Máy chủ: N camera → pool worker dùng chung → phiên theo phòng
+# ===============================
+class RecognitionServer:
+    def __init__(self, streams, workers=2, max_batch=MAX_BATCH_FRAMES, realtime=True, loop=False):
+        # streams: {phòng: nguồn video}
+        fra.load_models()
+        self.streams = [CameraStream(room, src, RoomSession(room), realtime, loop)
+                        for room, src in streams.items()]
+        self.max_batch = max_batch
+        self.stopped = threading.Event()
+        self.rr_lock = threading.Lock()
+        self.rr = 0
+        self.workers = [RecognitionWorker(self) for _ in range(workers)]
+
+    def next_batch(self):
+        # Lấy vòng tròn, mỗi camera tối đa 1 frame → camera chậm / nhanh không chiếm hết worker
+        with self.rr_lock:
+            n = len(self.streams)
+            batch = []
+            for k in range(n):
+                stream = self.streams[(self.rr + k) % n]
+                item = stream.take()
+                if item is not None:
+                    batch.append((stream, *item))
+                    if len(batch) >= self.max_batch:
+                        break
+            self.rr = (self.rr + 1) % n
+            return batch
+
+    def start(self):
+        for s in self.streams:
+            s.start()
+        for w in self.workers:
+            w.start()
+        return self
+
+    def metrics(self):
+        return {s.room: s.metrics.snapshot() for s in self.streams}
+
+    def print_metrics(self):
+        for room, m in self.metrics().items():
+            print(f"   [{room}] {m['fps']:5.1f} FPS  p50 {m['p50_ms']:6.0f} ms  p95 {m['p95_ms']:6.0f} ms  "
+                  f"xử lý {m['processed']}/{m['captured']}  bỏ {m['dropped']}  lỗi {m['errors']}")
+
+    def all_ended(self):
+        return all(s.ended.is_set() for s in self.streams)
+
+    def stop(self, timeout=2.0):
+        for s in self.streams:
+            s.stop()
+        self.stopped.set()
+        # Chờ cả luồng camera để VideoCapture được release trước khi thoát
+        for t in self.workers + self.streams:
+            if t.is_alive():
+                t.join(timeout=timeout)
+            if t.is_alive():
+                print(f"⚠️ Luồng {t.name} chưa dừng sau {timeout:.0f}s")
+        get_store().flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Máy chủ nhận diện cho nhiều phòng học")
+    parser.add_argument("--stream", action="append", required=True,
+                        help="PHÒNG=NGUỒN, vd: \"Xử lý ảnh=0\" hoặc \"AI cơ bản=lecture.mp4\"")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=MAX_BATCH_FRAMES)
+    parser.add_argument("--loop", action="store_true", help="Phát lặp lại file video")
+    parser.add_argument("--no-realtime", action="store_true", help="Đọc file nhanh nhất có thể")
+    args = parser.parse_args()
+
+    streams = dict(s.split("=", 1) for s in args.stream)
+    server = RecognitionServer(streams, args.workers, args.batch,
+                               realtime=not args.no_realtime, loop=args.loop).start()
+    print(f"🌐 Đang chạy {len(streams)} luồng camera với {args.workers} worker (Ctrl+C để dừng)")
+    try:
+        while not server.all_ended():
+            time.sleep(METRICS_EVERY_S)
+            server.print_metrics()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        server.print_metrics()
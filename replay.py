@@ -0,0 +1,295 @@
+import os
+import csv
+import time
+import queue
+import argparse
+import threading
+from datetime import datetime, timedelta
+import cv2
+from pipeline import BoundedQueue, BLOCK
+
+# ===============================
+# ⚙️ Cấu hình chạy lại video / thư mục ảnh (không GUI, không camera)
+# ===============================
+REPLAY_QUEUE_SIZE = 8       # số frame giải mã sẵn; luồng đọc chờ khi hàng đợi đầy (không bỏ frame)
+IMAGE_FPS = 1.0             # thư mục ảnh: coi như mỗi ảnh cách nhau 1/IMAGE_FPS giây (seek + mốc thời gian)
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+CONFIRM_GAP_SECONDS = 2.0   # như confirm(): các lần nhận ra cách nhau < 2 giây (theo thời gian trong video)
+EVENT_COLUMNS = ("Name", "Offset", "Date", "Time")
+
+
+def parse_offset(text):
+    # "90", "1:30", "00:01:30" hoặc "90.5" → số giây
+    if text is None:
+        return None
+    seconds = 0.0
+    for part in str(text).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_offset(seconds):
+    seconds = int(seconds)
+    return "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+# ===============================
+# 🎞️ Luồng giải mã nền: video hoặc thư mục ảnh → (chỉ số frame, giây, frame BGR)
+# ===============================
+class FrameReader(threading.Thread):
+    def __init__(self, source, start=0.0, end=None, stride=1, limit=None, image_fps=IMAGE_FPS,
+                 queue_size=REPLAY_QUEUE_SIZE):
+        super().__init__(daemon=True)
+        self.source = source
+        self.start_sec = start or 0.0
+        self.end_sec = end
+        self.stride = max(1, int(stride))
+        self.limit = limit
+        self.queue = BoundedQueue(queue_size, BLOCK)
+        self.stopped = threading.Event()
+        self.decoded = 0
+        self.grabbed = 0        # frame bỏ qua do stride: chỉ grab, không giải mã
+        self.decode_s = 0.0
+        self.error = None
+
+        # Mở nguồn ngay ở luồng gọi để biết fps / thời lượng trước khi chạy
+        self.cap, self.files = None, None
+        if os.path.isdir(source):
+            self.files = [os.path.join(source, f) for f in sorted(os.listdir(source))
+                          if f.lower().endswith(IMAGE_EXTS)]
+            self.fps = image_fps
+            self.n_frames = len(self.files)
+        else:
+            self.cap = cv2.VideoCapture(source)
+            if not self.cap.isOpened():
+                raise ValueError(f"Không mở được video: {source}")
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+            self.n_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.duration = self.n_frames / self.fps if self.n_frames > 0 else None
+
+    def run(self):
+        try:
+            if self.files is not None:
+                self._read_images()
+            else:
+                self._read_video()
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.cap is not None:
+                self.cap.release()
+            self._put(None)
+
+    def _put(self, item):
+        # Hàng đợi BLOCK: chờ chỗ trống nhưng vẫn thoát được khi stop()
+        while not self.stopped.is_set():
+            try:
+                return self.queue.put(item, timeout=0.2)
+            except queue.Full:
+                continue
+        return False
+
+    def _done(self, emitted, t):
+        return self.stopped.is_set() or (self.limit and emitted >= self.limit) \
+            or (self.end_sec is not None and t > self.end_sec)
+
+    def _read_images(self):
+        emitted = 0
+        for idx in range(int(round(self.start_sec * self.fps)), len(self.files), self.stride):
+            t = idx / self.fps
+            if self._done(emitted, t):
+                break
+            t0 = time.perf_counter()
+            frame = cv2.imread(self.files[idx])
+            self.decode_s += time.perf_counter() - t0
+            if frame is None:
+                print(f"⚠️ Bỏ qua ảnh không đọc được: {self.files[idx]}")
+                continue
+            self.decoded += 1
+            self._put((idx, t, frame))
+            emitted += 1
+
+    def _read_video(self):
+        if self.start_sec:
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, self.start_sec * 1000)
+        idx = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        first, emitted = idx, 0
+        while True:
+            t = idx / self.fps
+            if self._done(emitted, t):
+                break
+            t0 = time.perf_counter()
+            if (idx - first) % self.stride:
+                # Frame bị stride bỏ qua: grab() chỉ đọc gói dữ liệu, không giải mã ảnh
+                ok, frame = self.cap.grab(), None
+                self.grabbed += ok
+            else:
+                ok, frame = self.cap.read()
+            self.decode_s += time.perf_counter() - t0
+            if not ok:
+                break
+            if frame is not None:
+                self.decoded += 1
+                self._put((idx, t, frame))
+                emitted += 1
+            idx += 1
+
+    def frames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ===============================
+# 📼 Chạy lại toàn bộ pipeline nhận diện trên bản ghi, ghi mọi danh tính đã xác nhận
+# ===============================
+class Replay:
+    def __init__(self, source, start=0.0, end=None, stride=1, limit=None, subject=None,
+                 recorded_at=None, write_store=True, image_fps=IMAGE_FPS):
+        self.reader = FrameReader(source, start, end, stride, limit, image_fps)
+        self.subject = subject
+        self.write_store = write_store
+        self.recorded_at = recorded_at or self._default_recorded_at(source)
+        # Ảnh cách nhau xa (stride lớn) vẫn phải xác nhận được qua nhiều frame liên tiếp
+        self.confirm_gap = max(CONFIRM_GAP_SECONDS, 1.5 * self.reader.stride / self.reader.fps)
+        self.frame_confirm = {}
+        self.last_logged = {}
+        self.events = []
+        self.frames = 0
+        self.wait_s = 0.0
+        self.last_t = self.first_t = None
+
+    def _default_recorded_at(self, source):
+        # Video: thời điểm sửa file ≈ lúc quay xong → trừ thời lượng; thư mục: ảnh đầu tiên
+        if self.reader.files:
+            return datetime.fromtimestamp(os.path.getmtime(self.reader.files[0]))
+        end = datetime.fromtimestamp(os.path.getmtime(source))
+        return end - timedelta(seconds=self.reader.duration or 0)
+
+    def confirmed(self, r, t):
+        if "track_id" in r:
+            return r["fresh"] and r["votes"] >= self.fra.FRAMES_REQUIRED
+        # Như confirm() nhưng theo thời gian trong video thay vì đồng hồ thật
+        count, last_t = self.frame_confirm.get(r["name"], (0, None))
+        count = count + 1 if last_t is not None and t - last_t < self.confirm_gap else 1
+        self.frame_confirm[r["name"]] = (count, t)
+        return count >= self.fra.FRAMES_REQUIRED
+
+    def log(self, name, t):
+        # Mỗi người ghi tối đa một lần trong DELAY_SECONDS (thời gian video)
+        last = self.last_logged.get(name)
+        if last is not None and t - last < self.fra.DELAY_SECONDS:
+            return
+        self.last_logged[name] = t
+        stamp = self.recorded_at + timedelta(seconds=t)
+        date, clock = stamp.strftime("%Y-%m-%d"), stamp.strftime("%H:%M:%S")
+        if self.write_store:
+            with self.fra.metrics.stage("store"):
+                self.store.add(name, subject=self.subject, date=date, time=clock)
+            self.fra.metrics.count("attendance_writes")
+        self.events.append((name, format_offset(t), date, clock))
+        print(f"✅ [{format_offset(t)}] {name} ({date} {clock})")
+
+    def run(self):
+        import face_recognition_attendance as fra
+        from face_tracker import FaceTracker
+        from attendance_store import get_store
+
+        self.fra = fra
+        fra.load_models()
+        self.store = get_store() if self.write_store else None
+        fra.tracker = FaceTracker(fra.DETECT_EVERY, fra.FRAMES_REQUIRED, fra.USE_CV_TRACKER) \
+            if fra.USE_TRACKER else None
+
+        total = self.reader.n_frames // self.reader.stride if self.reader.n_frames > 0 else "?"
+        print(f"📼 Chạy lại {self.reader.source}: {self.reader.fps:.1f} fps, ~{total} frame cần xử lý "
+              f"(stride {self.reader.stride}), bắt đầu lúc {self.recorded_at:%Y-%m-%d %H:%M:%S}")
+        self.reader.start()
+        t0 = time.perf_counter()
+        try:
+            frames = self.reader.frames()
+            while True:
+                tw = time.perf_counter()
+                item = next(frames, None)
+                self.wait_s += time.perf_counter() - tw
+                if item is None:
+                    break
+                _, t, frame = item
+                if self.first_t is None:
+                    self.first_t = t
+                self.last_t = t
+                for r in fra.process_frame(frame):
+                    if r["recognized"] and self.confirmed(r, t):
+                        self.log(r["name"], t)
+                self.frames += 1
+        except KeyboardInterrupt:
+            print("⏹️ Dừng theo yêu cầu.")
+        finally:
+            self.reader.stop()
+            if self.store is not None:
+                self.store.flush()
+            self.wall_s = time.perf_counter() - t0
+        return self.events
+
+    def print_summary(self):
+        wall = max(self.wall_s, 1e-9)
+        covered = (self.last_t - self.first_t + self.reader.stride / self.reader.fps) if self.frames else 0.0
+        print(f"📊 {self.frames} frame trong {wall:.1f} s → {self.frames / wall:.1f} frame/s, "
+              f"{covered / wall:.1f}× thời gian thực ({format_offset(covered)} video)")
+        print(f"   Giải mã: {self.reader.decoded} frame, bỏ qua {self.reader.grabbed} (stride), "
+              f"{self.reader.decode_s:.1f} s ở luồng nền; luồng nhận diện chờ frame {self.wait_s:.1f} s")
+        print(f"   Điểm danh: {len(self.events)} lượt, {len({e[0] for e in self.events})} người")
+        fra = self.fra
+        if fra.metrics.enabled:
+            fra.metrics.close()
+            fra.metrics.print_summary()
+        if fra.quality_gate is not None:
+            qs = fra.quality_gate.stats()
+            if qs["total"]:
+                print(f"🚦 Cổng chất lượng: loại {qs['reject_ratio']:.0%} ({qs['total'] - qs['passed']}/{qs['total']})")
+        if fra.recognition_cache is not None:
+            cs = fra.recognition_cache.stats()
+            print(f"🧊 Cache nhận diện: hit {cs['hit_rate']:.0%} ({cs['hits']}/{cs['hits'] + cs['misses']})")
+
+    def export(self, dest):
+        with open(dest, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(EVENT_COLUMNS)
+            writer.writerows(self.events)
+        print(f"✅ Đã ghi {len(self.events)} lượt điểm danh ra {dest}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Điểm danh từ video đã quay hoặc thư mục ảnh (không GUI)")
+    parser.add_argument("source", help="File video hoặc thư mục ảnh (sắp xếp theo tên)")
+    parser.add_argument("--start", default=None, help="Bắt đầu từ giây / mm:ss / hh:mm:ss")
+    parser.add_argument("--end", default=None, help="Dừng tại giây / mm:ss / hh:mm:ss")
+    parser.add_argument("--stride", type=int, default=1, help="Chỉ xử lý 1 trong N frame")
+    parser.add_argument("--limit", type=int, default=None, help="Số frame xử lý tối đa")
+    parser.add_argument("--image-fps", type=float, default=IMAGE_FPS,
+                        help="Thư mục ảnh: số ảnh mỗi giây (dùng cho --start/--end và mốc thời gian)")
+    parser.add_argument("--subject", default=None, help="Ghi kèm tên môn vào kho điểm danh")
+    parser.add_argument("--recorded-at", default=None,
+                        help="Thời điểm bắt đầu quay 'YYYY-MM-DD HH:MM[:SS]' (mặc định theo thời gian sửa file)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả, không ghi vào kho điểm danh")
+    parser.add_argument("--out", help="Ghi các lượt điểm danh ra file CSV")
+    args = parser.parse_args()
+
+    recorded_at = None
+    if args.recorded_at:
+        fmt = "%Y-%m-%d %H:%M:%S" if args.recorded_at.count(":") == 2 else "%Y-%m-%d %H:%M"
+        recorded_at = datetime.strptime(args.recorded_at, fmt)
+
+    replay = Replay(args.source, parse_offset(args.start), parse_offset(args.end), args.stride, args.limit,
+                    args.subject, recorded_at, not args.dry_run, args.image_fps)
+    replay.run()
+    replay.print_summary()
+    if args.out:
+        replay.export(args.out)
@@ -0,0 +1,263 @@
+import os
+import csv
+import json
+import argparse
+import threading
+from datetime import datetime
+
+# ===============================
+# ⚙️ Cấu hình buổi học
+# ===============================
+SESSION_PATH = "session.json"
+TIME_FORMATS = ("%H:%M", "%H:%M:%S")
+
+# Trạng thái buổi học / kết quả điểm danh
+OPEN = "open"
+CHECKED_IN = "checked_in"
+DUPLICATE = "duplicate"
+NOT_OPEN = "not_open"
+NOT_STARTED = "not_started"
+ENDED = "ended"
+NOT_IN_ROSTER = "not_in_roster"
+
+
+def parse_time(text):
+    # "7:30", "07:30" hoặc "07:30:00" → datetime.time
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(str(text).strip(), fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Giờ không hợp lệ: '{text}' (định dạng HH:MM)")
+
+
+def read_roster_file(path):
+    # Danh sách lớp từ file: CSV có cột "Name" hoặc mỗi dòng một tên (bỏ dòng trống / bắt đầu bằng #)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    if lines and "Name" in next(csv.reader(lines[:1])):
+        return [r["Name"].strip() for r in csv.DictReader(lines) if (r.get("Name") or "").strip()]
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+# ===============================
+# 🏫 Một buổi học đang mở
+# ===============================
+class Session:
+    def __init__(self, subject, start, end, date, roster):
+        self.subject = subject
+        self.start = start
+        self.end = end
+        self.date = date
+        self.roster = frozenset(roster)
+        self.checked_in = set()
+
+    def status(self, now=None):
+        now = now or datetime.now()
+        if now.strftime("%Y-%m-%d") != self.date:
+            return ENDED
+        t = now.time()
+        if t < self.start:
+            return NOT_STARTED
+        if t > self.end:
+            return ENDED
+        return OPEN
+
+    def to_json(self):
+        return {"start": self.start.strftime("%H:%M"), "end": self.end.strftime("%H:%M"), "date": self.date}
+
+
+# ===============================
+# 🧭 Quản lý nhiều buổi học cùng lúc + danh sách lớp trong bộ nhớ
+# ===============================
+class SessionEngine:
+    def __init__(self, path=SESSION_PATH, students=(), store=None, on_roster_change=None, clock=datetime.now):
+        self.path = path
+        self.clock = clock
+        self.students = list(students)
+        self.store = store
+        self.on_roster_change = on_roster_change
+        self.lock = threading.RLock()
+        self.sessions = {}
+        self.rosters = {}
+        self.history = {}       # môn → {ngày: giờ bắt đầu}, dùng để tính đi muộn trong báo cáo
+        self.legacy = {}
+        self.load()
+
+    def _get_store(self):
+        if self.store is None:
+            from attendance_store import get_store
+            self.store = get_store()
+        return self.store
+
+    # ====== Danh sách lớp ======
+    def roster(self, subject):
+        # Môn chưa khai báo danh sách → mọi sinh viên đã đăng ký khuôn mặt
+        return self.rosters.get(subject, self.students)
+
+    def set_roster(self, subject, names):
+        with self.lock:
+            self.rosters[subject] = sorted(set(names))
+            if subject in self.sessions:
+                self.sessions[subject].roster = frozenset(self.rosters[subject])
+            self.save()
+        self._roster_changed()
+
+    def clear_roster(self, subject):
+        # Bỏ danh sách riêng → môn quay về dùng mọi sinh viên đã đăng ký
+        with self.lock:
+            self.rosters.pop(subject, None)
+            if subject in self.sessions:
+                self.sessions[subject].roster = frozenset(self.students)
+            self.save()
+        self._roster_changed()
+
+    def import_roster(self, subject, path):
+        # → danh sách tên trong file không có trong danh sách sinh viên đã đăng ký khuôn mặt
+        names = read_roster_file(path)
+        self.set_roster(subject, names)
+        return sorted(set(names) - set(self.students)) if self.students else []
+
+    def active_names(self, now=None):
+        # Hợp các danh sách lớp của những buổi học đang trong giờ; chưa buổi nào tới giờ → các buổi
+        # sắp bắt đầu hôm nay; không còn buổi nào → None (không giới hạn, can_check_in đã chặn)
+        with self.lock:
+            status = {subject: s.status(now) for subject, s in self.sessions.items()}
+            for wanted in (OPEN, NOT_STARTED):
+                chosen = [self.sessions[subject] for subject, st in status.items() if st == wanted]
+                if chosen:
+                    return frozenset().union(*(s.roster for s in chosen))
+            return None
+
+    def _roster_changed(self, now=None):
+        if self.on_roster_change is not None:
+            self.on_roster_change(self.active_names(now or self.clock()))
+
+    # ====== Mở / đóng buổi học ======
+    def open(self, subject, start, end, now=None):
+        start_t, end_t = parse_time(start), parse_time(end)
+        if end_t <= start_t:
+            raise ValueError(f"Giờ kết thúc ({end}) phải sau giờ bắt đầu ({start})")
+        now = now or datetime.now()
+        date = now.strftime("%Y-%m-%d")
+        session = Session(subject, start_t, end_t, date, self.roster(subject))
+        # Nạp những người đã điểm danh hôm nay một lần khi mở, sau đó kiểm tra trùng chỉ trong bộ nhớ
+        session.checked_in = {row[0] for row in self._get_store().query(subject=subject, date=date)}
+        with self.lock:
+            self.sessions[subject] = session
+            self.history.setdefault(subject, {})[date] = session.to_json()["start"]
+            self.legacy = {"start_time": session.to_json()["start"], "end_time": session.to_json()["end"]}
+            self.save()
+        self._roster_changed(now)
+        return session
+
+    def close(self, subject):
+        with self.lock:
+            removed = self.sessions.pop(subject, None)
+            self.save()
+        self._roster_changed()
+        return removed is not None
+
+    def forget(self, subject):
+        # Sau khi xóa lịch sử điểm danh: cho phép điểm danh lại
+        with self.lock:
+            if subject in self.sessions:
+                self.sessions[subject].checked_in.clear()
+
+    def get(self, subject):
+        return self.sessions.get(subject)
+
+    def open_sessions(self, now=None):
+        with self.lock:
+            return [s for s in self.sessions.values() if s.status(now) == OPEN]
+
+    # ====== Điểm danh ======
+    def can_check_in(self, subject, name, now=None):
+        # Kiểm tra trước khi bật camera: O(1), không đọc file
+        with self.lock:
+            session = self.sessions.get(subject)
+            if session is None:
+                return NOT_OPEN
+            status = session.status(now)
+            if status != OPEN:
+                return status
+            if name in session.checked_in:
+                return DUPLICATE
+            if name not in session.roster:
+                return NOT_IN_ROSTER
+            return OPEN
+
+    def check_in(self, subject, name, student_id=None, now=None):
+        now = now or datetime.now()
+        with self.lock:
+            status = self.can_check_in(subject, name, now)
+            if status != OPEN:
+                return status
+            self.sessions[subject].checked_in.add(name)
+        self._get_store().add(name, student_id, subject, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"))
+        return CHECKED_IN
+
+    # ====== Lưu / đọc session.json (ghi nguyên tử) ======
+    def save(self):
+        with self.lock:
+            data = dict(self.legacy)
+            data["sessions"] = {s: session.to_json() for s, session in self.sessions.items()}
+            data["rosters"] = self.rosters
+            data["history"] = self.history
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    def load(self, now=None):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print("⚠️ Không đọc được file buổi học:", e)
+            return
+        # File cũ chỉ có {"start_time", "end_time"} → giữ nguyên các khóa này khi ghi lại
+        self.legacy = {k: data[k] for k in ("start_time", "end_time") if k in data}
+        self.rosters = {s: list(names) for s, names in data.get("rosters", {}).items()}
+        self.history = {s: dict(days) for s, days in data.get("history", {}).items()}
+        today = (now or self.clock()).strftime("%Y-%m-%d")
+        for subject, info in data.get("sessions", {}).items():
+            if info.get("date") != today:
+                continue
+            try:
+                self.open(subject, info["start"], info["end"], now)
+            except (KeyError, ValueError) as e:
+                print(f"⚠️ Bỏ qua buổi học '{subject}' trong {self.path}:", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quản lý danh sách lớp theo môn (lưu trong session.json)")
+    parser.add_argument("subject", nargs="?", help="Tên môn học (bỏ trống → liệt kê các môn có danh sách riêng)")
+    parser.add_argument("--file", help="Nhập danh sách từ file CSV (cột Name) hoặc TXT (mỗi dòng một tên)")
+    parser.add_argument("--set", nargs="+", metavar="NAME", help="Đặt danh sách lớp bằng các tên cho trước")
+    parser.add_argument("--clear", action="store_true", help="Xóa danh sách riêng, dùng mọi sinh viên")
+    parser.add_argument("--path", default=SESSION_PATH)
+    args = parser.parse_args()
+
+    from student_manifest import load_student_names
+
+    engine = SessionEngine(args.path, load_student_names())
+    if not args.subject:
+        for subject, names in sorted(engine.rosters.items()):
+            print(f"📋 {subject}: {len(names)} sinh viên")
+    elif args.clear:
+        engine.clear_roster(args.subject)
+        print(f"✅ Môn '{args.subject}' dùng lại toàn bộ {len(engine.students)} sinh viên")
+    elif args.file or args.set:
+        if args.file:
+            unknown = engine.import_roster(args.subject, args.file)
+        else:
+            engine.set_roster(args.subject, args.set)
+            unknown = sorted(set(args.set) - set(engine.students)) if engine.students else []
+        print(f"✅ Đã lưu danh sách lớp '{args.subject}': {len(engine.roster(args.subject))} sinh viên")
+        if unknown:
+            print(f"⚠️ Chưa đăng ký khuôn mặt: {', '.join(unknown)}")
+    else:
+        print("\n".join(engine.roster(args.subject)) or "(trống)")
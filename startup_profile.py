@@ -0,0 +1,38 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# ===============================
+# ⏱️ Đo thời gian khởi động (import / tải mô hình / hiện cửa sổ)
+# ===============================
+T_START = time.perf_counter()
+timings = []
+_lock = threading.Lock()
+
+
+def record(label, seconds):
+    with _lock:
+        timings.append((label, seconds))
+
+
+@contextmanager
+def timed(label):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, time.perf_counter() - t0)
+
+
+def mark(label):
+    # Mốc thời gian tính từ lúc tiến trình bắt đầu import module này
+    record(f"@ {label}", time.perf_counter() - T_START)
+
+
+def report():
+    with _lock:
+        rows = list(timings)
+    print("⏱️ Thời gian khởi động:")
+    for label, seconds in rows:
+        print(f"   {label:<40} {seconds * 1000:9.1f} ms")
+    return rows
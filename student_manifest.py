@@ -0,0 +1,49 @@
+import os
+import json
+
+# ===============================
+# 📂 Danh sách sinh viên dựng sẵn (không cần mở file embeddings)
+# ===============================
+MODEL_DIR = "face_models_facenet"
+EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+MANIFEST_PATH = os.path.join(MODEL_DIR, "students.json")
+
+
+def build_manifest(npz_path=EMBEDDINGS_NPZ, manifest_path=MANIFEST_PATH):
+    import numpy as np
+
+    # Chỉ đọc mảng labels, không nạp ma trận embeddings
+    with np.load(npz_path, allow_pickle=True) as npz:
+        names, counts = np.unique(npz["labels"], return_counts=True)
+    manifest = {
+        "source": os.path.basename(npz_path),
+        "source_mtime": os.path.getmtime(npz_path),
+        "students": {str(n): int(c) for n, c in zip(names, counts)},
+    }
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def load_manifest(npz_path=EMBEDDINGS_NPZ, manifest_path=MANIFEST_PATH):
+    # Dựng lại khi chưa có manifest hoặc file embeddings mới hơn
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not os.path.exists(npz_path) or manifest.get("source_mtime") == os.path.getmtime(npz_path):
+            return manifest
+    if not os.path.exists(npz_path):
+        return None
+    return build_manifest(npz_path, manifest_path)
+
+
+def load_student_names(npz_path=EMBEDDINGS_NPZ, manifest_path=MANIFEST_PATH):
+    manifest = load_manifest(npz_path, manifest_path)
+    return sorted(manifest["students"]) if manifest else []
+
+
+if __name__ == "__main__":
+    m = build_manifest()
+    print(f"✅ Đã ghi {MANIFEST_PATH}: {len(m['students'])} sinh viên")
@@ -0,0 +1,255 @@
+import os
+import time
+import pickle
+import argparse
+import numpy as np
+
+# ===============================
+# ⚙️ Đầu phân loại SVM tuyến tính chạy bằng NumPy
+# ===============================
+# Tái hiện đúng SVC(kernel="linear", probability=True) của libsvm:
+#   1) giá trị quyết định one-vs-one: X @ W.T + b (một phép nhân ma trận cho cả batch)
+#   2) xác suất từng cặp qua sigmoid Platt (probA_, probB_)
+#   3) ghép cặp → xác suất lớp bằng phương pháp lặp của libsvm (multiclass_probability)
+MODEL_DIR = "face_models_facenet"
+SVM_PATH = os.path.join(MODEL_DIR, "svm_facenet.pkl")
+LABEL_ENCODER_PATH = os.path.join(MODEL_DIR, "label_encoder_facenet.pkl")
+EMBEDDINGS_NPZ = os.path.join(MODEL_DIR, "faces_embeddings_facenet.npz")
+SVM_HEAD_PATH = os.path.join(MODEL_DIR, "svm_head_facenet.npz")
+
+MIN_PROB = 1e-7             # như libsvm: kẹp xác suất từng cặp vào [1e-7, 1 - 1e-7]
+SMALL_BATCH = 16            # batch nhỏ (vài khuôn mặt / frame) → ghép cặp bằng số thực Python, tránh overhead NumPy
+
+
+class SVMHead:
+    def __init__(self, W, b, prob_a, prob_b, names):
+        self.W = np.ascontiguousarray(W, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.prob_a = np.asarray(prob_a, dtype=np.float64)
+        self.prob_b = np.asarray(prob_b, dtype=np.float64)
+        self.names = np.asarray(names)
+        k = len(self.names)
+        # Cặp lớp theo thứ tự của libsvm: (0,1), (0,2), ..., (1,2), ...
+        self.pairs = np.array([(i, j) for i in range(k) for j in range(i + 1, k)], dtype=np.int64).reshape(-1, 2)
+        if len(self.pairs) != len(self.W):
+            raise ValueError(f"Số cặp one-vs-one ({len(self.W)}) không khớp với {k} lớp")
+
+    @classmethod
+    def from_sklearn(cls, svm, label_encoder=None):
+        if getattr(svm, "kernel", None) != "linear":
+            raise ValueError(f"Chỉ hỗ trợ SVC kernel tuyến tính (đang là {getattr(svm, 'kernel', '?')})")
+        if not getattr(svm, "probability", False):
+            raise ValueError("SVC chưa được huấn luyện với probability=True")
+        if len(svm.classes_) < 3:
+            # Trường hợp 2 lớp sklearn đảo dấu coef_/intercept_ — không dùng cho bài toán điểm danh
+            raise ValueError("Cần ít nhất 3 lớp")
+        names = svm.classes_ if label_encoder is None else label_encoder.classes_[svm.classes_]
+        return cls(svm.coef_, svm.intercept_, svm.probA_, svm.probB_, names)
+
+    @classmethod
+    def load(cls, path=SVM_HEAD_PATH):
+        data = np.load(path, allow_pickle=False)
+        return cls(data["W"], data["b"], data["prob_a"], data["prob_b"], data["names"])
+
+    def save(self, path=SVM_HEAD_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, W=self.W, b=self.b, prob_a=self.prob_a, prob_b=self.prob_b,
+                 names=self.names.astype(str))
+        os.replace(tmp, path)
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.W.T + self.b
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        n, k = len(X), len(self.names)
+        if n == 0:
+            return np.zeros((0, k))
+        f = self.decision_function(X) * self.prob_a + self.prob_b
+        # sigmoid ổn định số như sigmoid_predict của libsvm: 1 / (1 + exp(f))
+        pair_p = np.where(f >= 0, np.exp(-np.abs(f)) / (1.0 + np.exp(-np.abs(f))),
+                          1.0 / (1.0 + np.exp(-np.abs(f))))
+        pair_p = np.clip(pair_p, MIN_PROB, 1 - MIN_PROB)
+
+        r = np.zeros((n, k, k))
+        i, j = self.pairs[:, 0], self.pairs[:, 1]
+        r[:, i, j] = pair_p
+        r[:, j, i] = 1 - pair_p
+        if n <= SMALL_BATCH:
+            return np.array([_couple_one(row.tolist()) for row in r])
+        return _couple(r)
+
+    def predict(self, X, mask=None):
+        # → (chỉ số lớp, tên lớp, xác suất lớn nhất, toàn bộ xác suất)
+        # mask (k,) bool: chỉ chọn trong các lớp được phép (vd: danh sách lớp), xác suất giữ nguyên
+        probs = self.predict_proba(X)
+        idx = np.argmax(probs if mask is None else np.where(mask, probs, -1.0), axis=1)
+        return idx, self.names[idx], probs[np.arange(len(idx)), idx], probs
+
+
+def _couple_one(r):
+    # multiclass_probability của libsvm cho một mẫu (r: list k × k)
+    k = len(r)
+    Q = [[0.0] * k for _ in range(k)]
+    for t in range(k):
+        for j in range(k):
+            if j != t:
+                Q[t][t] += r[j][t] * r[j][t]
+                Q[t][j] = -r[j][t] * r[t][j]
+    p = [1.0 / k] * k
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = [sum(Q[t][j] * p[j] for j in range(k)) for t in range(k)]
+        pQp = sum(p[t] * Qp[t] for t in range(k))
+        if max(abs(Qp[t] - pQp) for t in range(k)) < eps:
+            break
+        for t in range(k):
+            diff = (-Qp[t] + pQp) / Q[t][t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t][t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(k):
+                Qp[j] = (Qp[j] + diff * Q[t][j]) / (1 + diff)
+                p[j] /= (1 + diff)
+    return p
+
+
+def _couple(r):
+    # multiclass_probability của libsvm, vector hóa theo batch; mỗi mẫu dừng riêng khi hội tụ
+    n, k, _ = r.shape
+    Q = -r.transpose(0, 2, 1) * r                           # Q[t, j] = -r[j, t] * r[t, j]
+    diag = np.einsum("njt,njt->nt", r, r) - np.einsum("ntt,ntt->nt", r, r)
+    Q[:, np.arange(k), np.arange(k)] = diag                 # Q[t, t] = Σ_{j≠t} r[j, t]²
+    p = np.full((n, k), 1.0 / k)
+    eps = 0.005 / k
+    active = np.ones(n, dtype=bool)
+    for _ in range(max(100, k)):
+        Qa, pa = Q[active], p[active]
+        Qp = np.einsum("ntj,nj->nt", Qa, pa)
+        pQp = np.einsum("nt,nt->n", pa, Qp)
+        done = np.max(np.abs(Qp - pQp[:, None]), axis=1) < eps
+        idx = np.flatnonzero(active)
+        active[idx[done]] = False
+        if not np.any(active):
+            break
+        keep = ~done
+        Qa, pa, Qp, pQp = Qa[keep], pa[keep], Qp[keep], pQp[keep]
+        for t in range(k):
+            qtt = Qa[:, t, t]
+            diff = (-Qp[:, t] + pQp) / qtt
+            pa[:, t] += diff
+            pQp = (pQp + diff * (diff * qtt + 2 * Qp[:, t])) / (1 + diff) / (1 + diff)
+            Qp = (Qp + diff[:, None] * Qa[:, t, :]) / (1 + diff)[:, None]
+            pa /= (1 + diff)[:, None]
+        p[active] = pa
+    return p
+
+
+def load_or_export(path=SVM_HEAD_PATH, svm_path=SVM_PATH, encoder_path=LABEL_ENCODER_PATH):
+    # Dùng file .npz đã xuất nếu mới hơn pickle SVM; nếu không thì xuất lại (cần sklearn)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(svm_path) \
+            and os.path.getmtime(path) >= os.path.getmtime(encoder_path):
+        try:
+            return SVMHead.load(path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Không đọc được {path}, xuất lại từ SVM:", e)
+    with open(svm_path, "rb") as f:
+        svm = pickle.load(f)
+    with open(encoder_path, "rb") as f:
+        encoder = pickle.load(f)
+    head = SVMHead.from_sklearn(svm, encoder)
+    try:
+        head.save(path)
+    except OSError as e:
+        # Thư mục mô hình chỉ đọc (cài đặt hệ thống...) → vẫn dùng head trong bộ nhớ, lần sau xuất lại
+        print(f"⚠️ Không ghi được {path}, dùng SVMHead trong bộ nhớ (không cache):", e)
+    return head
+
+
+# ===============================
+# ✅ So sánh với sklearn + đo tốc độ
+# ===============================
+def probe_queries(X, n=2000, seed=0):
+    # Embeddings thật + trộn giữa hai người + nhiễu → phủ cả vùng gần ngưỡng quyết định
+    rng = np.random.default_rng(seed)
+    a, b = rng.integers(0, len(X), (2, n))
+    w = rng.uniform(0, 1, (n, 1))
+    Q = w * X[a] + (1 - w) * X[b] + 0.05 * rng.standard_normal((n, X.shape[1]))
+    Q = np.concatenate([X, Q])
+    return (Q / np.linalg.norm(Q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def verify(npz_path=EMBEDDINGS_NPZ, svm_path=SVM_PATH, encoder_path=LABEL_ENCODER_PATH,
+           prob_thresh=0.75, sim_thresh=0.5, repeats=3):
+    from gallery_matcher import GalleryMatcher
+
+    with open(svm_path, "rb") as f:
+        svm = pickle.load(f)
+    with open(encoder_path, "rb") as f:
+        encoder = pickle.load(f)
+    head = SVMHead.from_sklearn(svm, encoder)
+    gallery = GalleryMatcher.from_npz(npz_path)
+    Q = probe_queries(np.load(npz_path, allow_pickle=True)["embeddings"])
+    sims = gallery.mean_sims(Q)
+
+    def decide(names, probs):
+        class_idx = np.array([gallery.name_to_index[n] for n in names])
+        avg = sims[np.arange(len(Q)), class_idx]
+        return (probs >= prob_thresh) & (avg >= sim_thresh)
+
+    # Cách cũ: predict_proba + inverse_transform từng khuôn mặt
+    ref_probs = np.stack([svm.predict_proba([q])[0] for q in Q])
+    ref_names = np.array([encoder.inverse_transform([i])[0] for i in np.argmax(ref_probs, axis=1)])
+    _, names, best, probs = head.predict(Q)
+
+    prob_diff = float(np.max(np.abs(probs - ref_probs)))
+    same_name = float(np.mean(names == ref_names))
+    same_decision = float(np.mean(decide(names, best) == decide(ref_names, ref_probs.max(axis=1))))
+    print(f"   {len(Q)} truy vấn: lệch xác suất tối đa {prob_diff:.2e}, "
+          f"trùng tên {same_name:.2%}, trùng quyết định {same_decision:.2%}")
+
+    def bench(fn):
+        best_t = np.inf
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            fn()
+            best_t = min(best_t, time.perf_counter() - t0)
+        return best_t * 1000 / len(Q)
+
+    old_ms = bench(lambda: [encoder.inverse_transform([np.argmax(svm.predict_proba([q])[0])]) for q in Q])
+    batch_ms = bench(lambda: svm.predict_proba(Q))
+    head_ms = bench(lambda: head.predict(Q))
+    one_ms = bench(lambda: [head.predict(q) for q in Q])
+    print(f"   sklearn từng khuôn mặt : {old_ms * 1000:8.1f} µs/mặt")
+    print(f"   sklearn cả batch       : {batch_ms * 1000:8.1f} µs/mặt")
+    print(f"   SVMHead từng khuôn mặt : {one_ms * 1000:8.1f} µs/mặt")
+    print(f"   SVMHead cả batch       : {head_ms * 1000:8.1f} µs/mặt")
+    # Lợi thế chủ yếu so với gọi sklearn từng khuôn mặt (đường cũ); so với predict_proba cả batch
+    # thì gần như ngang nhau — lợi ích còn lại là không cần unpickle sklearn khi khởi động
+    print(f"   → so với sklearn từng mặt: x{old_ms / head_ms:.0f}, so với sklearn cả batch: "
+          f"x{batch_ms / head_ms:.2f}, gọi lẻ so với gọi lẻ: x{old_ms / one_ms:.1f}")
+    return {"prob_diff": prob_diff, "same_name": same_name, "same_decision": same_decision,
+            "speedup": old_ms / head_ms, "speedup_vs_batch": batch_ms / head_ms,
+            "speedup_single": old_ms / one_ms}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất SVM tuyến tính sang NumPy và kiểm tra tương đương")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="Ghi trọng số SVM ra svm_head_facenet.npz")
+    e.add_argument("--out", default=SVM_HEAD_PATH)
+    sub.add_parser("verify", help="So sánh xác suất / quyết định với sklearn và đo tốc độ")
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        with open(SVM_PATH, "rb") as f:
+            svm = pickle.load(f)
+        with open(LABEL_ENCODER_PATH, "rb") as f:
+            encoder = pickle.load(f)
+        SVMHead.from_sklearn(svm, encoder).save(args.out)
+        print(f"✅ Đã ghi {args.out}")
+    else:
+        r = verify()
+        if r["same_decision"] < 1.0:
+            raise SystemExit("❌ Quyết định khác với sklearn")
@@ -0,0 +1,50 @@
+import numpy as np
+
+from ann_index import IVFIndex, synthetic_gallery
+
+
+def loop_search(index, queries, k, n_probe):
+    # Tham chiếu: probe từng truy vấn một
+    coarse = queries @ index.centroids.T
+    probes = np.argsort(-coarse, axis=1)[:, :n_probe]
+    out = []
+    for q, lists in zip(queries, probes):
+        cand = np.concatenate([np.arange(index.offsets[c], index.offsets[c + 1]) for c in lists])
+        scores = index.matrix[cand] @ q
+        out.append(set(cand[np.argsort(-scores)[:k]]))
+    return out
+
+
+def test_vectorised_search_matches_per_query_probe():
+    X, y = synthetic_gallery(60, 10, dim=32)
+    index = IVFIndex.build(X, y)
+    rng = np.random.default_rng(3)
+    queries = X[rng.choice(len(X), 40, replace=False)]
+
+    ids, sims = index.search(queries, k=5, n_probe=3)
+
+    assert [set(row) for row in ids] == loop_search(index, queries, 5, 3)
+    assert np.all(np.diff(sims, axis=1) <= 0)
+    assert np.allclose(sims, np.take_along_axis(queries @ index.matrix.T, ids, axis=1), atol=1e-5)
+
+
+def test_short_lists_are_padded():
+    X, y = synthetic_gallery(3, 2, dim=16)
+    index = IVFIndex.build(X, y, n_lists=3)
+
+    ids, sims = index.search(X[:2], k=6, n_probe=1)
+
+    assert np.all((ids == -1) == np.isinf(sims))
+    assert np.all(ids[:, 0] >= 0)
+
+
+def test_small_gallery_uses_exact_search():
+    X, y = synthetic_gallery(20, 5, dim=32, noise=0.3)
+    index = IVFIndex.build(X, y)
+    assert not index.use_ivf
+
+    names, _ = index.identify(X[::5])
+    assert list(names) == list(y[::5])
+
+    index.min_gallery = 0
+    assert index.use_ivf
@@ -0,0 +1,24 @@
+import numpy as np
+
+import enroll
+
+
+def test_embeddings_keep_their_origin(tmp_path):
+    path = str(tmp_path / "faces.npz")
+    X = np.zeros((3, enroll.EMBEDDING_DIM), dtype=np.float32)
+    y = np.array(["An", "An", "Binh"])
+    enroll.save_embeddings(X, y, path, origins=["", "", "v2|detector=mtcnn"])
+
+    data = np.load(path, allow_pickle=False)
+    assert list(data["labels"]) == list(y)
+    assert list(data["origins"]) == ["", "", "v2|detector=mtcnn"]
+
+
+def test_mixed_origins_are_reported(capsys):
+    labels = np.array(["An", "An", "Binh", "Chi"])
+    enroll.warn_mixed_origins(labels, np.array(["", "", "new", "new"]), "new")
+    out = capsys.readouterr().out
+    assert "2 embeddings của 1 sinh viên" in out and "An" in out
+
+    enroll.warn_mixed_origins(labels, np.full(4, "new"), "new")
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("deepface")
+
+from face_embedder import FacenetEmbedder, compare_with_deepface, EMBEDDING_ATOL
+
+
+@pytest.fixture(scope="module")
+def facenet():
+    from deepface import DeepFace
+
+    try:
+        return DeepFace.build_model("Facenet")
+    except Exception:
+        # Không tải được trọng số (máy không có mạng): cùng kiến trúc, trọng số khởi tạo ngẫu nhiên.
+        # Phép so sánh chỉ kiểm tra tiền xử lý + batch nên không phụ thuộc trọng số.
+        from deepface.basemodels import Facenet
+
+        model = Facenet.InceptionResNetV2()
+        DeepFace.build_model.__globals__.setdefault("model_obj", {})["Facenet"] = model
+        return model
+
+
+def synthetic_crops(n=8, seed=0):
+    # Crop nhiều kích thước / tỉ lệ khác nhau như box MTCNN thật
+    rng = np.random.default_rng(seed)
+    crops = []
+    for i in range(n):
+        h, w = int(rng.integers(60, 200)), int(rng.integers(50, 180))
+        crops.append(rng.integers(0, 255, (h, w, 3), dtype=np.uint8))
+    return crops
+
+
+def test_batched_matches_legacy_represent(facenet):
+    embedder = FacenetEmbedder()
+    embedder.model = facenet
+    max_diff, ok = compare_with_deepface(synthetic_crops(), embedder)
+    assert ok, f"lệch {max_diff:.2e} > EMBEDDING_ATOL {EMBEDDING_ATOL:.0e}"
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+
+from gallery_store import write_store, verify_parity, EMBEDDINGS_NPZ
+from gallery_matcher import GalleryMatcher
+
+# Sai số tối đa cho phép so với float64 trên embedding đã chuẩn hóa L2
+TOLERANCE = {"float16": 2e-3, "int8": 1e-2}
+
+
+def clustered_embeddings(n_classes=12, per_class=15, dim=128, spread=0.35, seed=0, noise_seed=None):
+    # noise_seed khác seed → ảnh mới của cùng các sinh viên (cùng tâm lớp, nhiễu khác)
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_classes, dim))
+    noise = np.random.default_rng(noise_seed) if noise_seed is not None else rng
+    X = np.repeat(centers, per_class, axis=0) + spread * noise.normal(size=(n_classes * per_class, dim))
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    labels = np.repeat([f"sv{i:02d}" for i in range(n_classes)], per_class)
+    return X, labels
+
+
+def exact_sims(X, labels, queries):
+    # Tham chiếu float64: (mean, max) độ tương đồng cosine với từng lớp, lớp xếp theo tên
+    names = np.unique(labels)
+    sims = queries @ X.T
+    mean = np.stack([sims[:, labels == n].mean(axis=1) for n in names], axis=1)
+    best = np.stack([sims[:, labels == n].max(axis=1) for n in names], axis=1)
+    return mean, best
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_store_matches_float64(tmp_path, dtype):
+    X, labels = clustered_embeddings()
+    queries, _ = clustered_embeddings(noise_seed=1)
+    queries = np.concatenate([X[::3], queries])
+    path = str(tmp_path / f"gallery.{dtype}.fgal")
+    write_store(X, labels, path, dtype)
+
+    g = GalleryMatcher.from_store(path)
+    exact_mean, exact_max = exact_sims(X, labels, queries)
+    q = queries.astype(np.float32)
+
+    # Max-similarity đọc trực tiếp ma trận float16/int8 trên đĩa
+    best = g.max_sims(q)
+    assert np.max(np.abs(best - exact_max)) < TOLERANCE[dtype]
+    assert np.array_equal(np.argmax(best, axis=1), np.argmax(exact_max, axis=1))
+
+    # Mean qua centroid của store (đường nhận diện thật sự dùng)
+    mean = g.mean_sims(q)
+    assert np.max(np.abs(mean - exact_mean)) < TOLERANCE[dtype]
+    assert np.array_equal(np.argmax(mean, axis=1), np.argmax(exact_mean, axis=1))
+
+    # Mean tính lại từ các hàng đã giải nén (không qua centroid float32)
+    sims = q @ g.store.rows(0, len(g.store)).T
+    matrix_mean = np.add.reduceat(sims, g.offsets[:-1], axis=1) / g.counts
+    assert np.max(np.abs(matrix_mean - exact_mean)) < TOLERANCE[dtype]
+    assert np.array_equal(np.argmax(matrix_mean, axis=1), np.argmax(exact_mean, axis=1))
+
+    # Top-k dùng cả hai điểm → cùng lớp đứng đầu như float64
+    names, _, _ = g.top_k(q, k=1)
+    assert np.array_equal(names[:, 0], np.unique(labels)[np.argmax(exact_mean, axis=1)])
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_rows_roundtrip(tmp_path, dtype):
+    X, labels = clustered_embeddings(n_classes=3, per_class=4)
+    path = str(tmp_path / "gallery.fgal")
+    write_store(X, labels, path, dtype)
+    g = GalleryMatcher.from_store(path)
+    ref = GalleryMatcher(X, labels)
+    assert np.max(np.abs(g.store.rows(0, len(g.store)) - ref.matrix)) < TOLERANCE[dtype]
+    assert list(g.class_names) == list(ref.class_names)
+    assert np.array_equal(g.offsets, ref.offsets)
+
+
+@pytest.mark.skipif(not os.path.exists(EMBEDDINGS_NPZ), reason="chưa có gallery đã huấn luyện")
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_verify_parity_on_shipped_gallery(tmp_path, dtype):
+    result = verify_parity(EMBEDDINGS_NPZ, dtype, str(tmp_path / "check.fgal"))
+    assert result["same_top1"]
+    assert result["max_diff"] < TOLERANCE[dtype]
+    assert result["mean_diff"] < TOLERANCE[dtype]
+    assert result["matrix_mean_diff"] < TOLERANCE[dtype]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from recognition_cache import EmbeddingCache, TTLCache, calibrate
+
+
+def clustered(n_people=6, per_person=15, dim=32, spread=0.35, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_people, dim))
+    X = np.concatenate([c + spread * rng.normal(size=(per_person, dim)) for c in centers])
+    y = np.repeat([f"p{i}" for i in range(n_people)], per_person)
+    return X / np.linalg.norm(X, axis=1, keepdims=True), y
+
+
+def test_calibrated_threshold_never_hits_another_person():
+    X, y = clustered()
+    c = calibrate(X, y, margin=0.02)
+
+    assert c["threshold"] > c["impostor_max"]
+    rate, wrong = c["replay"][c["threshold"]]
+    assert wrong == 0 and rate > 0
+
+
+def test_embedding_cache_respects_threshold():
+    X, y = clustered(n_people=2, per_person=1)
+    cache = EmbeddingCache(maxsize=4, sim_thresh=0.99, dim=X.shape[1], clock=lambda: 0.0)
+    cache.insert(X[0], {"name": y[0], "recognized": True})
+
+    assert cache.lookup(X[:1])[0]["name"] == y[0]
+    assert cache.lookup(X[1:])[0] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_cache_expires():
+    now = [0.0]
+    cache = TTLCache(ttl=5, clock=lambda: now[0])
+    cache.put("track-1", "An")
+    assert "track-1" in cache and len(cache) == 1
+    now[0] = 6.0
+    assert "track-1" not in cache
+    assert cache.get("track-1") is None and cache.stats()["misses"] == 1
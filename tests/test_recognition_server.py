@@ -0,0 +1,104 @@
+import threading
+
+import numpy as np
+import pytest
+
+import face_recognition_attendance as fra
+import recognition_server
+from recognition_server import CameraStream, RecognitionServer, RecognitionWorker, RoomSession
+
+BAD_PIXEL = 255
+
+
+class FakeDetector:
+    # Frame có pixel (0, 0) = BAD_PIXEL giả lập detector lỗi trên một camera
+    def detect_faces(self, rgb):
+        if rgb[0, 0, 0] == BAD_PIXEL:
+            raise RuntimeError("detector hỏng")
+        return [{"box": [10, 10, 40, 40]}]
+
+
+class RecordingSession(RoomSession):
+    def __init__(self, room):
+        super().__init__(room)
+        self.results = []
+
+    def on_results(self, results):
+        self.results.append(results)
+
+
+def make_worker():
+    worker = RecognitionWorker.__new__(RecognitionWorker)
+    worker.detector = FakeDetector()
+    return worker
+
+
+def make_stream(room):
+    return CameraStream(room, "unused.mp4", RecordingSession(room))
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(fra, "quality_gate", None)
+    monkeypatch.setattr(fra, "ALIGN_FACES", False)
+    monkeypatch.setattr(fra, "embed_crops", lambda crops: (list(range(len(crops))), np.ones((len(crops), 128))))
+    monkeypatch.setattr(fra, "classify_embeddings",
+                        lambda embs: [{"name": "An", "prob": 0.9, "recognized": True} for _ in embs])
+
+
+def test_one_failing_camera_keeps_the_rest_of_the_batch(fake_models):
+    good, bad = make_stream("A"), make_stream("B")
+    frame = np.zeros((80, 80, 3), dtype=np.uint8)
+    broken = frame.copy()
+    broken[0, 0] = BAD_PIXEL
+
+    make_worker().process([(good, frame, 0.0), (bad, broken, 0.0)])
+
+    assert good.session.results and good.session.results[0][0]["name"] == "An"
+    assert not bad.session.results
+    assert good.metrics.snapshot()["processed"] == 1
+    assert bad.metrics.snapshot()["errors"] == 1
+
+
+def test_classify_failure_is_isolated_per_frame(fake_models, monkeypatch):
+    a, b = make_stream("A"), make_stream("B")
+    frame_a = np.zeros((80, 80, 3), dtype=np.uint8)
+    frame_b = np.full((80, 80, 3), 7, dtype=np.uint8)
+
+    def classify(embs):
+        if len(embs) > 1:
+            raise ValueError("batch lỗi")
+        if embs[0][0] == 2:
+            raise ValueError("frame lỗi")
+        return [{"name": "An", "prob": 0.9, "recognized": True}]
+
+    monkeypatch.setattr(fra, "embed_crops", lambda crops: (
+        list(range(len(crops))), np.array([np.full(128, 1 + (c[0, 0, 0] == 7)) for c in crops])))
+    monkeypatch.setattr(fra, "classify_embeddings", classify)
+
+    make_worker().process([(a, frame_a, 0.0), (b, frame_b, 0.0)])
+
+    assert a.session.results[0][0]["name"] == "An"
+    assert not b.session.results and b.metrics.snapshot()["errors"] == 1
+
+
+def test_stop_joins_camera_threads(monkeypatch):
+    monkeypatch.setattr(recognition_server, "get_store", lambda: type("S", (), {"flush": lambda self: None})())
+    server = RecognitionServer.__new__(RecognitionServer)
+    server.stopped = threading.Event()
+    server.workers = []
+    stream = make_stream("A")
+    release = threading.Event()
+
+    def run():
+        stream.stopped.wait()
+        release.wait(1.0)
+        stream.ended.set()
+
+    stream.run = run
+    stream.start()
+    threading.Timer(0.1, release.set).start()
+    server.streams = [stream]
+    server.stop()
+
+    assert stream.ended.is_set() and not stream.is_alive()
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import session_engine
+from session_engine import SessionEngine
+
+STUDENTS = ["An", "Binh", "Chi", "Dung"]
+MORNING = datetime(2026, 10, 18, 7, 0)     # trước giờ học
+IN_CLASS = datetime(2026, 10, 18, 8, 0)
+EVENING = datetime(2026, 10, 18, 20, 0)    # sau giờ học
+
+
+class MemoryStore:
+    def __init__(self):
+        self.rows = []
+
+    def query(self, subject=None, date=None, **_):
+        return [r for r in self.rows if r[2] == subject and r[3] == date]
+
+    def add(self, name, student_id=None, subject=None, date=None, time=None):
+        self.rows.append((name, student_id, subject, date, time))
+
+
+def make_engine(tmp_path, changes=None, now=MORNING):
+    callback = changes.append if changes is not None else None
+    return SessionEngine(str(tmp_path / "session.json"), STUDENTS, MemoryStore(), callback, clock=lambda: now)
+
+
+def test_not_started_session_keeps_its_roster(tmp_path):
+    changes = []
+    engine = make_engine(tmp_path, changes)
+    engine.rosters["AI"] = ["An", "Binh"]
+    engine.open("AI", "07:30", "09:00", now=MORNING)
+
+    # Mở trước giờ học: nhận diện vẫn giới hạn trong lớp của buổi sắp tới, không phải tập rỗng
+    assert engine.active_names(MORNING) == {"An", "Binh"}
+    assert changes and changes[-1] == {"An", "Binh"}
+    assert engine.can_check_in("AI", "An", MORNING) == session_engine.NOT_STARTED
+
+
+def test_open_session_takes_priority_over_upcoming(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.rosters["AI"] = ["An"]
+    engine.rosters["IoT"] = ["Chi"]
+    engine.open("AI", "07:30", "09:00", now=MORNING)
+    engine.open("IoT", "10:00", "11:30", now=MORNING)
+
+    assert engine.active_names(MORNING) == {"An", "Chi"}
+    assert engine.active_names(IN_CLASS) == {"An"}
+
+
+def test_no_restriction_without_current_sessions(tmp_path):
+    engine = make_engine(tmp_path)
+    assert engine.active_names(IN_CLASS) is None
+    engine.open("AI", "07:30", "09:00", now=MORNING)
+    assert engine.active_names(EVENING) is None
+
+
+def test_roster_change_notifies_and_limits_check_in(tmp_path):
+    changes = []
+    engine = make_engine(tmp_path, changes)
+    engine.open("AI", "07:30", "09:00", now=MORNING)
+    engine.set_roster("AI", ["Dung"])
+
+    assert changes[-1] == {"Dung"}
+    assert engine.can_check_in("AI", "An", IN_CLASS) == session_engine.NOT_IN_ROSTER
+    assert engine.check_in("AI", "Dung", now=IN_CLASS) == session_engine.CHECKED_IN
+    assert engine.check_in("AI", "Dung", now=IN_CLASS) == session_engine.DUPLICATE
@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import SVC
+
+import svm_head
+from svm_head import SVMHead
+
+
+def write_models(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, 16))
+    X = np.concatenate([c + 0.1 * rng.normal(size=(20, 16)) for c in centers])
+    encoder = LabelEncoder().fit(["An", "Binh", "Chi"])
+    y = encoder.transform(np.repeat(["An", "Binh", "Chi"], 20))
+    svm = SVC(kernel="linear", probability=True, random_state=0).fit(X, y)
+    svm_path, encoder_path = tmp_path / "svm.pkl", tmp_path / "encoder.pkl"
+    with open(svm_path, "wb") as f:
+        pickle.dump(svm, f)
+    with open(encoder_path, "wb") as f:
+        pickle.dump(encoder, f)
+    return str(svm_path), str(encoder_path), X, svm
+
+
+def test_export_failure_keeps_in_memory_head(tmp_path, monkeypatch):
+    svm_path, encoder_path, X, svm = write_models(tmp_path)
+
+    def read_only(self, path):
+        raise PermissionError(13, "Permission denied", path)
+
+    monkeypatch.setattr(SVMHead, "save", read_only)
+    head = svm_head.load_or_export(str(tmp_path / "head.npz"), svm_path, encoder_path)
+
+    assert not (tmp_path / "head.npz").exists()
+    assert np.allclose(head.predict_proba(X), svm.predict_proba(X), atol=1e-9)
+
+
+def test_corrupt_export_is_rebuilt(tmp_path):
+    svm_path, encoder_path, X, svm = write_models(tmp_path)
+    head_path = tmp_path / "head.npz"
+    head_path.write_bytes(b"not an npz")
+
+    head = svm_head.load_or_export(str(head_path), svm_path, encoder_path)
+
+    assert list(head.names) == ["An", "Binh", "Chi"]
+    assert np.allclose(SVMHead.load(str(head_path)).predict_proba(X), svm.predict_proba(X), atol=1e-9)